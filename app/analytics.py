@@ -0,0 +1,158 @@
+# app/analytics.py
+"""
+Performance analytics served from rollup tables.
+
+`apply_rollups` folds every batch written by `app.results_store` into
+per-day, per-question, per-topic and per-session aggregates inside the same
+transaction, so charts never scan the `results` table. Query results are
+cached until the rollup version changes, i.e. until new data arrives.
+"""
+
+from __future__ import annotations
+import sqlite3, threading
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import results_store
+
+_TS = results_store.COLUMNS.index("ts")
+_QUESTION = results_store.COLUMNS.index("question")
+_SCORE = results_store.COLUMNS.index("score")
+_SESSION = results_store.COLUMNS.index("session_id")
+_TOPIC = results_store.COLUMNS.index("topic")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1. Incremental maintenance (called by the results writer)
+# ──────────────────────────────────────────────────────────────────────────────
+def apply_rollups(conn: sqlite3.Connection, rows: Sequence[tuple]) -> None:
+    """Add freshly inserted result rows to the rollup tables."""
+    daily: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    per_question: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    per_topic: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    per_session: Dict[str, List[float]] = {}
+
+    for row in rows:
+        ts, score = row[_TS], row[_SCORE] or 0.0
+        day = datetime.fromtimestamp(ts, timezone.utc).date().isoformat()
+        buckets = [daily[day]]
+        if row[_QUESTION] is not None:
+            buckets.append(per_question[(day, row[_QUESTION])])
+        if row[_TOPIC] is not None:
+            buckets.append(per_topic[(day, row[_TOPIC])])
+        for bucket in buckets:
+            bucket[0] += 1
+            bucket[1] += score
+        if row[_SESSION] is not None:
+            agg = per_session.setdefault(row[_SESSION], [0, 0.0, ts, ts])
+            agg[0] += 1
+            agg[1] += score
+            agg[2], agg[3] = min(agg[2], ts), max(agg[3], ts)
+
+    conn.executemany(
+        "INSERT INTO rollup_daily (day, n, score_sum) VALUES (?, ?, ?) "
+        "ON CONFLICT (day) DO UPDATE SET n = n + excluded.n, score_sum = score_sum + excluded.score_sum",
+        [(d, n, s) for d, (n, s) in daily.items()],
+    )
+    conn.executemany(
+        "INSERT INTO rollup_question (day, question, n, score_sum) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (day, question) DO UPDATE SET "
+        "n = n + excluded.n, score_sum = score_sum + excluded.score_sum",
+        [(d, q, n, s) for (d, q), (n, s) in per_question.items()],
+    )
+    conn.executemany(
+        "INSERT INTO rollup_topic (day, topic, n, score_sum) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (day, topic) DO UPDATE SET "
+        "n = n + excluded.n, score_sum = score_sum + excluded.score_sum",
+        [(d, t, n, s) for (d, t), (n, s) in per_topic.items()],
+    )
+    conn.executemany(
+        "INSERT INTO rollup_session (session_id, n, score_sum, first_ts, last_ts) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (session_id) DO UPDATE SET n = n + excluded.n, "
+        "score_sum = score_sum + excluded.score_sum, "
+        "first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)",
+        [(sid, n, s, first, last) for sid, (n, s, first, last) in per_session.items()],
+    )
+    conn.execute("UPDATE rollup_meta SET version = version + 1 WHERE id = 1")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2. Cached queries
+# ──────────────────────────────────────────────────────────────────────────────
+_local = threading.local()
+_cache: Dict[tuple, list] = {}
+_cache_version: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def _reader() -> sqlite3.Connection:
+    """One read connection per thread (WAL readers never block the writer)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        results_store.get_store()  # make sure the schema is migrated
+        conn = _local.conn = results_store.connect()
+    return conn
+
+
+def _query(sql: str, params: tuple) -> list:
+    global _cache_version
+    conn = _reader()
+    version = conn.execute("SELECT version FROM rollup_meta WHERE id = 1").fetchone()[0]
+    key = (sql, params)
+    with _cache_lock:
+        if version != _cache_version:
+            _cache.clear()
+            _cache_version = version
+        if key in _cache:
+            return _cache[key]
+    rows = conn.execute(sql, params).fetchall()
+    with _cache_lock:
+        if version == _cache_version:
+            _cache[key] = rows
+    return rows
+
+
+def _day_range(start: Optional[date], end: Optional[date]) -> tuple:
+    return (start.isoformat() if start else "0000-00-00", end.isoformat() if end else "9999-99-99")
+
+
+def date_bounds() -> Tuple[Optional[date], Optional[date]]:
+    """First and last day with results, or (None, None) when empty."""
+    lo, hi = _query("SELECT MIN(day), MAX(day) FROM rollup_daily", ())[0]
+    return (date.fromisoformat(lo) if lo else None, date.fromisoformat(hi) if hi else None)
+
+
+def daily_average(start: Optional[date] = None, end: Optional[date] = None) -> List[tuple]:
+    """`(day, average score, answers)` per day in `[start, end]`, oldest first."""
+    return _query(
+        "SELECT day, score_sum / n, n FROM rollup_daily WHERE day BETWEEN ? AND ? ORDER BY day",
+        _day_range(start, end),
+    )
+
+
+def question_average(start: Optional[date] = None, end: Optional[date] = None) -> List[tuple]:
+    """`(question, average score, answers)` in `[start, end]`, weakest first."""
+    return _query(
+        "SELECT question, SUM(score_sum) / SUM(n), SUM(n) FROM rollup_question "
+        "WHERE day BETWEEN ? AND ? GROUP BY question ORDER BY 2",
+        _day_range(start, end),
+    )
+
+
+def topic_average(start: Optional[date] = None, end: Optional[date] = None) -> List[tuple]:
+    """`(topic, average score, answers)` in `[start, end]`, weakest first."""
+    return _query(
+        "SELECT topic, SUM(score_sum) / SUM(n), SUM(n) FROM rollup_topic "
+        "WHERE day BETWEEN ? AND ? GROUP BY topic ORDER BY 2",
+        _day_range(start, end),
+    )
+
+
+def session_summary(limit: int = 50) -> List[tuple]:
+    """`(session_id, average score, answers, first_ts, last_ts)`, most recent first."""
+    return _query(
+        "SELECT session_id, score_sum / n, n, first_ts, last_ts FROM rollup_session "
+        "ORDER BY last_ts DESC LIMIT ?",
+        (limit,),
+    )
@@ -0,0 +1,188 @@
+# app/batch.py
+"""
+Headless bulk quiz generation.
+
+    python -m app.batch COURSE_DIR --out bank.jsonl --n 20
+
+INPUT is a directory (searched recursively for PDFs) or a manifest: a text
+file with one PDF path per line, or a JSONL file of objects with `path` and
+optional `topic` / `n`. Documents are ingested in a worker pool and each one
+is handed to the generation pool as soon as its ingest finishes. Every
+finished document is appended to the output JSONL immediately, and a rerun
+skips documents already recorded there, so a crashed run resumes where it
+stopped.
+"""
+
+from __future__ import annotations
+import argparse, json, logging, os, sys, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from . import ingest_cache, question_bank, registry
+from .qa_generator import CHUNK_OVERLAP, CHUNK_SIZE, generate_qa_pairs, ingest_pdf_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def read_inputs(source: Path, default_n: int, default_topic: Optional[str]) -> Iterator[Dict]:
+    """Yield `{path, n, topic}` jobs from a directory or manifest file."""
+    if source.is_dir():
+        for path in sorted(source.rglob("*.pdf")):
+            yield {"path": path, "n": default_n, "topic": default_topic}
+        return
+    base = source.parent
+    for line in source.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        entry = json.loads(line) if line.startswith("{") else {"path": line}
+        path = Path(entry["path"])
+        yield {
+            "path": path if path.is_absolute() else base / path,
+            "n": int(entry.get("n", default_n)),
+            "topic": entry.get("topic", default_topic),
+        }
+
+
+def completed_jobs(out_path: Path) -> Set[tuple]:
+    """`(doc_key, topic, n)` of documents already written successfully."""
+    done: Set[tuple] = set()
+    if not out_path.exists():
+        return done
+    for line in out_path.read_text(encoding="utf-8").splitlines():
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue  # torn last line from a crash
+        if rec.get("status") == "ok":
+            done.add((rec["doc_key"], rec.get("topic"), rec["n"]))
+    return done
+
+
+class _JsonlWriter:
+    """Append-only JSONL writer that makes every record durable immediately."""
+
+    def __init__(self, path: Path):
+        self._fh = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict) -> None:
+        with self._lock:
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def run(
+    jobs: List[Dict],
+    out_path: Path,
+    *,
+    provider: str = "Ollama",
+    model: str = registry.OLLAMA_MODEL,
+    gemini_api_key: Optional[str] = None,
+    ingest_workers: int = 2,
+    gen_workers: int = 2,
+) -> Dict[str, int]:
+    """Ingest and generate for every job, writing results to `out_path`."""
+    done = completed_jobs(out_path)
+    writer = _JsonlWriter(out_path)
+    counts = {"ok": 0, "skipped": 0, "error": 0}
+    counts_lock = threading.Lock()
+
+    def _count(kind: str) -> None:
+        with counts_lock:
+            counts[kind] += 1
+
+    def _generate(job: Dict, doc_key: str, n_chunks: int) -> None:
+        try:
+            questions = generate_qa_pairs(
+                doc_id=f"batch:{doc_key}",
+                n=job["n"],
+                topic=job["topic"],
+                provider=provider,
+                gemini_api_key=gemini_api_key,
+                ollama_model=model,
+            )
+            # later UI quizzes on the same document and topic are served from the bank
+            question_bank.deposit(question_bank.bank_key([doc_key], job["topic"]), questions,
+                                  provider=provider, model=model)
+            writer.write({"status": "ok", "path": str(job["path"]), "doc_key": doc_key,
+                          "topic": job["topic"], "n": job["n"], "chunks": n_chunks,
+                          "questions": questions})
+            _count("ok")
+            logger.info("generated %d questions for %s", len(questions), job["path"])
+        except Exception as exc:
+            writer.write({"status": "error", "path": str(job["path"]), "doc_key": doc_key,
+                          "topic": job["topic"], "n": job["n"], "error": str(exc)})
+            _count("error")
+            logger.exception("generation failed for %s", job["path"])
+
+    with ThreadPoolExecutor(max_workers=gen_workers, thread_name_prefix="generate") as gen_pool, \
+         ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="ingest") as ingest_pool:
+        gen_futures: List[Future] = []
+        gen_lock = threading.Lock()
+
+        def _ingest(job: Dict) -> None:
+            try:
+                data = Path(job["path"]).read_bytes()
+                doc_key = ingest_cache.document_key(data, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+                if (doc_key, job["topic"], job["n"]) in done:
+                    _count("skipped")
+                    return
+                n_chunks = ingest_pdf_bytes(data, f"batch:{doc_key}", filename=Path(job["path"]).name)
+            except Exception as exc:
+                writer.write({"status": "error", "path": str(job["path"]), "topic": job["topic"],
+                              "n": job["n"], "error": str(exc)})
+                _count("error")
+                logger.exception("ingest failed for %s", job["path"])
+                return
+            # pipeline: start generating while other documents are still ingesting
+            with gen_lock:
+                gen_futures.append(gen_pool.submit(_generate, job, doc_key, n_chunks))
+
+        for fut in [ingest_pool.submit(_ingest, job) for job in jobs]:
+            fut.result()
+        for fut in list(gen_futures):
+            fut.result()
+
+    writer.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.batch", description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", type=Path, help="directory of PDFs or manifest (.txt / .jsonl)")
+    parser.add_argument("--out", type=Path, default=Path("question_bank.jsonl"), help="output JSONL file")
+    parser.add_argument("--n", type=int, default=10, help="questions per document")
+    parser.add_argument("--topic", default=None, help="default topic filter")
+    parser.add_argument("--provider", choices=["Ollama", "Gemini"], default="Ollama")
+    parser.add_argument("--model", default=registry.OLLAMA_MODEL, help="Ollama model")
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--gen-workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if args.provider == "Gemini" and not gemini_api_key:
+        parser.error("GEMINI_API_KEY must be set when --provider Gemini")
+
+    jobs = list(read_inputs(args.input, args.n, args.topic))
+    counts = run(
+        jobs,
+        args.out,
+        provider=args.provider,
+        model=args.model,
+        gemini_api_key=gemini_api_key,
+        ingest_workers=args.ingest_workers,
+        gen_workers=args.gen_workers,
+    )
+    print(json.dumps({"documents": len(jobs), **counts}))
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# app/context_builder.py
+"""
+Token-budgeted, diversity-aware context packing for generation prompts.
+
+Candidates come from Chroma with their distances and stored embeddings.
+They are ordered by maximal marginal relevance (MMR): each pick trades
+relevance to the query against similarity to chunks already picked, so
+overlapping windows and repeated passages are not sent twice; a little
+random jitter on relevance breaks near-ties differently on every quiz, so
+repeated quizzes see different contexts. Whole chunks are then packed into
+each prompt up to a per-provider/model token budget, and the last chunk is
+cut at a sentence boundary instead of mid-word.
+"""
+
+from __future__ import annotations
+import math, os, random, re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import ingest_cache, metrics, registry
+from .vector_store import similarity_search_with_embeddings
+
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.6"))
+# Max random bonus added to each candidate's 0..1 relevance per ordering (0 = deterministic)
+MMR_JITTER = float(os.getenv("CONTEXT_MMR_JITTER", "0.1"))
+# Context tokens per prompt by provider, overridable per model with
+# CONTEXT_TOKEN_BUDGETS="gemma3:latest=800,tinyllama-qa=400"
+PROVIDER_TOKEN_BUDGETS = {
+    "Ollama": int(os.getenv("CONTEXT_TOKENS_OLLAMA", "600")),
+    "Gemini": int(os.getenv("CONTEXT_TOKENS_GEMINI", "2000")),
+}
+MODEL_TOKEN_BUDGETS: Dict[str, int] = {
+    name.strip(): int(value)
+    for name, _, value in (
+        item.partition("=") for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if "=" in item
+    )
+}
+CHARS_PER_TOKEN = 4
+_MIN_TAIL_TOKENS = 40  # don't bother packing a truncated chunk smaller than this
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+
+
+@dataclass
+class Candidate:
+    text: str
+    relevance: float          # 0..1, higher is closer to the query
+    embedding: Optional[np.ndarray]
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def token_budget(provider: str, model: Optional[str] = None) -> int:
+    """Context tokens allowed per prompt for `provider` / `model`."""
+    if provider == "Gemini":
+        model = registry.GEMINI_MODEL
+    if model and model in MODEL_TOKEN_BUDGETS:
+        return MODEL_TOKEN_BUDGETS[model]
+    return PROVIDER_TOKEN_BUDGETS.get(provider, PROVIDER_TOKEN_BUDGETS["Ollama"])
+
+
+def retrieve(query: str, k: int, doc_ids: Sequence[str]) -> List[Candidate]:
+    """Fetch `k` candidates with min-max normalised relevance."""
+    hits = similarity_search_with_embeddings(
+        query, k=k, doc_ids=doc_ids, alias_ids=ingest_cache.document_aliases(doc_ids)
+    )
+    if not hits:
+        return []
+    distances = [h["distance"] for h in hits]
+    lo, hi = min(distances), max(distances)
+    return [
+        Candidate(
+            text=h["document"],
+            relevance=1.0 - (h["distance"] - lo) / (hi - lo) if hi > lo else 1.0,
+            embedding=None if h["embedding"] is None else np.asarray(h["embedding"], dtype=np.float32),
+        )
+        for h in hits
+    ]
+
+
+def mmr_order(
+    candidates: Sequence[Candidate],
+    lambda_: float = MMR_LAMBDA,
+    jitter: float = MMR_JITTER,
+    rng: Optional[random.Random] = None,
+) -> List[Candidate]:
+    """Order all candidates by maximal marginal relevance, plus up to `jitter` random relevance."""
+    rng = rng or random
+    relevance = np.array([c.relevance + rng.uniform(0, jitter) for c in candidates])
+    if len(candidates) <= 1 or any(c.embedding is None for c in candidates):
+        return [candidates[i] for i in np.argsort(-relevance, kind="stable")]
+    with metrics.span("context.mmr", candidates=len(candidates)):
+        vecs = np.stack([c.embedding for c in candidates])
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        sims = vecs @ vecs.T
+        remaining = list(range(len(candidates)))
+        picked: List[int] = []
+        max_sim = np.zeros(len(candidates))
+        while remaining:
+            scores = lambda_ * relevance[remaining] - (1 - lambda_) * max_sim[remaining]
+            best = remaining.pop(int(np.argmax(scores)))
+            picked.append(best)
+            max_sim = np.maximum(max_sim, sims[best])
+        return [candidates[i] for i in picked]
+
+
+def _truncate_to_sentence(text: str, max_chars: int) -> str:
+    head = text[:max_chars]
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    if ends:
+        return head[: ends[-1]]
+    return head.rsplit(" ", 1)[0] if " " in head else head
+
+
+def _pack(chunks: Sequence[str], budget_tokens: int) -> List[str]:
+    """Parts of the packed context: whole chunks, then maybe one trimmed at a sentence end."""
+    parts: List[str] = []
+    used = 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk) + 1  # +1 for the separating newline
+        if used + cost <= budget_tokens:
+            parts.append(chunk)
+            used += cost
+            continue
+        remaining = budget_tokens - used
+        if remaining >= _MIN_TAIL_TOKENS:
+            tail = _truncate_to_sentence(chunk, remaining * CHARS_PER_TOKEN)
+            if tail:
+                parts.append(tail)
+        break
+    return parts
+
+
+def pack(chunks: Sequence[str], budget_tokens: int) -> str:
+    """Join whole chunks until `budget_tokens` is reached, trimming the last at a sentence end."""
+    return "\n".join(_pack(chunks, budget_tokens))
+
+
+def shard_contexts(
+    ordered: Sequence[Candidate], n_shards: int, budget_tokens: int
+) -> Tuple[List[str], List[Candidate]]:
+    """
+    Deal MMR-ordered candidates round-robin to `n_shards` prompts, so every
+    shard starts with highly relevant, mutually diverse chunks, and pack each
+    under the budget. Returns the contexts and the candidates packed into
+    them (a trimmed last chunk counts); the rest were never shown.
+    """
+    with metrics.span("context.pack", shards=n_shards, budget=budget_tokens) as attrs:
+        contexts, used = [], []
+        for i in range(n_shards):
+            group = list(ordered[i::n_shards])
+            parts = _pack([c.text for c in group], budget_tokens)
+            contexts.append("\n".join(parts))
+            used += group[: len(parts)]
+        attrs["chunks"] = len(used)
+        return contexts, used
@@ -1,11 +1,22 @@
 # app/db.py
-from chromadb import PersistentClient
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+"""
+Access to the `exam_chunks` Chroma collection.
 
-# ✅ Use stable, cross-platform embeddings
-embedding_function = SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+The client and embedding model are created lazily by `app.registry` and
+shared with the rest of the app, so importing this module is cheap.
+"""
+from . import registry
 
-vectordb = PersistentClient(path="chroma_store").get_or_create_collection(
-    name="exam_chunks",
-    embedding_function=embedding_function
-)
+
+def get_vectordb():
+    """Return the shared `exam_chunks` collection, opening it on first use."""
+    return registry.collection()
+
+
+def __getattr__(name):
+    # ✅ Backwards-compatible lazy aliases for the old module-level objects
+    if name == "vectordb":
+        return registry.collection()
+    if name == "embedding_function":
+        return registry.embedding_function()
+    raise AttributeError(name)
@@ -0,0 +1,159 @@
+# app/dedup.py
+"""
+Near-duplicate chunk elimination at ingest (MinHash + LSH).
+
+Each chunk is reduced to a MinHash signature of its 5-word shingles and
+bucketed into LSH bands. A chunk whose estimated Jaccard similarity to an
+earlier chunk of the same document reaches `DEDUP_THRESHOLD` is dropped
+(running headers, footers, copyright blocks). One matching a chunk already
+stored for another document is not stored again; the document gets an alias
+to the existing chunk id instead, so retrieval still sees that content.
+Signatures of kept chunks are persisted in the ingest manifest.
+"""
+
+from __future__ import annotations
+import hashlib, logging, os, re, zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import ingest_cache, metrics
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = os.getenv("INGEST_DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.85"))
+DEDUP_CROSS_DOCUMENT = os.getenv("INGEST_DEDUP_CROSS_DOCUMENT", "1") == "1"
+NUM_PERM = 128
+LSH_BANDS = 32            # 4 rows per band: pairs above ~0.5 Jaccard almost always collide
+SHINGLE_WORDS = 5
+
+# Fixed seed: signatures are persisted and must be comparable across runs
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (uint32[NUM_PERM]) of the word shingles of `text`."""
+    words = re.findall(r"\w+", text.lower())
+    grams = {" ".join(words[i : i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    x = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    hashed = ((np.outer(_A, x) + _B[:, None]) % _MERSENNE) & np.uint64(0xFFFFFFFF)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[Tuple[int, int]]:
+    """`(band, bucket)` pairs; two chunks are LSH candidates if any pair matches."""
+    rows = NUM_PERM // LSH_BANDS
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * rows : (band + 1) * rows].tobytes(), digest_size=8).digest(),
+            "little", signed=True,
+        ))
+        for band in range(LSH_BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+@dataclass
+class DedupStats:
+    raw: int = 0
+    within_doc: int = 0
+    cross_doc: int = 0
+
+    @property
+    def removed(self) -> int:
+        return self.within_doc + self.cross_doc
+
+    @property
+    def kept(self) -> int:
+        return self.raw - self.removed
+
+
+class ChunkDeduplicator:
+    """
+    Filters one document's chunk stream batch by batch:
+
+        dedup = ChunkDeduplicator(doc_key)
+        kept = dedup.filter(batch, start=n_stored)
+        ...
+        dedup.finish()      # after the kept chunks are stored
+    """
+
+    def __init__(
+        self,
+        doc_key: str,
+        threshold: float = DEDUP_THRESHOLD,
+        cross_document: bool = DEDUP_CROSS_DOCUMENT,
+    ):
+        self.doc_key = doc_key
+        self.threshold = threshold
+        self.cross_document = cross_document
+        self.stats = DedupStats()
+        self._signatures: List[np.ndarray] = []
+        self._rows: List[Tuple[int, bytes, List[Tuple[int, int]]]] = []
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+        self._aliases: List[Tuple[str, str]] = []  # (chunk id, document holding it)
+
+    def _in_document(self, signature: np.ndarray, keys: List[Tuple[int, int]]) -> bool:
+        seen = {pos for key in keys for pos in self._buckets.get(key, ())}
+        return any(similarity(signature, self._signatures[pos]) >= self.threshold for pos in seen)
+
+    def _stored_match(self, signature: np.ndarray, candidates) -> Optional[Tuple[str, str]]:
+        for doc_key, idx, blob in candidates:
+            if similarity(signature, np.frombuffer(blob, dtype=np.uint32)) >= self.threshold:
+                return f"{doc_key}-{idx}", doc_key
+        return None
+
+    def filter(self, chunks: Sequence[str], start: int) -> List[str]:
+        """Return the chunks to store; `start` is the index the first kept chunk will get."""
+        with metrics.span("ingest.dedup", chunks=len(chunks)) as attrs:
+            signatures = [minhash(c) for c in chunks]
+            keys = [band_keys(s) for s in signatures]
+            stored = (ingest_cache.lsh_candidates(keys, exclude_doc=self.doc_key)
+                      if self.cross_document else [[] for _ in chunks])
+            kept: List[str] = []
+            for text, signature, sig_keys, candidates in zip(chunks, signatures, keys, stored):
+                self.stats.raw += 1
+                if self._in_document(signature, sig_keys):
+                    self.stats.within_doc += 1
+                    continue
+                ref = self._stored_match(signature, candidates)
+                if ref is not None:
+                    self.stats.cross_doc += 1
+                    self._aliases.append(ref)
+                    continue
+                pos = len(self._signatures)
+                self._signatures.append(signature)
+                for key in sig_keys:
+                    self._buckets.setdefault(key, []).append(pos)
+                self._rows.append((start + len(kept), signature.tobytes(), sig_keys))
+                kept.append(text)
+            attrs["removed"] = len(chunks) - len(kept)
+        return kept
+
+    def finish(self) -> DedupStats:
+        """Persist signatures, aliases and statistics for the document."""
+        ingest_cache.record_dedup(
+            self.doc_key,
+            self._rows,
+            self._aliases,
+            n_raw=self.stats.raw,
+            within_doc=self.stats.within_doc,
+            cross_doc=self.stats.cross_doc,
+        )
+        metrics.incr("ingest_chunks_total", self.stats.raw)
+        metrics.incr("ingest_chunks_deduplicated_total", self.stats.removed)
+        if self.stats.removed:
+            logger.info(
+                "%s: dropped %d of %d chunks as near-duplicates (%d within document, %d already stored)",
+                self.doc_key, self.stats.removed, self.stats.raw, self.stats.within_doc, self.stats.cross_doc,
+            )
+        return self.stats
@@ -0,0 +1,157 @@
+# app/embedding_cache.py
+"""
+Persistent chunk-embedding cache.
+
+Embeddings are stored as rows of a raw float32 matrix per model
+(`<model>.f32`, read through `numpy.memmap`) with a SQLite index mapping
+`sha256(model, normalised text)` to a row. Only cache misses are encoded,
+in batches of `EMBED_BATCH_SIZE`, so overlapping material and re-indexing
+after a vector store wipe cost little CPU.
+"""
+
+from __future__ import annotations
+import hashlib, os, re, sqlite3, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from . import metrics, registry
+
+CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+
+def normalise(text: str) -> str:
+    """Collapse whitespace so trivially different copies share an entry."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_key(text: str, model_name: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{normalise(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Append-only float32 matrix plus key → row index for one model."""
+
+    def __init__(self, model_name: str, directory: Path = CACHE_DIR):
+        self.model_name = model_name
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.matrix_path = directory / f"{slug}.f32"
+        self.index_path = directory / "index.db"
+        self.matrix_path.touch(exist_ok=True)
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self._conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                row INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL
+            );
+            """
+        )
+        row = self._conn.execute(
+            "SELECT dim FROM models WHERE model = ?", (model_name,)
+        ).fetchone()
+        self.dim: Optional[int] = row[0] if row else None
+
+    # ── reads ────────────────────────────────────────────────────────────────
+    def _rows(self, n_needed: int) -> np.memmap:
+        """Return a memmap covering at least `n_needed` rows, remapping if the file grew."""
+        if self._matrix is None or self._matrix.shape[0] < n_needed:
+            n_rows = self.matrix_path.stat().st_size // (self.dim * 4)
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+        return self._matrix
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not keys or self.dim is None:
+            return {}
+        found: Dict[str, int] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = list(keys[i : i + 500])
+                marks = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT key, row FROM embeddings WHERE model = ? AND key IN ({marks})",
+                    (self.model_name, *part),
+                ).fetchall())
+            if not found:
+                return {}
+            matrix = self._rows(max(found.values()) + 1)
+            return {k: np.array(matrix[r]) for k, r in found.items()}
+
+    # ── writes ───────────────────────────────────────────────────────────────
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        if not keys:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            # IMMEDIATE serialises appends across processes sharing the cache
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO models (model, dim) VALUES (?, ?)",
+                        (self.model_name, self.dim),
+                    )
+                first_row = self.matrix_path.stat().st_size // (self.dim * 4)
+                with open(self.matrix_path, "r+b") as fh:
+                    fh.seek(first_row * self.dim * 4)
+                    fh.write(vectors.tobytes())
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, row) VALUES (?, ?, ?)",
+                    [(k, self.model_name, first_row + i) for i, k in enumerate(keys)],
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model_name: str = registry.EMB_MODEL_NAME) -> EmbeddingCache:
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def embed_texts(texts: Sequence[str], *, batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    """
+    Return embeddings for `texts`, encoding only chunks not seen before.
+    Produces the same vectors as the collection's embedding function.
+    """
+    if not texts:
+        return []
+    model_name = registry.EMB_MODEL_NAME
+    cache = get_cache(model_name)
+    with metrics.span("embed", chunks=len(texts)) as attrs:
+        keys = [chunk_key(t, model_name) for t in texts]
+        found = cache.get_many(list(dict.fromkeys(keys)))
+
+        misses: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in misses:
+                misses[key] = text
+        attrs["encoded"] = len(misses)
+        if misses:
+            vectors = registry.sentence_transformer().encode(
+                list(misses.values()),
+                batch_size=batch_size,
+                convert_to_numpy=True,
+            )
+            cache.put_many(list(misses), vectors)
+            found.update(zip(misses, np.asarray(vectors, dtype=np.float32)))
+
+        return [found[k].tolist() for k in keys]
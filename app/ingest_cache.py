@@ -0,0 +1,483 @@
+# app/ingest_cache.py
+"""
+Content-addressed manifest of ingested PDFs.
+
+A document is identified by the SHA-256 of its bytes plus the chunking
+parameters, so re-uploading the same textbook links the existing chunks to
+the new session instead of re-parsing and re-embedding it.
+
+The manifest also holds the MinHash/LSH index used by `app.dedup`: chunk
+signatures and band buckets of stored chunks, aliases from a document to
+near-identical chunks stored under another document, and per-document
+deduplication statistics, and which documents live in their own
+collection. `app.store_lifecycle` expires session links and removes
+documents nothing refers to any more.
+"""
+
+from __future__ import annotations
+import hashlib, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+MANIFEST_PATH = Path(os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.db"))
+
+_lock = threading.Lock()
+_migrated: set = set()  # manifest paths whose schema is up to date in this process
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the manifest, creating or upgrading its schema on first use in this process."""
+    conn = sqlite3.connect(MANIFEST_PATH, timeout=30)
+    path = str(Path(MANIFEST_PATH).resolve())
+    if path not in _migrated:
+        _migrate(conn)
+        _migrated.add(path)
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            doc_key TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            overlap INTEGER NOT NULL,
+            n_chunks INTEGER NOT NULL,
+            filename TEXT,
+            created_at REAL NOT NULL,
+            unlinked_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS session_documents (
+            session_id TEXT NOT NULL,
+            doc_key TEXT NOT NULL,
+            linked_at REAL NOT NULL,
+            PRIMARY KEY (session_id, doc_key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_session_documents_doc ON session_documents (doc_key);
+        CREATE TABLE IF NOT EXISTS document_collections (
+            doc_key TEXT PRIMARY KEY,
+            collection TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS chunk_signatures (
+            doc_key TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            signature BLOB NOT NULL,
+            PRIMARY KEY (doc_key, idx)
+        );
+        CREATE TABLE IF NOT EXISTS chunk_bands (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            doc_key TEXT NOT NULL,
+            idx INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_chunk_bands ON chunk_bands (band, bucket);
+        CREATE INDEX IF NOT EXISTS idx_chunk_bands_doc ON chunk_bands (doc_key);
+        CREATE TABLE IF NOT EXISTS chunk_aliases (
+            doc_key TEXT NOT NULL,
+            chunk_id TEXT NOT NULL,
+            target_doc TEXT,
+            PRIMARY KEY (doc_key, chunk_id)
+        );
+        CREATE TABLE IF NOT EXISTS dedup_stats (
+            doc_key TEXT PRIMARY KEY,
+            n_raw INTEGER NOT NULL,
+            within_doc INTEGER NOT NULL,
+            cross_doc INTEGER NOT NULL
+        );
+        """
+    )
+    _add_column(conn, "chunk_aliases", "target_doc TEXT", _backfill_alias_targets)
+    _add_column(conn, "documents", "unlinked_at REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_aliases_target ON chunk_aliases (target_doc)")
+
+
+def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return column in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column_def: str, backfill=None) -> None:
+    """Add a column to manifests created without it (re-checked under a write lock)."""
+    column = column_def.split()[0]
+    if _has_column(conn, table, column):
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not _has_column(conn, table, column):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+            if backfill is not None:
+                backfill(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _backfill_alias_targets(conn: sqlite3.Connection) -> None:
+    conn.executemany(
+        "UPDATE chunk_aliases SET target_doc = ? WHERE chunk_id = ?",
+        [(chunk_id.rsplit("-", 1)[0], chunk_id)
+         for (chunk_id,) in conn.execute("SELECT DISTINCT chunk_id FROM chunk_aliases").fetchall()],
+    )
+
+
+def document_key(data: bytes, *, chunk_size: int, overlap: int) -> str:
+    """Return the cache key for PDF bytes chunked with the given parameters."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:32]}-{chunk_size}-{overlap}"
+
+
+def lookup(doc_key: str) -> Optional[int]:
+    """Return the number of stored chunks for `doc_key`, or None if unknown."""
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT n_chunks FROM documents WHERE doc_key = ?", (doc_key,)
+            ).fetchone()
+        finally:
+            conn.close()
+    return row[0] if row else None
+
+
+def record(
+    doc_key: str,
+    data: bytes,
+    *,
+    chunk_size: int,
+    overlap: int,
+    n_chunks: int,
+    filename: Optional[str] = None,
+) -> None:
+    """Register a fully ingested document."""
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(doc_key, sha256, chunk_size, overlap, n_chunks, filename, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    doc_key,
+                    hashlib.sha256(data).hexdigest(),
+                    chunk_size,
+                    overlap,
+                    n_chunks,
+                    filename,
+                    time.time(),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def link_session(session_id: str, doc_key: str) -> bool:
+    """
+    Attach an ingested document to a quiz session. Returns False (and links
+    nothing) if the document is no longer in the manifest, e.g. because
+    garbage collection claimed it; the caller then has to ingest it again.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            linked = conn.execute(
+                "INSERT OR REPLACE INTO session_documents (session_id, doc_key, linked_at) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM documents WHERE doc_key = ?)",
+                (session_id, doc_key, time.time(), doc_key),
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return linked > 0
+
+
+def session_documents(session_id: str) -> List[str]:
+    """Return the document keys linked to `session_id`, oldest first."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT doc_key FROM session_documents WHERE session_id = ? ORDER BY linked_at",
+                (session_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+    return [r[0] for r in rows]
+
+
+def set_document_collection(doc_key: str, collection: str) -> None:
+    """Record that `doc_key` is stored in its own `collection`."""
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_collections (doc_key, collection) VALUES (?, ?)",
+                (doc_key, collection),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def document_collections(doc_keys: Sequence[str]) -> Dict[str, str]:
+    """Map each of `doc_keys` stored in its own collection to that collection."""
+    if not doc_keys:
+        return {}
+    with _lock:
+        conn = _connect()
+        try:
+            marks = ",".join("?" * len(doc_keys))
+            rows = conn.execute(
+                f"SELECT doc_key, collection FROM document_collections WHERE doc_key IN ({marks})",
+                tuple(doc_keys),
+            ).fetchall()
+        finally:
+            conn.close()
+    return dict(rows)
+
+
+
+def partition_collections() -> set:
+    """Names of every per-document collection the manifest refers to."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT collection FROM document_collections").fetchall()
+        finally:
+            conn.close()
+    return {r[0] for r in rows}
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Lifecycle (see app.store_lifecycle)
+# ──────────────────────────────────────────────────────────────────────────────
+# A document is orphaned when no session links it and no other document's
+# alias points at one of its chunks. The grace period runs from when it was
+# ingested or last lost a session link, whichever is later.
+_ORPHAN_SQL = """
+    NOT EXISTS (SELECT 1 FROM session_documents s WHERE s.doc_key = d.doc_key)
+    AND NOT EXISTS (
+        SELECT 1 FROM chunk_aliases a WHERE a.target_doc = d.doc_key AND a.doc_key != d.doc_key
+    )
+"""
+
+
+def expire_sessions(linked_before: float, now: Optional[float] = None) -> int:
+    """Unlink documents from sessions last linked before `linked_before`, noting `now` as their unlink time."""
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "UPDATE documents SET unlinked_at = ? WHERE doc_key IN "
+                "(SELECT doc_key FROM session_documents WHERE linked_at < ?)",
+                (time.time() if now is None else now, linked_before),
+            )
+            n = conn.execute(
+                "DELETE FROM session_documents WHERE linked_at < ?", (linked_before,)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+    return n
+
+
+def orphaned_documents(idle_before: float) -> List[str]:
+    """Documents nothing refers to, ingested and last unlinked before `idle_before`."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT d.doc_key FROM documents d "
+                f"WHERE MAX(d.created_at, COALESCE(d.unlinked_at, 0)) < ? AND {_ORPHAN_SQL}",
+                (idle_before,),
+            ).fetchall()
+        finally:
+            conn.close()
+    return [r[0] for r in rows]
+
+
+def claim_orphan(doc_key: str) -> Tuple[bool, Optional[str]]:
+    """
+    Atomically re-check that `doc_key` is still orphaned and, if so, remove
+    it from the manifest. Returns `(removed, collection)`; the caller then
+    deletes the chunks. A session linking the document in the meantime wins.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            orphan = conn.execute(
+                f"SELECT 1 FROM documents d WHERE d.doc_key = ? AND {_ORPHAN_SQL}", (doc_key,)
+            ).fetchone()
+            if not orphan:
+                conn.rollback()
+                return False, None
+            row = conn.execute(
+                "SELECT collection FROM document_collections WHERE doc_key = ?", (doc_key,)
+            ).fetchone()
+            conn.execute("DELETE FROM documents WHERE doc_key = ?", (doc_key,))
+            conn.execute("DELETE FROM document_collections WHERE doc_key = ?", (doc_key,))
+            _clear_dedup(conn, doc_key)
+            conn.commit()
+        finally:
+            conn.close()
+    return True, row[0] if row else None
+
+
+def known_keys() -> set:
+    """Every document key and session id the manifest knows about."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT doc_key FROM documents UNION SELECT session_id FROM session_documents "
+                "UNION SELECT doc_key FROM session_documents"
+            ).fetchall()
+        finally:
+            conn.close()
+    return {r[0] for r in rows}
+
+
+def documents() -> List[Dict]:
+    """One summary row per ingested document, for the admin command."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                """
+                SELECT d.doc_key, d.filename, d.n_chunks, d.created_at, c.collection,
+                       COUNT(s.session_id), MAX(s.linked_at),
+                       COALESCE(st.within_doc + st.cross_doc, 0)
+                FROM documents d
+                LEFT JOIN document_collections c ON c.doc_key = d.doc_key
+                LEFT JOIN session_documents s ON s.doc_key = d.doc_key
+                LEFT JOIN dedup_stats st ON st.doc_key = d.doc_key
+                GROUP BY d.doc_key
+                ORDER BY d.created_at
+                """
+            ).fetchall()
+        finally:
+            conn.close()
+    names = ("doc_key", "filename", "n_chunks", "created_at", "collection",
+             "sessions", "last_linked", "dedup_removed")
+    return [dict(zip(names, row)) for row in rows]
+
+
+def vacuum() -> None:
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Near-duplicate index (see app.dedup)
+# ──────────────────────────────────────────────────────────────────────────────
+BandKeys = Sequence[Tuple[int, int]]
+
+
+def _clear_dedup(conn: sqlite3.Connection, doc_key: str) -> None:
+    for table in ("chunk_signatures", "chunk_bands", "chunk_aliases", "dedup_stats"):
+        conn.execute(f"DELETE FROM {table} WHERE doc_key = ?", (doc_key,))
+
+
+def lsh_candidates(band_keys: Sequence[BandKeys], exclude_doc: str) -> List[List[Tuple[str, int, bytes]]]:
+    """
+    For each chunk's `(band, bucket)` keys, return `(doc_key, idx, signature)`
+    of stored chunks of other documents sharing at least one bucket. All
+    chunks are looked up in one query.
+    """
+    out: List[List[Tuple[str, int, bytes]]] = [[] for _ in band_keys]
+    probes = [(band, bucket, pos) for pos, keys in enumerate(band_keys) for band, bucket in keys]
+    if not probes:
+        return out
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("CREATE TEMP TABLE probe (band INTEGER, bucket INTEGER, pos INTEGER)")
+            conn.executemany("INSERT INTO probe VALUES (?, ?, ?)", probes)
+            rows = conn.execute(
+                "SELECT DISTINCT p.pos, s.doc_key, s.idx, s.signature FROM probe p "
+                "JOIN chunk_bands b ON b.band = p.band AND b.bucket = p.bucket "
+                "JOIN chunk_signatures s ON s.doc_key = b.doc_key AND s.idx = b.idx "
+                "WHERE b.doc_key != ? ORDER BY p.pos, s.doc_key, s.idx",
+                (exclude_doc,),
+            ).fetchall()
+        finally:
+            conn.close()
+    for pos, doc_key, idx, signature in rows:
+        out[pos].append((doc_key, idx, signature))
+    return out
+
+
+def record_dedup(
+    doc_key: str,
+    signatures: Iterable[Tuple[int, bytes, BandKeys]],
+    aliases: Iterable[Tuple[str, str]],
+    *,
+    n_raw: int,
+    within_doc: int,
+    cross_doc: int,
+) -> None:
+    """
+    Replace the signatures, aliases (`(chunk_id, doc_key holding it)`) and
+    statistics stored for `doc_key`.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            _clear_dedup(conn, doc_key)
+            for idx, signature, bands in signatures:
+                conn.execute(
+                    "INSERT INTO chunk_signatures (doc_key, idx, signature) VALUES (?, ?, ?)",
+                    (doc_key, idx, signature),
+                )
+                conn.executemany(
+                    "INSERT INTO chunk_bands (band, bucket, doc_key, idx) VALUES (?, ?, ?, ?)",
+                    [(band, bucket, doc_key, idx) for band, bucket in bands],
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunk_aliases (doc_key, chunk_id, target_doc) VALUES (?, ?, ?)",
+                [(doc_key, chunk_id, target) for chunk_id, target in aliases],
+            )
+            conn.execute(
+                "INSERT INTO dedup_stats (doc_key, n_raw, within_doc, cross_doc) VALUES (?, ?, ?, ?)",
+                (doc_key, n_raw, within_doc, cross_doc),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def document_aliases(doc_keys: Sequence[str]) -> List[str]:
+    """Chunk ids stored under other documents that stand in for duplicates of `doc_keys`."""
+    if not doc_keys:
+        return []
+    with _lock:
+        conn = _connect()
+        try:
+            marks = ",".join("?" * len(doc_keys))
+            rows = conn.execute(
+                f"SELECT DISTINCT chunk_id FROM chunk_aliases WHERE doc_key IN ({marks})",
+                tuple(doc_keys),
+            ).fetchall()
+        finally:
+            conn.close()
+    return [r[0] for r in rows]
+
+
+def dedup_stats(doc_key: str) -> Optional[Dict[str, int]]:
+    """Chunks seen and removed (within the document / against stored ones) at ingest."""
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT n_raw, within_doc, cross_doc FROM dedup_stats WHERE doc_key = ?", (doc_key,)
+            ).fetchone()
+        finally:
+            conn.close()
+    if row is None:
+        return None
+    return {"raw": row[0], "within_doc": row[1], "cross_doc": row[2],
+            "removed": row[1] + row[2], "kept": row[0] - row[1] - row[2]}
@@ -0,0 +1,219 @@
+# app/jobs.py
+"""
+In-process job queue for ingest, generation and grading.
+
+    job = jobs.submit(session_id, ("ingest", ingest_step), ("generate", generate_step))
+    jobs.get(job.id).snapshot()      # poll from any Streamlit rerun
+    jobs.cancel(job.id)
+
+A job is a chain of steps; each step runs on the worker pool of its stage
+(`JOB_WORKERS_INGEST`, `_GENERATE`, `_GRADE` threads), so the stage caps
+bound how many uploads are embedded or how many quizzes hit the LLM host
+at once across every session. Within a stage, sessions are served round
+robin, so one user queueing many jobs does not starve the others. A step
+is called as `fn(job, previous_result)`; long steps check `job.cancelled`
+(or pass `lambda: job.cancelled` down, raising `Cancelled` when it is set)
+and may append partial output to `job.progress` for live previews.
+"""
+
+from __future__ import annotations
+import logging, os, threading, time, uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE_WORKERS = {
+    "ingest": int(os.getenv("JOB_WORKERS_INGEST", "2")),
+    "generate": int(os.getenv("JOB_WORKERS_GENERATE", "4")),
+    "grade": int(os.getenv("JOB_WORKERS_GRADE", "4")),
+}
+JOB_RETENTION = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+Step = Tuple[str, Callable[["Job", Any], Any]]
+
+
+class Cancelled(Exception):
+    """Raised by work that stopped part-way because its job was cancelled."""
+
+
+class Job:
+    def __init__(self, session_id: str, steps: List[Step], label: str = ""):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.label = label
+        self.steps = steps
+        self.step = 0
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.progress: List[Any] = []
+        self.trace: List[Dict] = []
+        self.created_at = self.queued_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def stage(self) -> str:
+        return self.steps[min(self.step, len(self.steps) - 1)][0]
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"id": self.id, "session_id": self.session_id, "label": self.label, "stage": self.stage,
+                "status": self.status, "progress": len(self.progress), "error": self.error,
+                "created_at": self.created_at, "finished_at": self.finished_at}
+
+
+class _StageQueue:
+    """Per-session FIFOs served round robin."""
+
+    def __init__(self):
+        self._by_session: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def put(self, job: Job) -> None:
+        with self._cond:
+            self._by_session.setdefault(job.session_id, deque()).append(job)
+            self._cond.notify()
+
+    def get(self) -> Job:
+        with self._cond:
+            while not self._by_session:
+                self._cond.wait()
+            session_id, pending = next(iter(self._by_session.items()))
+            job = pending.popleft()
+            del self._by_session[session_id]
+            if pending:  # back of the rotation
+                self._by_session[session_id] = pending
+            return job
+
+    def remove(self, job: Job) -> bool:
+        with self._cond:
+            pending = self._by_session.get(job.session_id)
+            if not pending or job not in pending:
+                return False
+            pending.remove(job)
+            if not pending:
+                del self._by_session[job.session_id]
+            return True
+
+    def ahead_of(self, job: Job) -> int:
+        """Jobs that will start before `job` (approximate under round robin)."""
+        with self._cond:
+            pending = self._by_session.get(job.session_id)
+            if not pending or job not in pending:
+                return 0
+            rounds = pending.index(job)
+            return sum(min(len(q), rounds + 1) for q in self._by_session.values()) - 1
+
+
+_jobs: Dict[str, Job] = {}
+_jobs_lock = threading.Lock()
+_queues = {stage: _StageQueue() for stage in STAGE_WORKERS}
+_started = False
+
+
+def _worker(stage: str) -> None:
+    queue = _queues[stage]
+    while True:
+        job = queue.get()
+        if job.cancelled:
+            _finish(job, CANCELLED)
+            continue
+        job.status = RUNNING
+        _, fn = job.steps[job.step]
+        try:
+            with metrics.trace() as spans:
+                metrics.observe("job.queue_wait", time.time() - job.queued_at, stage=stage)
+                try:
+                    with metrics.span(f"job.{stage}"):
+                        result = fn(job, job.result)
+                finally:
+                    job.trace.extend(spans)
+        except Exception as exc:
+            if job.cancelled:  # the step gave up because of the cancel
+                _finish(job, CANCELLED)
+                continue
+            logger.exception("job %s (%s) failed in %s", job.id, job.label, stage)
+            job.error = str(exc)
+            _finish(job, FAILED)
+            continue
+        job.result = result
+        job.step += 1
+        if job.cancelled:
+            _finish(job, CANCELLED)
+        elif job.step < len(job.steps):
+            job.status, job.queued_at = QUEUED, time.time()
+            _queues[job.stage].put(job)
+        else:
+            _finish(job, DONE)
+
+
+def _finish(job: Job, status: str) -> None:
+    job.status = status
+    job.finished_at = time.time()
+    metrics.observe("job.total", job.finished_at - job.created_at, status=status)
+
+
+def _start() -> None:
+    global _started
+    with _jobs_lock:
+        if _started:
+            return
+        for stage, n in STAGE_WORKERS.items():
+            for i in range(max(1, n)):
+                threading.Thread(target=_worker, args=(stage,), name=f"job-{stage}-{i}", daemon=True).start()
+        _started = True
+
+
+def _purge() -> None:
+    cutoff = time.time() - JOB_RETENTION
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values() if j.finished and j.finished_at < cutoff]:
+            del _jobs[job_id]
+
+
+def submit(session_id: str, *steps: Step, label: str = "") -> Job:
+    """Queue a job made of `(stage, fn)` steps for `session_id`."""
+    if not steps or any(stage not in _queues for stage, _ in steps):
+        raise ValueError(f"steps must use the stages {sorted(_queues)}")
+    _start()
+    _purge()
+    job = Job(session_id, list(steps), label)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _queues[job.stage].put(job)
+    return job
+
+
+def get(job_id: Optional[str]) -> Optional[Job]:
+    if not job_id:
+        return None
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def cancel(job_id: str) -> bool:
+    """Cancel a job: dropped at once if queued, stopped at its next check if running."""
+    job = get(job_id)
+    if job is None or job.finished:
+        return False
+    job._cancel.set()
+    if _queues[job.stage].remove(job):
+        _finish(job, CANCELLED)
+    return True
+
+
+def queue_position(job: Job) -> int:
+    return _queues[job.stage].ahead_of(job) if job.status == QUEUED else 0
+
@@ -0,0 +1,97 @@
+# app/json_stream.py
+"""
+Incremental parser for the JSON question lists produced by the LLM.
+
+Text is fed in as it streams from the provider and every complete list
+item (one `{"question", "answer", "topic"}` object, whatever it nests) is
+returned as soon as its closing brace arrives. Malformed items are skipped rather than failing
+the whole response, so valid questions are salvaged from broken or
+truncated arrays, and wrappers such as `{"questions": [...]}` (common in
+provider JSON modes) work too.
+"""
+
+from __future__ import annotations
+import json, re
+from typing import Dict, List, Optional
+
+_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_TRAILING_COMMA = re.compile(r",\s*}")
+
+
+class JsonObjectStream:
+    """
+    Yield the item objects of a JSON list from a stream of text fragments.
+
+    Items are the outermost objects held by a list; objects nested in an
+    item stay part of it. An object outside any list is returned whole
+    unless it wraps items, so bare items work and wrappers are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0               # next unscanned index in `_buf`
+        self._stack: List[list] = []  # [opening char, start index, holds items] per open container
+        self._item_depth: Optional[int] = None  # stack depth of item objects, once seen
+        self._in_string = False
+        self._escape = False
+        self.skipped = 0            # complete items that failed to parse
+
+    def feed(self, text: str) -> List[Dict]:
+        """Consume `text` and return the items it completed."""
+        self._buf += text.translate(_QUOTES)
+        found: List[Dict] = []
+        buf, stack = self._buf, self._stack
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and stack:
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._item_depth is None and stack and stack[-1][0] == "[":
+                    self._item_depth = len(stack)  # the outermost objects held by a list
+                stack.append([ch, i, False])
+            elif ch == "]" and stack and stack[-1][0] == "[":
+                stack.pop()
+            elif ch == "}" and stack and stack[-1][0] == "{":
+                _, start, holds_items = stack.pop()
+                if self._is_item(len(stack)):
+                    for frame in stack:
+                        frame[2] = True
+                elif stack or holds_items:
+                    continue
+                obj = self._parse(buf[start : i + 1])
+                if obj is not None:
+                    found.append(obj)
+        self._pos = len(buf)
+        self._compact()
+        return found
+
+    def _is_item(self, depth: int) -> bool:
+        """Whether an object just closed at stack `depth` is a list item."""
+        return depth == self._item_depth and self._stack[-1][0] == "["
+
+    def _parse(self, text: str):
+        for candidate in (text, _TRAILING_COMMA.sub("}", text)):
+            try:
+                obj = json.loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(obj, dict):
+                return obj
+        self.skipped += 1
+        return None
+
+    def _compact(self) -> None:
+        """Drop text that can no longer be part of an unfinished object."""
+        cut = self._stack[0][1] if self._stack else self._pos
+        if cut:
+            self._buf = self._buf[cut:]
+            self._pos -= cut
+            for frame in self._stack:
+                frame[1] -= cut
@@ -0,0 +1,251 @@
+# app/llm.py
+"""
+Thin provider layer used by question generation and grading.
+
+`complete` returns a full response and `stream` yields text fragments; both
+go through `app.llm_cache` unless `use_cache=False` (for calls whose output
+should vary between identical prompts). `cache_if` lets callers keep
+unusable responses (e.g. unparseable ones) out of the cache.
+
+Clients are shared per process (`app.registry`). Every provider call takes
+a slot from a per-provider semaphore and token bucket, and transient
+failures (timeouts, connection errors, 429/5xx) are retried with jittered
+exponential backoff; a stream is only retried before its first fragment.
+"""
+
+from __future__ import annotations
+import logging, os, random, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+from . import llm_cache, metrics, registry
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+# Max in-flight requests and requests per minute (0 = unlimited) per provider
+LLM_CONCURRENCY = {
+    "Ollama": int(os.getenv("LLM_CONCURRENCY_OLLAMA", "4")),
+    "Gemini": int(os.getenv("LLM_CONCURRENCY_GEMINI", "8")),
+}
+LLM_RATE_LIMIT = {
+    "Ollama": float(os.getenv("LLM_RPM_OLLAMA", "0")),
+    "Gemini": float(os.getenv("LLM_RPM_GEMINI", "0")),
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = 8.0
+
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+_TRANSIENT_NAMES = {
+    # httpx, under both the Ollama and google.genai clients; Gemini API errors carry
+    # their HTTP status in `.code`
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ReadError", "RemoteProtocolError",
+}
+
+
+def _model_name(provider: str, model: Optional[str]) -> str:
+    return registry.GEMINI_MODEL if provider == "Gemini" else (model or registry.OLLAMA_MODEL)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Concurrency, rate limiting & retries
+# ──────────────────────────────────────────────────────────────────────────────
+class TokenBucket:
+    """Allow `per_minute` requests per minute with bursts of up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # reserve now, so waiters are served in arrival order
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_semaphores = {p: threading.BoundedSemaphore(max(1, n)) for p, n in LLM_CONCURRENCY.items()}
+_buckets = {p: TokenBucket(rpm) for p, rpm in LLM_RATE_LIMIT.items() if rpm > 0}
+
+
+@contextmanager
+def _slot(provider: str) -> Iterator[None]:
+    """Hold one of `provider`'s concurrency slots (after its rate limit) for the block."""
+    t0 = time.perf_counter()
+    bucket = _buckets.get(provider)
+    if bucket is not None:
+        bucket.acquire()
+    sem = _semaphores.get(provider, _semaphores["Ollama"])
+    sem.acquire()
+    metrics.observe("llm.queue_wait", time.perf_counter() - t0, provider=provider)
+    try:
+        yield
+    finally:
+        sem.release()
+
+
+def _is_transient(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int) and status in _TRANSIENT_STATUS:
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return type(exc).__name__ in _TRANSIENT_NAMES
+
+
+def _backoff(attempt: int) -> float:
+    return min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _retry(provider: str, attempt: int, exc: BaseException) -> bool:
+    """Sleep before another attempt if `exc` is worth retrying."""
+    if attempt >= LLM_MAX_RETRIES or not _is_transient(exc):
+        return False
+    delay = _backoff(attempt)
+    logger.warning("%s call failed (%s); retry %d in %.1fs", provider, exc, attempt + 1, delay)
+    metrics.incr("llm_retries_total")
+    time.sleep(delay)
+    return True
+
+
+def _call(provider: str, fn: Callable[[], T]) -> T:
+    """Run `fn` in a provider slot, retrying transient failures."""
+    attempt = 0
+    while True:
+        try:
+            with _slot(provider):
+                return fn()
+        except Exception as exc:
+            if not _retry(provider, attempt, exc):
+                raise
+            attempt += 1
+
+
+def _raw_stream(
+    provider: str,
+    prompt: str,
+    model: str,
+    api_key: Optional[str],
+    json_mode: bool,
+    options: Optional[Dict],
+) -> Iterator[str]:
+    if provider == "Gemini":
+        config = dict(options or {})
+        if json_mode:
+            config["response_mime_type"] = "application/json"
+        for chunk in registry.gemini_client(api_key).models.generate_content_stream(
+            model=model, contents=prompt, config=config or None
+        ):
+            yield chunk.text or ""
+        return
+    kwargs = {"keep_alive": registry.OLLAMA_KEEP_ALIVE}
+    if json_mode:
+        kwargs["format"] = "json"
+    if options:
+        kwargs["options"] = options
+    for chunk in registry.ollama_client().generate(model=model, prompt=prompt, stream=True, **kwargs):
+        if chunk["done"]:
+            metrics.record_ollama(chunk, model)
+        yield chunk["response"]
+
+
+def stream(
+    provider: str,
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    json_mode: bool = False,
+    options: Optional[Dict] = None,
+    use_cache: bool = True,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> Iterator[str]:
+    """Yield response text as it is generated (all at once on a cache hit)."""
+    model = _model_name(provider, model)
+    use_cache = use_cache and llm_cache.LLM_CACHE_ENABLED
+    key = llm_cache.cache_key(provider, model, prompt, {**(options or {}), "json_mode": json_mode})
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.incr("llm_cache_hits_total")
+            yield cached
+            return
+
+    parts = []
+    t0 = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            try:
+                with _slot(provider):
+                    for fragment in _raw_stream(provider, prompt, model, api_key, json_mode, options):
+                        if not parts:
+                            metrics.observe("llm.first_token", time.perf_counter() - t0,
+                                            provider=provider, model=model)
+                        parts.append(fragment)
+                        yield fragment
+                break
+            except Exception as exc:
+                # fragments already yielded can't be taken back
+                if parts or not _retry(provider, attempt, exc):
+                    raise
+                attempt += 1
+    finally:
+        metrics.observe("llm.call", time.perf_counter() - t0, provider=provider, model=model,
+                        chars=sum(map(len, parts)))
+    # Only complete responses are cached; an abandoned stream never gets here
+    text = "".join(parts)
+    if use_cache and (cache_if is None or cache_if(text)):
+        llm_cache.put(key, provider, model, text)
+
+
+def complete(
+    provider: str,
+    prompt: str,
+    *,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    options: Optional[Dict] = None,
+    use_cache: bool = True,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Return the full response text for `prompt`."""
+    model = _model_name(provider, model)
+    use_cache = use_cache and llm_cache.LLM_CACHE_ENABLED
+    key = llm_cache.cache_key(provider, model, prompt, options)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.incr("llm_cache_hits_total")
+            return cached
+
+    def _generate() -> str:
+        if provider == "Gemini":
+            response = registry.gemini_client(api_key).models.generate_content(
+                model=model, contents=prompt, config=options or None
+            )
+            return response.text or ""
+        kwargs = {"options": options} if options else {}
+        response = registry.ollama_client().generate(
+            model=model, prompt=prompt, stream=False, keep_alive=registry.OLLAMA_KEEP_ALIVE, **kwargs
+        )
+        metrics.record_ollama(response, model)
+        return response["response"]
+
+    with metrics.span("llm.call", provider=provider, model=model):
+        text = _call(provider, _generate)
+
+    if use_cache and (cache_if is None or cache_if(text)):
+        llm_cache.put(key, provider, model, text)
+    return text
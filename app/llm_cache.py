@@ -0,0 +1,103 @@
+# app/llm_cache.py
+"""
+Provider-agnostic memoisation of LLM responses (grading by default;
+question generation samples and opts in only via `use_cache=True`).
+
+Responses are keyed by provider, model, prompt hash and generation options
+and kept in a local SQLite file. Entries older than `LLM_CACHE_TTL` seconds
+are ignored and purged, and the least recently used entries are evicted
+once the table exceeds `LLM_CACHE_MAX_ENTRIES`.
+"""
+
+from __future__ import annotations
+import hashlib, json, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "llm_cache.db"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+_EVICT_EVERY = 100  # puts between eviction sweeps
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_counters = {"hits": 0, "misses": 0, "puts": 0}
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, timeout=30, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used);
+            """
+        )
+    return _conn
+
+
+def cache_key(provider: str, model: str, prompt: str, options: Optional[Dict] = None) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps([provider, model, prompt_hash, options or {}], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    """Return the cached response for `key`, or None on a miss or expired entry."""
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        row = conn.execute(
+            "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > LLM_CACHE_TTL:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+            _counters["misses"] += 1
+            return None
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _counters["hits"] += 1
+        return row[0]
+
+
+def put(key: str, provider: str, model: str, response: str) -> None:
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, provider, model, response, now, now),
+        )
+        _counters["puts"] += 1
+        if _counters["puts"] % _EVICT_EVERY == 0:
+            _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL,))
+    conn.execute(
+        "DELETE FROM llm_cache WHERE key IN ("
+        " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (LLM_CACHE_MAX_ENTRIES,),
+    )
+
+
+def stats() -> Dict[str, int]:
+    """Hit/miss counters for this process plus the current number of entries."""
+    with _lock:
+        entries = _connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": _counters["hits"], "misses": _counters["misses"], "entries": entries}
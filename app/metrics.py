@@ -0,0 +1,196 @@
+# app/metrics.py
+"""
+Lightweight timing spans, histograms and per-request traces.
+
+    with metrics.span("vector.query", k=50):
+        ...
+
+Every span is added to a process-wide histogram for its stage name and,
+when a trace is active (`with metrics.trace() as spans:`), appended to that
+trace. Worker threads inherit the caller's trace when submitted through
+`metrics.bind`. Histograms can be read with `snapshot()` or scraped in
+Prometheus text format from `serve()` (started by the UI when
+`METRICS_PORT` is set).
+"""
+
+from __future__ import annotations
+import contextvars, logging, os, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Upper bounds in seconds (or tokens/s for throughput histograms)
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640, 1280)
+
+
+class Histogram:
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+_lock = threading.Lock()
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, float] = {}
+_trace: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def observe(name: str, seconds: float, buckets=TIME_BUCKETS, **attrs: Any) -> None:
+    """Record one measurement for `name` (and in the active trace, if any)."""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram(buckets)
+        hist.observe(seconds)
+    spans = _trace.get()
+    if spans is not None:
+        spans.append({"name": name, "value": round(seconds, 6), "at": time.time(), **attrs})
+    logger.debug("%s %.4f %s", name, seconds, attrs or "")
+
+
+def incr(name: str, amount: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time the block as stage `name`; callers may add attributes to the yielded dict."""
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        observe(name, time.perf_counter() - t0, **attrs)
+
+
+@contextmanager
+def trace() -> Iterator[List[Dict]]:
+    """Collect every span recorded in this context (and bound workers)."""
+    spans: List[Dict] = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap `fn` so it runs in a copy of the caller's context (keeps the trace in threads)."""
+    ctx = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def _field(obj: Any, name: str):
+    try:
+        return obj[name]
+    except (KeyError, TypeError):
+        return getattr(obj, name, None)
+
+
+def record_ollama(final: Any, model: str) -> None:
+    """
+    Record Ollama's own counters from the final (`done`) response:
+    tokens/sec from eval_count/eval_duration plus model load time.
+    """
+    eval_count = _field(final, "eval_count") or 0
+    eval_ns = _field(final, "eval_duration") or 0
+    load_ns = _field(final, "load_duration") or 0
+    prompt_count = _field(final, "prompt_eval_count") or 0
+    incr("llm_output_tokens_total", eval_count)
+    incr("llm_prompt_tokens_total", prompt_count)
+    if load_ns:
+        observe("llm.load", load_ns / 1e9, model=model)
+    if eval_count and eval_ns:
+        observe("llm.tokens_per_second", eval_count / (eval_ns / 1e9), buckets=RATE_BUCKETS,
+                model=model, tokens=eval_count)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Export
+# ──────────────────────────────────────────────────────────────────────────────
+def snapshot() -> Dict[str, Dict]:
+    """Histogram summaries and counters, e.g. for logging or a UI table."""
+    with _lock:
+        hists = {
+            name: {"count": h.count, "sum": round(h.sum, 6),
+                   "mean": round(h.sum / h.count, 6) if h.count else 0.0}
+            for name, h in _histograms.items()
+        }
+        return {"histograms": hists, "counters": dict(_counters)}
+
+
+def _metric_name(name: str) -> str:
+    return "examqa_" + name.replace(".", "_")
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            metric = _metric_name(name)
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {h.count}')
+            lines.append(f"{metric}_sum {h.sum}")
+            lines.append(f"{metric}_count {h.count}")
+        for name, value in sorted(_counters.items()):
+            metric = _metric_name(name)
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve(port: int = METRICS_PORT, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Expose `/metrics` on `host:port` in a daemon thread (once per process)."""
+    global _server
+    if not port:
+        return None
+    with _lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            logger.warning("metrics port %d unavailable; endpoint disabled", port)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -1,6 +1,18 @@
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
-import PyPDF2, re, textwrap
+from typing import Iterator, List, Optional
+import multiprocessing, PyPDF2, os, re, textwrap, threading, time
+
+from . import metrics
+
+# Pages handed to one worker task, and the number of extraction processes
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
 
 # Simple text cleaner
 def _clean(text: str) -> str:
@@ -8,14 +20,117 @@ def _clean(text: str) -> str:
     text = re.sub(r"\s+", " ", text)
     return text.strip()
 
+def _extract_pages(path: str, start: int, stop: int) -> List[str]:
+    """Return the cleaned words of pages `start:stop` (runs in a worker process)."""
+    reader = PyPDF2.PdfReader(path)
+    words: List[str] = []
+    for page in reader.pages[start:stop]:
+        words.extend(_clean(page.extract_text() or "").split())
+    return words
+
+def page_count(path: str | Path) -> int:
+    return len(PyPDF2.PdfReader(str(path)).pages)
+
+def _extract_pool() -> ProcessPoolExecutor:
+    """
+    The process pool shared by every extraction, started on first use. The
+    app calls this from many threads (UI, job workers, warm-up), and forking
+    such a process can leave a child stuck on a lock another thread held, so
+    workers start from a forkserver (spawn where that is unavailable).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=max(1, EXTRACT_WORKERS),
+                                        mp_context=multiprocessing.get_context(method))
+        return _pool
+
+def _iter_words(path: str, workers: int) -> Iterator[List[str]]:
+    """Yield page-batch word lists in document order."""
+    n_pages = page_count(path)
+    ranges = [(i, min(i + PAGES_PER_TASK, n_pages)) for i in range(0, n_pages, PAGES_PER_TASK)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield _extract_pages(path, start, stop)
+        return
+
+    # Keep at most 2×workers batches of this document in flight so memory stays bounded
+    pool = _extract_pool()
+    pending = deque()
+    todo = iter(ranges)
+    try:
+        for start, stop in todo:
+            pending.append(pool.submit(_extract_pages, path, start, stop))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            words = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(pool.submit(_extract_pages, path, *nxt))
+            yield words
+    finally:
+        for fut in pending:  # the reader stopped early (cancelled ingest) or a page failed
+            fut.cancel()
+
+def iter_chunks(
+    path: str | Path,
+    *,
+    chunk_size: int = 300,
+    overlap: int = 50,
+    workers: int = EXTRACT_WORKERS,
+) -> Iterator[str]:
+    """
+    Stream cleaned overlapping text chunks from a PDF.
+
+    Pages are extracted in the shared process pool (`workers` bounds how
+    many page batches of this document are in flight) and chunks are
+    yielded as soon as their window is complete, producing exactly the
+    chunks `load_pdf` returns.
+    """
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    def _window() -> str:
+        return textwrap.shorten(" ".join(islice(buf, chunk_size)), width=chunk_size * 4)
+
+    buf: deque = deque()
+    pages = _iter_words(str(path), workers)
+    extract_s = chunk_s = 0.0
+    n_chunks = 0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            words = next(pages, None)
+            extract_s += time.perf_counter() - t0
+            if words is None:
+                break
+            buf.extend(words)
+            while len(buf) >= chunk_size:
+                t0 = time.perf_counter()
+                chunk = _window()
+                for _ in range(step):
+                    buf.popleft()
+                chunk_s += time.perf_counter() - t0
+                n_chunks += 1
+                yield chunk
+        # trailing windows shorter than `chunk_size`
+        while buf:
+            t0 = time.perf_counter()
+            chunk = _window()
+            for _ in range(min(step, len(buf))):
+                buf.popleft()
+            chunk_s += time.perf_counter() - t0
+            n_chunks += 1
+            yield chunk
+    finally:
+        metrics.observe("pdf.extract", extract_s, workers=workers)
+        metrics.observe("pdf.chunk", chunk_s, chunks=n_chunks)
+
 def load_pdf(path: str | Path, *, chunk_size: int = 300, overlap: int = 50) -> List[str]:
     """Read a PDF and return cleaned overlapping text chunks."""
-    reader = PyPDF2.PdfReader(str(path))
-    full_text = " ".join(page.extract_text() or "" for page in reader.pages)
-    full_text = _clean(full_text)
-
     # split into roughly `chunk_size`‑token portions with `overlap` words so context isn’t lost
-    words = full_text.split()
-    step = chunk_size - overlap
-    chunks = [" ".join(words[i : i + chunk_size]) for i in range(0, len(words), step)]
-    return [textwrap.shorten(chunk, width=chunk_size * 4) for chunk in chunks if chunk]
\ No newline at end of file
+    return list(iter_chunks(path, chunk_size=chunk_size, overlap=overlap))
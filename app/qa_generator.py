@@ -4,20 +4,24 @@ Supports an optional `topic` argument to bias questions toward a theme.
 """
 
 from __future__ import annotations
-import os, json, random, re
-from typing import List, Dict, Optional
+import os, logging, queue, random, re, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Dict, Optional, Sequence
 
-from ollama import Client
-import google.generativeai as genai
-from .vector_store import add_chunks, similarity_search
-from .pdf_loader import load_pdf
+from . import context_builder, dedup, llm, metrics, registry
+from .vector_store import PARTITION_MIN_PAGES, add_chunks, has_chunks, partition_name
+from .pdf_loader import iter_chunks, page_count
+from . import ingest_cache
+from .jobs import Cancelled
+from .json_stream import JsonObjectStream
+
+logger = logging.getLogger(__name__)
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 1. Ollama client & global prompt setup
+# 1. Model settings & global prompt setup (provider calls live in app.llm)
 # ──────────────────────────────────────────────────────────────────────────────
-OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-MODEL = os.getenv("OLLAMA_MODEL", "gemma3:latest")  # Your fine-tuned model name
-_client = Client(host=OLLAMA_URL)
+MODEL = registry.OLLAMA_MODEL  # Your fine-tuned model name (OLLAMA_MODEL)
 
 _BASE_SYSTEM_PROMPT = """
 You are a professional exam tutor. Based on the textbook context, generate ONLY a JSON list.
@@ -35,84 +39,300 @@ Use ONLY the context below.
 # ──────────────────────────────────────────────────────────────────────────────
 # 2. Ingest and store PDF chunks
 # ──────────────────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+TMP_DIR = Path("tmp")
+
+
 def ingest_pdf(pdf_path: str, doc_id: str) -> int:
     """
     Load a PDF file, split it into text chunks, and store in the vector DB.
+    `doc_id` is the session the document is linked to; chunks are stored once
+    per content hash and reused by every later session uploading the same file.
+    """
+    data = Path(pdf_path).read_bytes()
+    return ingest_pdf_bytes(data, doc_id, filename=Path(pdf_path).name, pdf_path=pdf_path)
+
+
+def ingest_pdf_bytes(
+    data: bytes,
+    doc_id: str,
+    *,
+    filename: Optional[str] = None,
+    pdf_path: Optional[str] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> int:
+    """
+    Ingest raw PDF bytes for session `doc_id`, skipping extraction and
+    embedding when the same content was ingested before. The bytes are only
+    written to `tmp/` on a cache miss. Raises `Cancelled` between chunks once
+    `cancelled()` is true; the document is then not recorded, and its partial
+    chunks are overwritten by the next ingest or removed by `gc --sweep`.
     """
-    chunks = load_pdf(pdf_path)
-    add_chunks(chunks, doc_id)
-    return len(chunks)
+    doc_key = ingest_cache.document_key(data, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+
+    n_chunks = ingest_cache.lookup(doc_key)
+    # the link only succeeds while the manifest row exists, so a document
+    # garbage-collected after the chunk check is ingested again below
+    if n_chunks is not None and has_chunks(doc_key, n_chunks) and ingest_cache.link_session(doc_id, doc_key):
+        return n_chunks
+
+    if pdf_path is None:
+        TMP_DIR.mkdir(exist_ok=True)
+        pdf_path = str(TMP_DIR / f"{uuid.uuid4()}.pdf")
+        Path(pdf_path).write_bytes(data)
+
+    # Large documents get a collection of their own (kept on re-ingest)
+    collection = ingest_cache.document_collections([doc_key]).get(doc_key)
+    if collection is None and PARTITION_MIN_PAGES and page_count(pdf_path) >= PARTITION_MIN_PAGES:
+        collection = partition_name(doc_key)
+        ingest_cache.set_document_collection(doc_key, collection)
+
+    # Embed and write chunks in batches while later pages are still being
+    # extracted, dropping near-duplicates before they are embedded
+    deduper = dedup.ChunkDeduplicator(doc_key) if dedup.DEDUP_ENABLED else None
+    n_chunks, batch = 0, []
+
+    def _flush(batch: List[str]) -> int:
+        if deduper is not None:
+            batch = deduper.filter(batch, start=n_chunks)
+        if batch:
+            add_chunks(batch, doc_key, start=n_chunks, collection=collection)
+        return len(batch)
+
+    for chunk in iter_chunks(pdf_path, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+        if cancelled is not None and cancelled():
+            raise Cancelled(f"ingest of {filename or doc_key} cancelled")
+        batch.append(chunk)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            n_chunks += _flush(batch)
+            batch = []
+    if batch:
+        n_chunks += _flush(batch)
+
+    ingest_cache.record(
+        doc_key,
+        data,
+        chunk_size=CHUNK_SIZE,
+        overlap=CHUNK_OVERLAP,
+        n_chunks=n_chunks,
+        filename=filename,
+    )
+    if deduper is not None:
+        deduper.finish()
+    ingest_cache.link_session(doc_id, doc_key)
+    return n_chunks
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 3. Generate question–answer pairs using context chunks
 # ──────────────────────────────────────────────────────────────────────────────
-def generate_qa_pairs(
-    doc_id: str,
-    n: int = 10,
-    topic: Optional[str] = None,
-    provider: str = "Ollama",
-    gemini_api_key: Optional[str] = None,
-    ollama_model: str = "gemma3:latest"
-) -> List[Dict[str, str]]:
-    query = topic if topic else "general"
-    all_chunks = similarity_search(query=query, k=50, doc_id=doc_id)
-
-    if not all_chunks:
-        raise ValueError(f"No chunks found for document: {doc_id}")
+# Large quizzes are split into shards of at most QA_SHARD_SIZE questions, each
+# grounded in its own group of chunks and generated concurrently. Chunks are
+# ordered by MMR and packed to a token budget by app.context_builder.
+QA_SHARD_SIZE = int(os.getenv("QA_SHARD_SIZE", "5"))
+QA_SHARD_CONCURRENCY = int(os.getenv("QA_SHARD_CONCURRENCY", "4"))
+QA_TOPUP_ROUNDS = int(os.getenv("QA_TOPUP_ROUNDS", "2"))
+CANCEL_POLL = 0.25  # seconds between cancellation checks while waiting for the provider
+CHUNKS_PER_SHARD = 8
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "50"))
+DUPLICATE_THRESHOLD = 0.8
+# Ask the provider for JSON output (Ollama `format="json"`, Gemini JSON MIME type)
+QA_JSON_MODE = os.getenv("QA_JSON_MODE", "0") == "1"
 
-    selected_chunks = random.sample(all_chunks, k=min(len(all_chunks), 8))
-    context = "\n".join(selected_chunks)[:2000]
 
+def _build_prompt(context: str, n: int, topic: Optional[str]) -> str:
     instruction = (
         f"Generate {n} question‑answer pairs focused on the topic '{topic}'."
         if topic else f"Generate {n} general exam-style question‑answer pairs."
     )
-
-    prompt = (
+    return (
         f"{_BASE_SYSTEM_PROMPT.strip()}\n\n"
         f"{instruction.strip()}\n\n"
         f"Context:\n{context.strip()}"
     )
 
-    if provider == "Gemini":
-        if not gemini_api_key:
-            raise ValueError("Gemini API key is required when provider is Gemini")
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        response_text = response.text
-    else:
-        response = _client.generate(model=ollama_model, prompt=prompt)
-        response_text = response["response"]
-
-    print("📦 MODEL RAW RESPONSE:\n", response_text)  # ✅ Right here
 
+def _iter_shard(
+    context: str,
+    n: int,
+    topic: Optional[str],
+    provider: str,
+    gemini_api_key: Optional[str],
+    ollama_model: str,
+    stop: threading.Event,
+    use_cache: bool = False,
+) -> Iterator[Dict[str, str]]:
+    """Yield pairs from one packed context as soon as each JSON item is complete."""
+    with metrics.span("prompt.build", tokens=context_builder.estimate_tokens(context)):
+        prompt = _build_prompt(context, n, topic)
+    parser = JsonObjectStream()
+    fragments = llm.stream(
+        provider,
+        prompt,
+        model=ollama_model,
+        api_key=gemini_api_key,
+        json_mode=QA_JSON_MODE,
+        use_cache=use_cache,
+        cache_if=lambda text: bool(JsonObjectStream().feed(text)),
+    )
+    parse_s = 0.0
     try:
-        return json.loads(_extract_first_json_array(response_text))
-    except Exception as exc:
-        raise ValueError("Could not parse model response as JSON list") from exc
+        for fragment in fragments:
+            t0 = time.perf_counter()
+            items = parser.feed(fragment)
+            parse_s += time.perf_counter() - t0
+            for item in items:
+                if item.get("question") and item.get("answer"):
+                    yield {"question": str(item["question"]), "answer": str(item["answer"]),
+                           "topic": str(item.get("topic") or topic or "General")}
+            if stop.is_set():
+                break
+    finally:
+        metrics.observe("parse", parse_s, skipped=parser.skipped)
+    if parser.skipped:
+        logger.warning("skipped %d malformed item(s) in model response", parser.skipped)
 
 
-# ──────────────────────────────────────────────────────────────────────────────
-# 4. Extract JSON array from LLM response text
-# ──────────────────────────────────────────────────────────────────────────────
-def _extract_first_json_array(text: str) -> str:
+def _question_tokens(question: str) -> frozenset:
+    return frozenset(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+def _is_near_duplicate(tokens: frozenset, seen: List[frozenset]) -> bool:
+    """Jaccard similarity of question words against already accepted questions."""
+    for other in seen:
+        union = len(tokens | other)
+        if union and len(tokens & other) / union >= DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def _shard_plan(n: int, candidates: List[context_builder.Candidate], budget: int) -> tuple:
     """
-    Extract the first valid JSON array from a string. Cleans bad characters.
+    Split `n` questions into shards and pack each a context from the front
+    of the MMR-ordered `candidates`. Returns the plan and the candidates not
+    packed into any context, so top-up rounds are grounded in material not
+    yet shown.
     """
-    import re
+    n_shards = max(1, -(-n // QA_SHARD_SIZE))
+    counts = [n // n_shards + (1 if i < n % n_shards else 0) for i in range(n_shards)]
+    contexts, used = context_builder.shard_contexts(candidates, n_shards, budget)
+    # fewer chunks than shards: let the extra shards share the best context
+    contexts = [c or contexts[0] for c in contexts]
+    shown = {id(c) for c in used}
+    return list(zip(counts, contexts)), [c for c in candidates if id(c) not in shown]
 
-    print("\n🪵 RAW RESPONSE FOR EXTRACTION:\n", text)  # Debug print
 
-    # Find the first list starting with [ and ending with ]
-    match = re.search(r"\[\s*{[\s\S]+?}\s*\]", text)
-    if not match:
-        raise ValueError("❌ No valid JSON array found in model response.")
+def iter_qa_pairs(
+    doc_id: str,
+    n: int = 10,
+    topic: Optional[str] = None,
+    provider: str = "Ollama",
+    gemini_api_key: Optional[str] = None,
+    ollama_model: str = MODEL,
+    use_cache: bool = False,
+    doc_keys: Optional[Sequence[str]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Yield up to `n` question‑answer pairs for session/document `doc_id` as
+    they are generated. `doc_keys` pins the documents to draw from instead
+    of whatever the session links at the time of the call. `cancelled` is
+    polled while waiting for the provider; once true, the shards are stopped
+    and `Cancelled` is raised.
 
-    json_text = match.group(0)
+    Shards stream concurrently from the provider; items are yielded in
+    arrival order, near-duplicate questions dropped, and any shortfall
+    topped up with further shards (up to QA_TOPUP_ROUNDS extra rounds).
+    Generation samples, so responses are not cached unless `use_cache=True`
+    (repeat prompts then return the same quiz until the cache entry expires).
+    """
+    if provider == "Gemini" and not gemini_api_key:
+        raise ValueError("Gemini API key is required when provider is Gemini")
+
+    query = topic if topic else "general"
+    # Sessions reference content-addressed documents; fall back to treating
+    # `doc_id` as a document key for chunks stored before the ingest cache.
+    doc_keys = list(doc_keys or ingest_cache.session_documents(doc_id) or [doc_id])
+    n_shards = max(1, -(-n // QA_SHARD_SIZE))
+    candidates = context_builder.retrieve(
+        query, k=max(CONTEXT_CANDIDATES, n_shards * CHUNKS_PER_SHARD), doc_ids=doc_keys
+    )
+    if not candidates:
+        raise ValueError(f"No chunks found for document: {doc_id}")
+    ordered = context_builder.mmr_order(candidates)
+    budget = context_builder.token_budget(provider, ollama_model)
+
+    results: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    _DONE = object()
+
+    def _run_shard(count: int, context: str) -> None:
+        try:
+            for item in _iter_shard(context, count, topic, provider, gemini_api_key, ollama_model, stop, use_cache):
+                results.put(item)
+        except Exception as exc:
+            results.put(exc)
+        finally:
+            results.put(_DONE)
+
+    accepted = 0
+    seen: List[frozenset] = []
+    errors: List[Exception] = []
+    missing = n
+    unused = ordered
+    pool = ThreadPoolExecutor(max_workers=max(1, min(QA_SHARD_CONCURRENCY, n_shards)))
+    try:
+        for _ in range(1 + QA_TOPUP_ROUNDS):
+            # once every candidate has been used, reshuffle for fresh groupings
+            plan, unused = _shard_plan(missing, unused or random.sample(ordered, k=len(ordered)), budget)
+            for count, context in plan:
+                pool.submit(metrics.bind(_run_shard), count, context)
+            running, round_errors = len(plan), 0
+            while running:
+                try:
+                    item = results.get(timeout=CANCEL_POLL if cancelled is not None else None)
+                except queue.Empty:
+                    item = None
+                if cancelled is not None and cancelled():
+                    raise Cancelled("question generation cancelled")
+                if item is None:
+                    continue
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    errors.append(item)
+                    round_errors += 1
+                elif accepted < n:
+                    tokens = _question_tokens(item["question"])
+                    if _is_near_duplicate(tokens, seen):
+                        continue
+                    seen.append(tokens)
+                    accepted += 1
+                    yield item
+                    if accepted >= n:
+                        stop.set()
+            missing = n - accepted
+            if missing <= 0 or round_errors == len(plan):
+                break
+    finally:
+        stop.set()
+        pool.shutdown(wait=False)
+
+    if not accepted:
+        if errors:
+            raise errors[0]
+        raise ValueError("Could not parse model response as JSON list")
 
-    # Replace curly quotes with standard ones
-    json_text = json_text.replace("“", '"').replace("”", '"')
-    json_text = json_text.replace("‘", "'").replace("’", "'")
 
-    return json_text
+def generate_qa_pairs(
+    doc_id: str,
+    n: int = 10,
+    topic: Optional[str] = None,
+    provider: str = "Ollama",
+    gemini_api_key: Optional[str] = None,
+    ollama_model: str = MODEL,
+    use_cache: bool = False,
+) -> List[Dict[str, str]]:
+    """Generate `n` question‑answer pairs; see `iter_qa_pairs`."""
+    return list(iter_qa_pairs(doc_id, n, topic, provider, gemini_api_key, ollama_model, use_cache))
@@ -0,0 +1,296 @@
+# app/question_bank.py
+"""
+Persistent question bank with background pre-generation.
+
+Generated `{question, answer, topic}` items are kept per bank, i.e. per set
+of content-hashed documents (`app.ingest_cache`) and normalised topic, in a
+local SQLite file. `iter_quiz` serves a quiz by sampling questions the
+session has not seen yet and only generates the shortfall live, skipping
+repeats of questions the session was already served; whatever it generates
+is deposited for later quizzes. When a session's unseen stock
+drops below `BANK_LOW_WATER`, a background worker generates another
+`BANK_REFILL_SIZE` questions, so the next quiz is a database read.
+"""
+
+from __future__ import annotations
+import hashlib, logging, os, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import ingest_cache, metrics
+from .qa_generator import MODEL, QA_TOPUP_ROUNDS, _is_near_duplicate, _question_tokens, iter_qa_pairs
+
+logger = logging.getLogger(__name__)
+
+BANK_PATH = Path(os.getenv("QUESTION_BANK_PATH", "question_bank.db"))
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "1") == "1"
+BANK_LOW_WATER = int(os.getenv("QUESTION_BANK_LOW_WATER", "20"))
+BANK_REFILL_SIZE = int(os.getenv("QUESTION_BANK_REFILL_SIZE", "20"))
+BANK_REFILL_WORKERS = int(os.getenv("QUESTION_BANK_REFILL_WORKERS", "1"))
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_pool = ThreadPoolExecutor(max_workers=BANK_REFILL_WORKERS, thread_name_prefix="bank-refill")
+_refilling: set = set()
+# bank_key -> (highest question id read, [(id, question tokens)]), extended as rows are added
+_tokens: Dict[str, Tuple[int, List[Tuple[int, frozenset]]]] = {}
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(BANK_PATH, timeout=30, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bank_key TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                topic TEXT,
+                qhash TEXT NOT NULL,
+                tokens TEXT,
+                provider TEXT,
+                model TEXT,
+                created_at REAL NOT NULL,
+                UNIQUE (bank_key, qhash)
+            );
+            CREATE TABLE IF NOT EXISTS served (
+                session_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                served_at REAL NOT NULL,
+                PRIMARY KEY (session_id, question_id)
+            );
+            """
+        )
+        if "tokens" not in {row[1] for row in _conn.execute("PRAGMA table_info(questions)")}:
+            _add_tokens(_conn)
+    return _conn
+
+
+def _add_tokens(conn: sqlite3.Connection) -> None:
+    """Store each question's token set, so duplicate checks need not re-tokenise the bank."""
+    with conn:
+        try:
+            conn.execute("ALTER TABLE questions ADD COLUMN tokens TEXT")
+        except sqlite3.OperationalError as exc:  # another process added it first
+            if "duplicate column" not in str(exc):
+                raise
+        rows = conn.execute("SELECT id, question FROM questions WHERE tokens IS NULL").fetchall()
+        conn.executemany("UPDATE questions SET tokens = ? WHERE id = ?",
+                         [(_token_text(q), i) for i, q in rows])
+
+
+def bank_key(doc_keys: Sequence[str], topic: Optional[str]) -> str:
+    """Bank identifier for a set of document keys and a topic (None = general)."""
+    topic = " ".join((topic or "").lower().split())
+    return hashlib.sha256("\n".join([*sorted(set(doc_keys)), topic]).encode("utf-8")).hexdigest()[:32]
+
+
+def _token_text(question: str) -> str:
+    return " ".join(sorted(_question_tokens(question)))
+
+
+def _bank_tokens(conn: sqlite3.Connection, key: str) -> List[Tuple[int, frozenset]]:
+    """Question ids and token sets of bank `key`; only rows added since the last call are read."""
+    last, rows = _tokens.get(key, (0, []))
+    for question_id, tokens in conn.execute(
+        "SELECT id, tokens FROM questions WHERE bank_key = ? AND id > ? ORDER BY id", (key, last)
+    ):
+        rows.append((question_id, frozenset(tokens.split())))
+        last = question_id
+    _tokens[key] = (last, rows)
+    return rows
+
+
+def deposit(key: str, items: Sequence[Dict], *, provider: Optional[str] = None,
+            model: Optional[str] = None) -> List[Optional[int]]:
+    """
+    Add generated items to bank `key`, skipping near-duplicates of questions
+    already there. Returns each item's question id (None if skipped).
+    """
+    now = time.time()
+    ids: List[Optional[int]] = []
+    with _lock:
+        conn = _connection()
+        seen = [tokens for _, tokens in _bank_tokens(conn, key)]
+        for item in items:
+            tokens = _question_tokens(item["question"])
+            if _is_near_duplicate(tokens, seen):
+                ids.append(None)
+                continue
+            text = " ".join(sorted(tokens))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO questions "
+                "(bank_key, question, answer, topic, qhash, tokens, provider, model, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, item["question"], item["answer"], item.get("topic"),
+                 hashlib.sha256(text.encode("utf-8")).hexdigest(), text, provider, model, now),
+            )
+            seen.append(tokens)
+            ids.append(cur.lastrowid if cur.rowcount else None)
+        conn.commit()
+    return ids
+
+
+def take(session_id: str, key: str, n: int) -> List[Dict]:
+    """Sample up to `n` questions of bank `key` not yet served to `session_id` and mark them served."""
+    with _lock:
+        conn = _connection()
+        rows = conn.execute(
+            "SELECT id, question, answer, topic FROM questions q WHERE bank_key = ? AND NOT EXISTS "
+            "(SELECT 1 FROM served s WHERE s.session_id = ? AND s.question_id = q.id) "
+            "ORDER BY random() LIMIT ?",
+            (key, session_id, n),
+        ).fetchall()
+        _mark_served(conn, session_id, [r[0] for r in rows])
+    return [{"question": q, "answer": a, "topic": t or "General"} for _, q, a, t in rows]
+
+
+def _mark_served(conn: sqlite3.Connection, session_id: str, ids: Sequence[int]) -> None:
+    now = time.time()
+    conn.executemany(
+        "INSERT OR IGNORE INTO served (session_id, question_id, served_at) VALUES (?, ?, ?)",
+        [(session_id, i, now) for i in ids],
+    )
+    conn.commit()
+
+
+def _served_ids(conn: sqlite3.Connection, session_id: str) -> set:
+    return {i for (i,) in conn.execute("SELECT question_id FROM served WHERE session_id = ?", (session_id,))}
+
+
+def _served_questions(conn: sqlite3.Connection, session_id: str, key: str) -> List[frozenset]:
+    served = _served_ids(conn, session_id)
+    return [tokens for question_id, tokens in _bank_tokens(conn, key) if question_id in served]
+
+
+def _unseen_match(conn: sqlite3.Connection, session_id: str, key: str, tokens: frozenset) -> Optional[int]:
+    """Id of a question of bank `key` not served to `session_id` that is a near-duplicate of `tokens`."""
+    served = _served_ids(conn, session_id)
+    for question_id, other in _bank_tokens(conn, key):
+        if question_id not in served and _is_near_duplicate(tokens, [other]):
+            return question_id
+    return None
+
+
+def unseen(session_id: str, key: str) -> int:
+    """Questions of bank `key` that `session_id` has not been served."""
+    with _lock:
+        return _connection().execute(
+            "SELECT COUNT(*) FROM questions q WHERE bank_key = ? AND NOT EXISTS "
+            "(SELECT 1 FROM served s WHERE s.session_id = ? AND s.question_id = q.id)",
+            (key, session_id),
+        ).fetchone()[0]
+
+
+def stats() -> List[Dict]:
+    """Question count per bank."""
+    with _lock:
+        rows = _connection().execute(
+            "SELECT bank_key, COUNT(*), MAX(created_at) FROM questions GROUP BY bank_key"
+        ).fetchall()
+    return [{"bank_key": k, "questions": n, "last_added": t} for k, n, t in rows]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Serving & refill
+# ──────────────────────────────────────────────────────────────────────────────
+def request_refill(
+    key: str,
+    doc_keys: Sequence[str],
+    topic: Optional[str],
+    provider: str = "Ollama",
+    gemini_api_key: Optional[str] = None,
+    ollama_model: str = MODEL,
+) -> bool:
+    """
+    Generate `BANK_REFILL_SIZE` more questions for bank `key` in the
+    background (once at a time), from the documents `doc_keys` the bank
+    was derived from.
+    """
+    with _lock:
+        if key in _refilling:
+            return False
+        _refilling.add(key)
+
+    def _run() -> None:
+        try:
+            with metrics.span("bank.refill", n=BANK_REFILL_SIZE) as attrs:
+                items = list(iter_qa_pairs(f"bank:{key}", BANK_REFILL_SIZE, topic, provider, gemini_api_key,
+                                           ollama_model, use_cache=False, doc_keys=doc_keys))
+                added = deposit(key, items, provider=provider, model=ollama_model)
+                attrs["added"] = sum(i is not None for i in added)
+        except Exception:
+            logger.exception("question bank refill failed for %s", key)
+        finally:
+            with _lock:
+                _refilling.discard(key)
+
+    _pool.submit(metrics.bind(_run))
+    return True
+
+
+def iter_quiz(
+    doc_id: str,
+    n: int = 10,
+    topic: Optional[str] = None,
+    provider: str = "Ollama",
+    gemini_api_key: Optional[str] = None,
+    ollama_model: str = MODEL,
+    use_cache: bool = False,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Drop-in for `iter_qa_pairs`: yield banked questions session `doc_id` has
+    not seen, then generate (and bank) the rest, and top the bank up in the
+    background if it is running low. Generated questions the session was
+    already served are dropped and replaced, for up to QA_TOPUP_ROUNDS extra
+    rounds. `use_cache` only applies without a bank; live generation for a
+    bank is never cached, as a cached reply would repeat banked questions.
+    """
+    doc_keys = ingest_cache.session_documents(doc_id)
+    if not QUESTION_BANK_ENABLED or not doc_keys:
+        yield from iter_qa_pairs(doc_id, n, topic, provider, gemini_api_key, ollama_model, use_cache,
+                                 cancelled=cancelled)
+        return
+
+    key = bank_key(doc_keys, topic)
+    with metrics.span("bank.take", n=n) as attrs:
+        banked = take(doc_id, key, n)
+        attrs["hits"] = len(banked)
+    metrics.incr("bank_questions_served_total", len(banked))
+    yield from banked
+
+    missing = n - len(banked)
+    if missing > 0:
+        with _lock:
+            served = _served_questions(_connection(), doc_id, key)
+        for _ in range(1 + QA_TOPUP_ROUNDS):
+            generated = 0
+            for item in iter_qa_pairs(doc_id, missing, topic, provider, gemini_api_key, ollama_model,
+                                      use_cache=False, doc_keys=doc_keys, cancelled=cancelled):
+                generated += 1
+                tokens = _question_tokens(item["question"])
+                if _is_near_duplicate(tokens, served):
+                    metrics.incr("bank_repeats_dropped_total")
+                    continue
+                (question_id,) = deposit(key, [item], provider=provider, model=ollama_model)
+                with _lock:
+                    conn = _connection()
+                    if question_id is None:  # matches a banked question this session has not had yet
+                        question_id = _unseen_match(conn, doc_id, key, tokens)
+                    if question_id is not None:
+                        _mark_served(conn, doc_id, [question_id])
+                served.append(tokens)
+                missing -= 1
+                yield item
+                if not missing:
+                    break
+            if not missing or not generated:  # done, or the provider has nothing more to give
+                break
+
+    if unseen(doc_id, key) < BANK_LOW_WATER:
+        request_refill(key, doc_keys, topic, provider, gemini_api_key, ollama_model)
@@ -0,0 +1,245 @@
+# app/registry.py
+"""
+Single, lazily initialised home for heavy shared resources: the embedding
+model, the Chroma client/collection and the LLM clients.
+
+Nothing is loaded at import time. Each resource is created on first use,
+exactly once per process, and the time it took is recorded so cold-start
+regressions show up in `startup_timings()` or `python -m app.registry`.
+"""
+
+from __future__ import annotations
+import inspect, logging, os, sqlite3, threading, time
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "all-MiniLM-L6-v2")
+CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", "chroma_store")
+COLLECTION_NAME = "exam_chunks"
+# Store locations used by earlier releases: `.chromadb` was the documented
+# CHROMA_PERSIST_DIR, while quiz chunks were always written to `chroma_store`
+KNOWN_CHROMA_DIRS = (".chromadb", "chroma_store")
+OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:latest")  # default for generation and grading
+OLLAMA_GRADE_MODEL = os.getenv("OLLAMA_GRADE_MODEL") or OLLAMA_MODEL  # e.g. a fine-tuned grader
+# How long Ollama keeps a model loaded after a request (e.g. "30m", "-1" = forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_PRELOAD = os.getenv("OLLAMA_PRELOAD", "1") == "1"
+GEMINI_MODEL = "gemini-2.5-flash"
+
+_lock = threading.RLock()
+_instances: Dict[Tuple, Any] = {}
+_timings: Dict[str, float] = {}
+_warmup_thread: threading.Thread | None = None
+
+
+def _singleton(fn: Callable) -> Callable:
+    """Create the resource once per argument tuple and record its init time."""
+    sig = inspect.signature(fn)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__name__, *bound.arguments.values())
+        if key in _instances:
+            return _instances[key]
+        with _lock:
+            if key not in _instances:
+                t0 = time.perf_counter()
+                _instances[key] = fn(*bound.args, **bound.kwargs)
+                _timings[fn.__name__] = time.perf_counter() - t0
+                logger.info("initialised %s in %.2fs", fn.__name__, _timings[fn.__name__])
+        return _instances[key]
+    return wrapper
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Embeddings & vector store
+# ──────────────────────────────────────────────────────────────────────────────
+@_singleton
+def embedding_function():
+    """Chroma embedding function backed by the shared MiniLM model."""
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    return SentenceTransformerEmbeddingFunction(model_name=EMB_MODEL_NAME)
+
+
+@_singleton
+def sentence_transformer():
+    """The `SentenceTransformer` used by `embedding_function`, for direct encoding."""
+    model = getattr(embedding_function(), "_model", None)
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMB_MODEL_NAME)
+    return model
+
+
+def _collection_names(path: str) -> set:
+    """Collections in the Chroma store at `path` (empty if there is none)."""
+    db = Path(path) / "chroma.sqlite3"
+    if not db.is_file():
+        return set()
+    try:
+        conn = sqlite3.connect(db.resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            return {name for (name,) in conn.execute("SELECT name FROM collections")}
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return set()
+
+
+@_singleton
+def store_dir() -> str:
+    """
+    Directory of the Chroma store: CHROMA_DIR, unless that is one of the
+    legacy KNOWN_CHROMA_DIRS without an `exam_chunks` collection while another
+    of them has one. Then the chunks are used where they actually are, so an
+    old `.env` does not start over with an empty store. A custom CHROMA_DIR is
+    always used, with a warning if the chunks seem to live elsewhere.
+    """
+    if COLLECTION_NAME in _collection_names(CHROMA_DIR):
+        return CHROMA_DIR
+    configured = Path(CHROMA_DIR).resolve()
+    legacy = any(Path(d).resolve() == configured for d in KNOWN_CHROMA_DIRS)
+    for other in KNOWN_CHROMA_DIRS:
+        if Path(other).resolve() == configured or COLLECTION_NAME not in _collection_names(other):
+            continue
+        if legacy:
+            logger.warning(
+                "CHROMA_PERSIST_DIR=%s has no %r collection; using the store in %s instead. "
+                "Set CHROMA_PERSIST_DIR=%s to silence this (see README, Upgrading from an older version)",
+                CHROMA_DIR, COLLECTION_NAME, other, other,
+            )
+            return other
+        logger.warning(
+            "vector store %s has no %r collection but %s does; documents ingested there will be "
+            "re-ingested. Set CHROMA_PERSIST_DIR=%s to keep using it",
+            CHROMA_DIR, COLLECTION_NAME, other, other,
+        )
+    return CHROMA_DIR
+
+
+@_singleton
+def chroma_client():
+    from chromadb import PersistentClient
+    return PersistentClient(path=store_dir())
+
+
+def chroma_client_open() -> bool:
+    """Whether this process has opened the Chroma client."""
+    return ("chroma_client",) in _instances
+
+
+@_singleton
+def collection(name: str = COLLECTION_NAME):
+    return chroma_client().get_or_create_collection(
+        name=name,
+        embedding_function=embedding_function(),
+    )
+
+
+def drop_collection(name: str) -> None:
+    """Delete collection `name` and forget its cached handle."""
+    with _lock:
+        _instances.pop(("collection", name), None)
+        try:
+            chroma_client().delete_collection(name)
+        except Exception as exc:  # the error type for a missing collection varies by backend
+            if "does not exist" not in str(exc):
+                raise
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LLM clients
+# ──────────────────────────────────────────────────────────────────────────────
+@_singleton
+def ollama_client():
+    """One Ollama client per process; its httpx pool keeps connections open between calls."""
+    import httpx
+    from ollama import Client
+    return Client(
+        host=OLLAMA_URL,
+        timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=300),
+    )
+
+
+def preload_ollama_model(model: str = OLLAMA_MODEL) -> None:
+    """Load `model` into Ollama's memory (an empty prompt) so the first real request skips the cold load."""
+    t0 = time.perf_counter()
+    ollama_client().generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+    _timings["ollama_model"] = time.perf_counter() - t0
+
+
+@_singleton
+def gemini_client(api_key: str):
+    """
+    One `google.genai` client per API key. The key belongs to the client, not
+    to the process, so concurrent sessions with different keys never send
+    requests under each other's credentials.
+    """
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Warm-up & timings
+# ──────────────────────────────────────────────────────────────────────────────
+def warm_up(background: bool = True) -> None:
+    """
+    Load the embedding model, open the vector store and load the default
+    Ollama model ahead of the first request. With `background=True` this
+    returns immediately.
+    """
+    global _warmup_thread
+
+    def _run():
+        try:
+            collection()
+            sentence_transformer()
+            ollama_client()
+        except Exception:
+            logger.exception("warm-up failed")
+        if OLLAMA_PRELOAD:
+            try:
+                preload_ollama_model()
+            except Exception as exc:  # Ollama may be down or only Gemini in use
+                logger.warning("could not preload Ollama model %s: %s", OLLAMA_MODEL, exc)
+
+    if not background:
+        _run()
+        return
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run, name="registry-warmup", daemon=True)
+            _warmup_thread.start()
+
+
+def startup_timings() -> Dict[str, float]:
+    """Seconds spent initialising each resource created so far."""
+    return dict(_timings)
+
+
+if __name__ == "__main__":
+    import importlib, json
+
+    t0 = time.perf_counter()
+    for mod in ("app.qa_generator", "app.scoring", "app.vector_store"):
+        importlib.import_module(mod)
+    import_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    warm_up(background=False)
+    warm_s = time.perf_counter() - t0
+
+    print(json.dumps({"import_s": round(import_s, 3), "warm_up_s": round(warm_s, 3),
+                      "resources": {k: round(v, 3) for k, v in startup_timings().items()}}, indent=2))
@@ -0,0 +1,263 @@
+# app/report.py
+"""
+Quiz PDF reports and bulk results export.
+
+    python -m app.report results.csv [--since 2024-09-01] [--until ...] [--session ID]
+    python -m app.report results.parquet        # needs pyarrow
+
+`submit_quiz_pdf` renders the summary PDF for a graded result set in a
+background worker, once per content hash; Streamlit reruns get the cached
+bytes. `export_csv` / `export_parquet` stream the `results` table in
+batches of `EXPORT_BATCH_SIZE` rows, so memory stays flat however many
+results are stored. `submit_export` runs them on a separate pool of
+`EXPORT_WORKERS` threads, so a long export never delays a quiz PDF; its
+files live in a private temporary directory and are deleted when replaced
+(`discard_export`), after `EXPORT_RETENTION_SECONDS`, or at exit.
+"""
+
+from __future__ import annotations
+import argparse, atexit, csv, hashlib, json, os, shutil, sqlite3, sys, tempfile, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import metrics, results_store
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "32"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))
+EXPORT_RETENTION = float(os.getenv("EXPORT_RETENTION_SECONDS", "3600"))
+EXPORT_COLUMNS = ("id",) + results_store.COLUMNS
+
+_pool = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_cache: "OrderedDict[str, Future]" = OrderedDict()
+_cache_lock = threading.Lock()
+_export_pool = ThreadPoolExecutor(max_workers=max(1, EXPORT_WORKERS), thread_name_prefix="export")
+_export_dir: Optional[Path] = None
+_export_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 1. Quiz summary PDF
+# ──────────────────────────────────────────────────────────────────────────────
+def render_quiz_pdf(results: Sequence[Dict]) -> bytes:
+    """
+    Robust PDF generator that never crashes, even with long or odd text.
+    """
+    from fpdf import FPDF
+
+    def latin1(text, maxlen=300):
+        """Return a latin‑1–safe, clipped string."""
+        if text is None:
+            return "N/A"
+        s = str(text).replace("\n", " ").replace("\r", " ").strip()
+        # Break long unspaced words every 50 chars
+        s = " ".join([s[i:i + 50] for i in range(0, len(s), 50)])
+        if len(s) > maxlen:
+            s = s[:maxlen] + "..."
+        # Replace characters outside Latin‑1 range
+        return s.encode("latin1", "replace").decode("latin1")
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, latin1("Exam Quiz Summary"), ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", size=12)
+
+    full_width = pdf.w - pdf.l_margin - pdf.r_margin  # safe width for all cells
+
+    for idx, g in enumerate(results, 1):
+        pdf.multi_cell(full_width, 8, latin1(f"Q{idx}: {g.get('question')}"))
+        # Use cell (single‑line) for score to avoid wrapping issues
+        pdf.cell(full_width, 8, latin1(f"Your Score: {g.get('score', 0):.0%}"), ln=True)
+        pdf.multi_cell(full_width, 8, latin1(f"Your Answer: {g.get('student')}"))
+        pdf.multi_cell(full_width, 8, latin1(f"Correct Answer: {g.get('answer')}"))
+        pdf.multi_cell(full_width, 8, latin1(f"Feedback: {g.get('feedback')}"))
+        pdf.ln(4)
+
+    return bytes(pdf.output(dest="S"))
+
+
+def results_hash(results: Sequence[Dict]) -> str:
+    """Content hash of the fields the PDF shows."""
+    fields = [[g.get(k) for k in ("question", "score", "student", "answer", "feedback")] for g in results]
+    return hashlib.sha256(json.dumps(fields, default=str).encode("utf-8")).hexdigest()
+
+
+def _render(results: List[Dict]) -> bytes:
+    with metrics.span("report.pdf", questions=len(results)):
+        return render_quiz_pdf(results)
+
+
+def submit_quiz_pdf(results: Sequence[Dict]) -> Future:
+    """Return a future for the PDF of `results`, starting the render only if it isn't cached."""
+    key = results_hash(results)
+    with _cache_lock:
+        fut = _cache.get(key)
+        if fut is not None and not (fut.done() and fut.exception() is not None):
+            _cache.move_to_end(key)
+            return fut
+        fut = _cache[key] = _pool.submit(_render, [dict(g) for g in results])
+        while len(_cache) > REPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+        return fut
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 2. Bulk results export
+# ──────────────────────────────────────────────────────────────────────────────
+def _ts_bounds(since: Optional[date], until: Optional[date]) -> Tuple[float, float]:
+    """UTC day bounds, matching the analytics rollups."""
+    lo = datetime(since.year, since.month, since.day, tzinfo=timezone.utc).timestamp() if since else float("-inf")
+    hi = ((datetime(until.year, until.month, until.day, tzinfo=timezone.utc) + timedelta(days=1)).timestamp()
+          if until else float("inf"))
+    return lo, hi
+
+
+def iter_result_batches(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    session_id: Optional[str] = None,
+    *,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    path: Optional[Path] = None,
+) -> Iterator[List[tuple]]:
+    """Yield rows of `EXPORT_COLUMNS` in id order, `batch_size` at a time."""
+    lo, hi = _ts_bounds(since, until)
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM results WHERE ts >= ? AND ts < ?"
+    params: list = [lo, hi]
+    if session_id:
+        sql += " AND session_id = ?"
+        params.append(session_id)
+    uri = Path(path or results_store.DB_PATH).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=30)
+    try:
+        cur = conn.execute(sql + " ORDER BY id", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def export_csv(out: Path, **filters) -> int:
+    """Write matching results to CSV at `out`; returns the row count."""
+    n = 0
+    with metrics.span("report.export", format="csv") as attrs, \
+         open(out, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in iter_result_batches(**filters):
+            writer.writerows(rows)
+            n += len(rows)
+        attrs["rows"] = n
+    return n
+
+
+def export_parquet(out: Path, **filters) -> int:
+    """Write matching results to Parquet at `out`, one row group per batch."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from exc
+
+    types = {"id": pa.int64(), "ts": pa.float64(), "score": pa.float64()}
+    schema = pa.schema([(c, types.get(c, pa.string())) for c in EXPORT_COLUMNS])
+    n = 0
+    with metrics.span("report.export", format="parquet") as attrs, pq.ParquetWriter(str(out), schema) as writer:
+        for rows in iter_result_batches(**filters):
+            columns = list(zip(*rows))
+            writer.write_table(pa.table(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+            ))
+            n += len(rows)
+        if not n:
+            writer.write_table(schema.empty_table())
+        attrs["rows"] = n
+    return n
+
+
+EXPORTERS = {"csv": export_csv, "parquet": export_parquet}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _exports() -> Path:
+    """The private directory export files are written to, removed at exit."""
+    global _export_dir
+    with _export_lock:
+        if _export_dir is None:
+            _export_dir = Path(tempfile.mkdtemp(prefix="quiz_exports-"))
+            atexit.register(shutil.rmtree, _export_dir, ignore_errors=True)
+        return _export_dir
+
+
+def _purge_exports(now: Optional[float] = None) -> None:
+    cutoff = (time.time() if now is None else now) - EXPORT_RETENTION
+    for path in _exports().iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def submit_export(fmt: str, **filters) -> Future:
+    """Export to a temporary `.csv` / `.parquet` file in the background; the future yields its path."""
+    _purge_exports()
+
+    def _run() -> Path:
+        results_store.get_store().flush()  # include submissions still queued for writing
+        fd, name = tempfile.mkstemp(prefix="quiz_results-", suffix=f".{fmt}", dir=_exports())
+        os.close(fd)
+        try:
+            EXPORTERS[fmt](Path(name), **filters)
+        except BaseException:
+            Path(name).unlink(missing_ok=True)
+            raise
+        return Path(name)
+    return _export_pool.submit(_run)
+
+
+def discard_export(fut: Optional[Future]) -> None:
+    """Delete the file of an export from `submit_export`, once it has been written."""
+    def _unlink(done: Future) -> None:
+        if not done.cancelled() and done.exception() is None:
+            done.result().unlink(missing_ok=True)
+    if fut is not None and not fut.cancel():
+        fut.add_done_callback(_unlink)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.report", description="Export stored quiz results.")
+    parser.add_argument("out", type=Path, help="output file (.csv or .parquet)")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day (UTC, YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day (UTC, YYYY-MM-DD)")
+    parser.add_argument("--session", help="only this session id")
+    args = parser.parse_args(argv)
+
+    fmt = args.out.suffix.lstrip(".").lower()
+    if fmt not in EXPORTERS:
+        parser.error("output must end in .csv or .parquet")
+    n = EXPORTERS[fmt](args.out, since=args.since, until=args.until, session_id=args.session)
+    print(json.dumps({"rows": n, "out": str(args.out)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
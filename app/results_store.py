@@ -0,0 +1,230 @@
+# app/results_store.py
+"""
+High-throughput store for graded quiz results.
+
+A single background writer thread owns the SQLite connection (WAL mode)
+and drains a queue of submissions, inserting each drained batch with one
+`executemany` in one transaction. UI threads only enqueue, so they never
+block on disk or hit "database is locked". The schema is versioned via
+`PRAGMA user_version` and migrated once when the store is opened. The
+analytics rollup tables are updated in the same transaction as each batch.
+"""
+
+from __future__ import annotations
+import atexit, logging, os, queue, sqlite3, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(os.getenv("RESULTS_DB_PATH", "quiz_results.db"))
+_MAX_BATCH = 500  # submissions written per transaction
+
+# Each entry upgrades the schema from version i to i + 1
+MIGRATIONS: List[str] = [
+    # 1: original results table
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        question TEXT,
+        student TEXT,
+        answer TEXT,
+        score REAL,
+        feedback TEXT
+    );
+    """,
+    # 2: session/document/topic/provider columns and a sortable epoch timestamp
+    """
+    ALTER TABLE results ADD COLUMN session_id TEXT;
+    ALTER TABLE results ADD COLUMN doc_id TEXT;
+    ALTER TABLE results ADD COLUMN topic TEXT;
+    ALTER TABLE results ADD COLUMN provider TEXT;
+    ALTER TABLE results ADD COLUMN ts REAL;
+    UPDATE results SET ts = CAST(strftime('%s', timestamp) AS REAL) WHERE ts IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_results_session ON results (session_id);
+    CREATE INDEX IF NOT EXISTS idx_results_topic ON results (topic);
+    CREATE INDEX IF NOT EXISTS idx_results_ts ON results (ts);
+    """,
+    # 3: rollups maintained incrementally by `analytics.apply_rollups`
+    """
+    CREATE TABLE IF NOT EXISTS rollup_daily (
+        day TEXT PRIMARY KEY, n INTEGER NOT NULL, score_sum REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rollup_question (
+        day TEXT NOT NULL, question TEXT NOT NULL, n INTEGER NOT NULL, score_sum REAL NOT NULL,
+        PRIMARY KEY (day, question)
+    );
+    CREATE TABLE IF NOT EXISTS rollup_topic (
+        day TEXT NOT NULL, topic TEXT NOT NULL, n INTEGER NOT NULL, score_sum REAL NOT NULL,
+        PRIMARY KEY (day, topic)
+    );
+    CREATE TABLE IF NOT EXISTS rollup_session (
+        session_id TEXT PRIMARY KEY, n INTEGER NOT NULL, score_sum REAL NOT NULL,
+        first_ts REAL NOT NULL, last_ts REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rollup_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO rollup_meta (id, version) VALUES (1, 0);
+    INSERT INTO rollup_daily
+        SELECT date(ts, 'unixepoch'), COUNT(*), TOTAL(score) FROM results
+        WHERE ts IS NOT NULL GROUP BY 1;
+    INSERT INTO rollup_question
+        SELECT date(ts, 'unixepoch'), question, COUNT(*), TOTAL(score) FROM results
+        WHERE ts IS NOT NULL AND question IS NOT NULL GROUP BY 1, 2;
+    INSERT INTO rollup_topic
+        SELECT date(ts, 'unixepoch'), topic, COUNT(*), TOTAL(score) FROM results
+        WHERE ts IS NOT NULL AND topic IS NOT NULL GROUP BY 1, 2;
+    INSERT INTO rollup_session
+        SELECT session_id, COUNT(*), TOTAL(score), MIN(ts), MAX(ts) FROM results
+        WHERE ts IS NOT NULL AND session_id IS NOT NULL GROUP BY 1;
+    """,
+]
+
+# Column order of the row tuples queued for writing (also read by analytics)
+COLUMNS = ("timestamp", "ts", "question", "student", "answer", "score", "feedback",
+           "session_id", "doc_id", "topic", "provider")
+_INSERT = (
+    f"INSERT INTO results ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    """Open a connection with the settings every results connection uses."""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0 and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'"
+    ).fetchone():
+        version = 1  # database created before versioning
+    return version
+
+
+def _statements(script: str) -> List[str]:
+    statements, current = [], ""
+    for part in script.split(";"):
+        current += part + ";"
+        if sqlite3.complete_statement(current):
+            if current.strip(" \n;"):
+                statements.append(current.strip())
+            current = ""
+    return statements
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the schema up to date; returns the resulting version. Each step
+    runs under `BEGIN IMMEDIATE` and re-reads the version inside it, so
+    processes opening the store together (UI and batch CLI) migrate once.
+    """
+    version = _schema_version(conn)
+    if version >= len(MIGRATIONS):
+        return version
+    isolation, conn.isolation_level = conn.isolation_level, None  # explicit transactions below
+    try:
+        while version < len(MIGRATIONS):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = _schema_version(conn)
+                if version < len(MIGRATIONS):
+                    version += 1
+                    for statement in _statements(MIGRATIONS[version - 1]):
+                        conn.execute(statement)  # not executescript: it would commit first
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    logger.info("migrated results schema to version %d", version)
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation
+    return version
+
+
+class ResultsStore:
+    """Queue-backed writer for the `results` table."""
+
+    def __init__(self, path: Path = DB_PATH):
+        self.path = path
+        self._conn = connect(path)
+        migrate(self._conn)
+        self._queue: "queue.Queue[List[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="results-writer", daemon=True)
+        self._writer.start()
+
+    def store(
+        self,
+        graded: Iterable[Dict],
+        *,
+        session_id: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        provider: Optional[str] = None,
+    ) -> None:
+        """Queue one graded submission for writing; returns immediately."""
+        now = datetime.now(timezone.utc)
+        stamp, ts = now.replace(tzinfo=None).isoformat(), now.timestamp()
+        rows = [
+            (stamp, ts, g["question"], g["student"], g["answer"], g["score"], g["feedback"],
+             session_id, doc_id, g.get("topic"), provider)
+            for g in graded
+        ]
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self) -> None:
+        """Block until every queued submission has been written."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            batches = [self._queue.get()]
+            while len(batches) < _MAX_BATCH:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write([row for rows in batches for row in rows])
+            except Exception:
+                logger.exception("failed to write %d result submission(s)", len(batches))
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+    def _write(self, rows: List[tuple]) -> None:
+        from . import analytics  # imported here: analytics reads through this module
+
+        for attempt in range(5):
+            try:
+                with self._conn:
+                    self._conn.executemany(_INSERT, rows)
+                    analytics.apply_rollups(self._conn, rows)
+                return
+            except sqlite3.OperationalError as exc:
+                if "locked" not in str(exc) or attempt == 4:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+
+_store: Optional[ResultsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ResultsStore:
+    """Return the process-wide store, opening and migrating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore()
+            atexit.register(_store.flush)
+        return _store
@@ -1,18 +1,29 @@
-# app/grader.py
+# app/scoring.py
 
+import logging
 import os
 import re
-from typing import Dict, Optional
-from dotenv import load_dotenv
-from ollama import Client
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from . import llm, metrics, registry
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-MODEL = os.getenv("OLLAMA_MODEL", "tinyllama-qa")  # 👈 updated to fine-tuned model
+MODEL = registry.OLLAMA_GRADE_MODEL  # OLLAMA_GRADE_MODEL, else the generation model (OLLAMA_MODEL)
 
-client = Client(host=OLLAMA_URL)
+# Max in-flight grading calls per provider for `grade_batch`
+GRADE_CONCURRENCY = {
+    "Ollama": int(os.getenv("GRADE_CONCURRENCY_OLLAMA", "4")),
+    "Gemini": int(os.getenv("GRADE_CONCURRENCY_GEMINI", "8")),
+}
+
+# Embedding fast path (off by default): answers at/above ACCEPT cosine similarity
+# to the reference that also keep its numbers and negations score 1.0, answers
+# at/below REJECT sharing no word with it score 0.0; everything else goes to the LLM
+FAST_GRADE = os.getenv("FAST_GRADE", "0") == "1"
+FAST_GRADE_ACCEPT = float(os.getenv("FAST_GRADE_ACCEPT", "0.92"))
+FAST_GRADE_REJECT = float(os.getenv("FAST_GRADE_REJECT", "0.15"))
+FAST_GRADE_BATCH_SIZE = int(os.getenv("FAST_GRADE_BATCH_SIZE", "64"))
 
 GRADE_PROMPT = """
 You are a strict teacher. Evaluate the student's answer to the following question:
@@ -31,7 +42,8 @@ def grade(
     question: Optional[str] = None,
     provider: str = "Ollama",
     gemini_api_key: Optional[str] = None,
-    ollama_model: str = "tinyllama-qa"
+    ollama_model: str = MODEL,
+    use_cache: bool = True,
 ) -> Dict:
     prompt = GRADE_PROMPT.format(
         reference=reference.strip(),
@@ -39,18 +51,27 @@ def grade(
         question=question.strip() if question else ""
     )
 
-    if provider == "Gemini":
-        if not gemini_api_key:
-            return {"score": 0.0, "feedback": "Gemini API key is required when provider is Gemini"}
-        genai.configure(api_key=gemini_api_key)
-        # Using a model tailored for evaluation tasks or flash
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        text = response.text
-    else:
-        response = client.generate(model=ollama_model, prompt=prompt, stream=False)
-        text = response["response"]
+    if provider == "Gemini" and not gemini_api_key:
+        return {"score": 0.0, "feedback": "Gemini API key is required when provider is Gemini"}
+
+    # Using a model tailored for evaluation tasks (or Gemini flash)
+    text = llm.complete(
+        provider,
+        prompt,
+        model=ollama_model,
+        api_key=gemini_api_key,
+        use_cache=use_cache,
+        cache_if=lambda t: _parse_grade(t) is not None,
+    )
 
+    parsed = _parse_grade(text)
+    if parsed is None:
+        return {"score": 0.0, "feedback": "Could not parse grading response."}
+    return parsed
+
+
+def _parse_grade(text: str) -> Optional[Dict]:
+    """Extract score and feedback from a grading response, or None."""
     try:
         score_line = [line for line in text.splitlines() if "Score" in line][0]
         feedback_line = [line for line in text.splitlines() if "Feedback" in line][0]
@@ -58,4 +79,131 @@ def grade(
         feedback = feedback_line.split(":", 1)[-1].strip()
         return {"score": score, "feedback": feedback}
     except Exception:
-        return {"score": 0.0, "feedback": "Could not parse grading response."}
+        return None
+
+
+NEGATIONS = frozenset({"no", "not", "never", "none", "nor", "neither", "cannot", "without"})
+
+
+def _normalise_answer(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower().replace("n't", " not")))
+
+
+def _same_facts(reference: str, student: str) -> bool:
+    """
+    Whether both answers state the same numbers and negations. Sentence
+    embeddings barely register "not" or a changed figure, so a high
+    similarity alone is not enough to award full marks.
+    """
+    def facts(text: str) -> List[str]:
+        return sorted(w for w in _normalise_answer(text).split() if w.isdigit() or w in NEGATIONS)
+
+    return facts(reference) == facts(student)
+
+
+def _shares_words(reference: str, student: str) -> bool:
+    return bool(set(_normalise_answer(reference).split()) & set(_normalise_answer(student).split()))
+
+
+def pre_grade(
+    references: List[str],
+    students: List[str],
+    accept: float = FAST_GRADE_ACCEPT,
+    reject: float = FAST_GRADE_REJECT,
+) -> List[Optional[Dict]]:
+    """
+    Settle clear-cut answers locally with the shared MiniLM model.
+
+    Returns one entry per answer: a `{score, feedback}` dict for exact or
+    near-verbatim matches and clearly unrelated answers, or None when the
+    answer needs the LLM. A near-verbatim match must keep the reference's
+    numbers and negations (`_same_facts`), and an answer is only rejected if
+    it shares no word with the reference, so a bare "42" is never zeroed.
+    """
+    results: List[Optional[Dict]] = [None] * len(students)
+    pending = []
+    for i, (ref, student) in enumerate(zip(references, students)):
+        if _normalise_answer(ref) == _normalise_answer(student):
+            results[i] = {"score": 1.0, "feedback": "Matches the reference answer."}
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    model = registry.sentence_transformer()
+    encode = dict(batch_size=FAST_GRADE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+    with metrics.span("grade.pre_grade", answers=len(pending)):
+        ref_vecs = model.encode([references[i] for i in pending], **encode)
+        stu_vecs = model.encode([students[i] for i in pending], **encode)
+        similarities = (ref_vecs * stu_vecs).sum(axis=1)
+
+    for i, sim in zip(pending, similarities):
+        if sim >= accept and _same_facts(references[i], students[i]):
+            results[i] = {
+                "score": 1.0,
+                "feedback": f"Correct – your answer closely matches the reference (similarity {sim:.2f}).",
+            }
+        elif sim <= reject and not _shares_words(references[i], students[i]):
+            results[i] = {
+                "score": 0.0,
+                "feedback": f"Your answer does not address the question (similarity {sim:.2f}); review the correct answer.",
+            }
+    return results
+
+
+def grade_batch(
+    qa_pairs: List[Dict],
+    answers: List[str],
+    provider: str = "Ollama",
+    gemini_api_key: Optional[str] = None,
+    ollama_model: str = MODEL,
+    max_workers: Optional[int] = None,
+    use_cache: bool = True,
+    fast_path: bool = FAST_GRADE,
+) -> List[Dict]:
+    """
+    Grade a whole submission concurrently.
+
+    Returns one result per question, in the same order as `qa_pairs`, each
+    being the question dict merged with `student`, `score`, `feedback` and
+    `graded_by` ("blank", "embedding" or "llm"). Blank answers and, with
+    `fast_path`, clear-cut answers (see `pre_grade`) are scored locally;
+    a failing call only affects its own question.
+    """
+    local: List[Optional[Dict]] = [None] * len(qa_pairs)
+    answered = [i for i, a in enumerate(answers) if a.strip()]
+    if fast_path and answered:
+        try:
+            settled = pre_grade([qa_pairs[i]["answer"] for i in answered], [answers[i] for i in answered])
+            for i, res in zip(answered, settled):
+                if res is not None:
+                    local[i] = {**res, "graded_by": "embedding"}
+        except Exception:
+            logger.exception("embedding pre-grading failed; using the LLM for every answer")
+
+    def _grade_one(qa: Dict, student: str, pre: Optional[Dict]) -> Dict:
+        if not student.strip():
+            return {**qa, "student": student, "score": 0.0, "feedback": "No answer submitted.",
+                    "graded_by": "blank"}
+        if pre is not None:
+            return {**qa, "student": student, **pre}
+        try:
+            res = grade(
+                reference=qa["answer"],
+                student=student,
+                question=qa["question"],
+                provider=provider,
+                gemini_api_key=gemini_api_key,
+                ollama_model=ollama_model,
+                use_cache=use_cache,
+            )
+        except Exception as exc:
+            res = {"score": 0.0, "feedback": f"Grading failed: {exc}"}
+        return {**qa, "student": student, **res, "graded_by": "llm"}
+
+    if not qa_pairs:
+        return []
+    workers = max_workers or GRADE_CONCURRENCY.get(provider, 4)
+    workers = max(1, min(workers, len(qa_pairs)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(metrics.bind(_grade_one), qa_pairs, answers, local))
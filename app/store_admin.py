@@ -0,0 +1,94 @@
+# app/store_admin.py
+"""
+Inspect and maintain the vector store.
+
+    python -m app.store_admin                 # size per document
+    python -m app.store_admin gc [--dry-run] [--sweep]
+    python -m app.store_admin compact [--chroma]
+
+`stats` lists every ingested document with its chunk count, the chunks
+dropped as duplicates, its collection, linked sessions and approximate
+stored size (chunk text plus float32 vectors).
+"""
+
+from __future__ import annotations
+import argparse, json, sys, time
+from typing import Dict, List, Optional
+
+from . import embedding_cache, ingest_cache, registry, store_lifecycle
+
+
+def _text_bytes(doc_key: str, collection: Optional[str], page: int = 1000) -> int:
+    coll = registry.collection(collection or registry.COLLECTION_NAME)
+    where = None if collection else {"doc_id": doc_key}
+    total, offset = 0, 0
+    while True:
+        batch = coll.get(where=where, include=["documents"], limit=page, offset=offset)
+        if not batch["ids"]:
+            return total
+        total += sum(len(d.encode("utf-8")) for d in batch["documents"] if d)
+        offset += len(batch["ids"])
+
+
+def document_sizes() -> List[Dict]:
+    """Manifest rows for every document plus its approximate stored bytes."""
+    dim = embedding_cache.get_cache().dim or 384
+    rows = ingest_cache.documents()
+    for row in rows:
+        row["bytes"] = _text_bytes(row["doc_key"], row["collection"]) + row["n_chunks"] * dim * 4
+    return rows
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def _print_stats(rows: List[Dict]) -> None:
+    header = f"{'document':<42} {'file':<28} {'chunks':>7} {'dedup':>6} {'sessions':>8} {'size':>10}  last used"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        last = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["last_linked"])) if r["last_linked"] else "-"
+        name = (r["filename"] or "")[:28]
+        key = r["doc_key"] + (" *" if r["collection"] else "")
+        print(f"{key:<42} {name:<28} {r['n_chunks']:>7} {r['dedup_removed']:>6} "
+              f"{r['sessions']:>8} {_fmt_bytes(r['bytes']):>10}  {last}")
+    print("-" * len(header))
+    print(f"{len(rows)} documents, {sum(r['n_chunks'] for r in rows)} chunks, "
+          f"~{_fmt_bytes(sum(r['bytes'] for r in rows))} stored; "
+          f"{_fmt_bytes(store_lifecycle.store_bytes())} on disk in {registry.store_dir()}"
+          + ("  (* = own collection)" if any(r["collection"] for r in rows) else ""))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.store_admin", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("stats", help="size per document (default)")
+    gc = sub.add_parser("gc", help="expire sessions and delete unreferenced documents")
+    gc.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    gc.add_argument("--sweep", action="store_true", help="also delete chunks unknown to the manifest")
+    compact = sub.add_parser("compact", help="reclaim disk space freed by deletes")
+    compact.add_argument("--chroma", action="store_true",
+                         help="also VACUUM Chroma's SQLite file; only while the app is stopped")
+    args = parser.parse_args(argv)
+
+    if args.command == "gc":
+        result = store_lifecycle.collect_garbage(dry_run=args.dry_run, sweep=args.sweep)
+    elif args.command == "compact":
+        result = store_lifecycle.compact(chroma=args.chroma)
+    else:
+        rows = document_sizes()
+        if not args.json:
+            _print_stats(rows)
+            return 0
+        result = rows
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# app/store_lifecycle.py
+"""
+Vector store lifecycle: session expiry, garbage collection and compaction.
+
+Sessions link to content-addressed documents in the ingest manifest. Links
+older than `SESSION_TTL_HOURS` expire; a document that no session links and
+no other document aliases is then garbage. Collection removes it from the
+manifest first (re-checking atomically, so a session linking it at the same
+moment keeps it) and only then deletes its chunks. Sessions link a document
+only while its manifest row exists, falling back to a re-ingest otherwise,
+so a document is never visible to a session without its chunks. The grace
+period `STORE_GC_GRACE_SECONDS` runs from ingest or the last expired link.
+`compact()` reclaims the space freed by deletes. The UI runs
+`collect_garbage` every `STORE_GC_INTERVAL` seconds in a daemon thread;
+`python -m app.store_admin` runs it by hand.
+"""
+
+from __future__ import annotations
+import logging, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import ingest_cache, metrics, registry
+from .db import get_vectordb
+from .vector_store import delete_document
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = float(os.getenv("SESSION_TTL_HOURS", "168")) * 3600
+GC_GRACE = float(os.getenv("STORE_GC_GRACE_SECONDS", "3600"))
+GC_INTERVAL = float(os.getenv("STORE_GC_INTERVAL", "3600"))  # 0 disables the background thread
+
+_gc_lock = threading.Lock()
+_gc_thread: Optional[threading.Thread] = None
+
+
+def collect_garbage(*, dry_run: bool = False, sweep: bool = False, now: Optional[float] = None) -> Dict:
+    """
+    Expire old session links and delete documents nothing refers to.
+    With `sweep=True` also scan the shared collection for chunks whose
+    document is unknown to the manifest (legacy per-session uploads,
+    interrupted ingests); this reads every chunk's metadata.
+    """
+    now = time.time() if now is None else now
+    report: Dict = {"expired_links": 0, "documents": [], "swept_chunks": 0}
+    with _gc_lock, metrics.span("store.gc", dry_run=dry_run) as attrs:
+        if not dry_run:
+            report["expired_links"] = ingest_cache.expire_sessions(now - SESSION_TTL, now)
+        # removing a document can orphan the documents its aliases pointed at
+        while True:
+            orphans = [k for k in ingest_cache.orphaned_documents(now - GC_GRACE)
+                       if k not in report["documents"]]
+            if not orphans:
+                break
+            for doc_key in orphans:
+                if dry_run:
+                    report["documents"].append(doc_key)
+                    continue
+                claimed_at = time.time()
+                removed, collection = ingest_cache.claim_orphan(doc_key)
+                if removed:
+                    # chunks of a re-ingest that started after the claim are kept
+                    delete_document(doc_key, collection, ingested_before=claimed_at)
+                    report["documents"].append(doc_key)
+            if dry_run:
+                break
+        if sweep:
+            report["swept_chunks"] = _sweep(now - GC_GRACE, dry_run)
+        attrs["documents"] = len(report["documents"])
+    if report["documents"] or report["swept_chunks"]:
+        logger.info("store gc: %s", report)
+    return report
+
+
+def _sweep(ingested_before: float, dry_run: bool, page: int = 1000) -> int:
+    """Delete chunks (and partitions) whose document the manifest does not know."""
+    known = ingest_cache.known_keys()
+    coll = get_vectordb()
+    stale: List[str] = []
+    offset = 0
+    while True:
+        batch = coll.get(include=["metadatas"], limit=page, offset=offset)
+        if not batch["ids"]:
+            break
+        for chunk_id, meta in zip(batch["ids"], batch["metadatas"]):
+            meta = meta or {}
+            if meta.get("doc_id") not in known and meta.get("ingested_at", 0) < ingested_before:
+                stale.append(chunk_id)
+        offset += len(batch["ids"])
+    if not dry_run:
+        for i in range(0, len(stale), page):
+            coll.delete(ids=stale[i : i + page])
+    n_stale = len(stale)
+
+    # partitions left behind by a document whose collection could not be dropped
+    live = ingest_cache.partition_collections()
+    prefix = f"{registry.COLLECTION_NAME}_"
+    for c in registry.chroma_client().list_collections():
+        name = getattr(c, "name", c)
+        if name.startswith(prefix) and name not in live:
+            n_stale += registry.collection(name).count()
+            if not dry_run:
+                registry.drop_collection(name)
+    return n_stale
+
+
+def compact(chroma: bool = False) -> Dict[str, int]:
+    """
+    VACUUM the manifest to return space freed by deletes to the filesystem.
+    With `chroma=True` also VACUUM Chroma's SQLite file (chunk text and
+    metadata). That rewrites the file under any open client, so it is only
+    allowed while no process has the store open: stop the app first; this
+    process must not have opened it either. Vector index slots of deleted
+    chunks are reused by later inserts; partitioned documents release their
+    index files when their collection is dropped.
+    """
+    if chroma and registry.chroma_client_open():
+        raise RuntimeError("the Chroma store is open in this process; compact it from a fresh process")
+    before = store_bytes()
+    with _gc_lock, metrics.span("store.compact", chroma=chroma):
+        ingest_cache.vacuum()
+        chroma_db = Path(registry.store_dir()) / "chroma.sqlite3"
+        if chroma and chroma_db.exists():
+            conn = sqlite3.connect(chroma_db, timeout=60)
+            try:
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError as exc:
+                logger.warning("could not vacuum %s: %s", chroma_db, exc)
+            finally:
+                conn.close()
+    return {"bytes_before": before, "bytes_after": store_bytes()}
+
+
+def store_bytes() -> int:
+    """Size on disk of the Chroma directory."""
+    root = Path(registry.store_dir())
+    return sum(p.stat().st_size for p in root.rglob("*") if p.is_file()) if root.exists() else 0
+
+
+def start_background_gc(interval: float = GC_INTERVAL) -> Optional[threading.Thread]:
+    """Run `collect_garbage` every `interval` seconds in a daemon thread (once per process)."""
+    global _gc_thread
+    if interval <= 0:
+        return None
+    with _gc_lock:
+        if _gc_thread is not None:
+            return _gc_thread
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    collect_garbage()
+                except Exception:
+                    logger.exception("store gc failed")
+
+        _gc_thread = threading.Thread(target=_loop, name="store-gc", daemon=True)
+        _gc_thread.start()
+        return _gc_thread
@@ -5,25 +5,31 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))  # ensure “app”
 
 import os
 import uuid
-import json
-import sqlite3
-from datetime import datetime
+import time
+from functools import partial
 
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
 
-from app.pdf_loader import load_pdf           # if you want to inspect raw chunks
-from app.qa_generator import ingest_pdf, generate_qa_pairs
-from app.scoring import grade
+from app.qa_generator import ingest_pdf_bytes
+from app.question_bank import iter_quiz
+from app.scoring import grade_batch
 from app.recommendation import recommend
-from app.database import init_db, store_results  # we'll create this file in a moment
-
-from fpdf import FPDF
-import textwrap
+from app.database import store_results
+from app import analytics
+from app import ingest_cache
+from app import jobs, metrics, registry, report, store_lifecycle
 
 st.set_page_config(page_title="Exam Q&A Generator", page_icon="📚", layout="wide")
 
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds between status refreshes
+
+# Load the embedding model / vector store in the background (once per process)
+if os.getenv("WARMUP_ON_START", "1") == "1":
+    registry.warm_up()
+metrics.serve()  # no-op unless METRICS_PORT is set
+store_lifecycle.start_background_gc()  # expire old sessions, drop unreferenced documents
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 1. SESSION & PAGE HEADER
 # ──────────────────────────────────────────────────────────────────────────────
@@ -42,16 +48,25 @@ if provider == "Gemini":
         if not gemini_api_key:
             st.sidebar.warning("Please enter your Gemini API key.")
 elif provider == "Ollama":
-    ollama_model = st.sidebar.text_input("Ollama Model", value="gemma3:latest")
+    ollama_model = st.sidebar.text_input("Ollama Model", value=registry.OLLAMA_MODEL)
+    grade_model = st.sidebar.text_input("Ollama Grading Model", value=registry.OLLAMA_GRADE_MODEL)
+    pulls = "".join(f"ollama pull {m}\n" for m in dict.fromkeys([ollama_model, grade_model]))
     with st.sidebar.expander("ℹ️ Ollama Setup Instructions"):
         st.markdown(
             f"1. Download and install [Ollama](https://ollama.com).\n"
             f"2. Make sure the Ollama app is running.\n"
-            f"3. Pull the required model by running this command in your terminal:\n"
+            f"3. Pull the required models by running these commands in your terminal:\n"
             f"```bash\n"
-            f"ollama pull {ollama_model}\n"
+            f"{pulls}"
             f"```"
         )
+use_llm_cache = st.sidebar.checkbox(
+    "Reuse cached grading responses",
+    value=True,
+    help="Identical answers get the cached grade. Untick to always ask the model. "
+         "Question generation is never cached, so every quiz is freshly sampled.",
+)
+show_trace = st.sidebar.checkbox("Show request timing trace", value=False)
 # ──────────────────────────────────────────────────────────────────────────────
 # 2. PDF UPLOAD & QUIZ GENERATION OPTIONS
 # ──────────────────────────────────────────────────────────────────────────────
@@ -70,36 +85,104 @@ num_q = st.slider("Number of quiz questions", min_value=5, max_value=25, value=1
 # ──────────────────────────────────────────────────────────────────────────────
 # 3. CREATE QUIZ
 # ──────────────────────────────────────────────────────────────────────────────
-if uploaded_files and st.button("Create Quiz"):
-    with st.spinner("Ingesting PDFs and generating questions – please wait …"):
-        # Store PDFs to tmp/ and ingest each one
-        tmp_dir = Path("tmp")
-        tmp_dir.mkdir(exist_ok=True)
-
-        for file in uploaded_files:
-            pdf_path = tmp_dir / f"{uuid.uuid4()}.pdf"
-            pdf_path.write_bytes(file.read())
-            ingest_pdf(str(pdf_path), doc_id=st.session_state.session_id)
-
-        if provider == "Gemini" and not gemini_api_key:
-            st.error("Please provide a Gemini API Key in the sidebar.")
-            st.stop()
-
-        # Generate quiz questions
-        qa_kwargs = {
-            "doc_id": st.session_state.session_id,
-            "n": num_q,
-            "topic": topic_filter.strip() if topic_filter else None,
-            "provider": provider,
-            "gemini_api_key": gemini_api_key
-        }
-        if provider == "Ollama":
-             qa_kwargs["ollama_model"] = ollama_model
-             
-        qa_pairs = generate_qa_pairs(**qa_kwargs)
+# Heavy work runs as queued jobs (app.jobs); this script only submits and polls,
+# so the session stays responsive and the shared embedder / LLM host stay capped.
+STAGE_LABELS = {"ingest": "Ingesting PDFs", "generate": "Generating questions", "grade": "Grading"}
+
+
+def _ingest_step(files, session_id, job, _):
+    # Previously seen content is linked without re-embedding
+    for data, name in files:
+        if job.cancelled:
+            return
+        ingest_pdf_bytes(data, doc_id=session_id, filename=name, cancelled=lambda: job.cancelled)
+
+
+def _generate_step(qa_kwargs, job, _):
+    # Serve unseen questions from the bank; generated ones appear in job.progress as they arrive
+    for qa in iter_quiz(**qa_kwargs, cancelled=lambda: job.cancelled):
+        job.progress.append(qa)
+        if job.cancelled:
+            break
+    return list(job.progress)
+
+
+def _grade_step(qa_pairs, answers, grade_kwargs, session_id, provider, job, _):
+    graded = grade_batch(qa_pairs, answers, **grade_kwargs)
+    if job.cancelled:
+        return None
+    # Persist (queued; written by the results store's background writer)
+    store_results(
+        graded,
+        session_id=session_id,
+        doc_id=",".join(ingest_cache.session_documents(session_id)),
+        provider=provider,
+    )
+    report.submit_quiz_pdf(graded)  # render the summary PDF while the results are shown
+    return graded
+
 
-        st.session_state.qa_pairs = qa_pairs
+def _job_status(job, key):
+    """Progress line and cancel button for a running job."""
+    label = STAGE_LABELS[job.stage]
+    if job.cancelled:
+        st.info(f"{label}: cancelling …")
+    elif job.status == jobs.QUEUED:
+        st.info(f"{label}: waiting for a free worker ({jobs.queue_position(job)} job(s) ahead) …")
+    else:
+        st.info(f"{label} …")
+    if not job.cancelled and st.button("✖ Cancel", key=key):
+        jobs.cancel(job.id)
+
+
+def _finished_job(name):
+    """Pop and return session job `name` once it has finished (or been forgotten)."""
+    job = jobs.get(st.session_state.get(name))
+    if name in st.session_state and (job is None or job.finished):
+        del st.session_state[name]
+        if job is not None:
+            st.session_state.last_trace = job.trace
+            return job
+    return None
+
+
+if uploaded_files and "quiz_job" not in st.session_state and st.button("Create Quiz"):
+    if provider == "Gemini" and not gemini_api_key:
+        st.error("Please provide a Gemini API Key in the sidebar.")
+        st.stop()
+
+    qa_kwargs = {
+        "doc_id": st.session_state.session_id,
+        "n": num_q,
+        "topic": topic_filter.strip() if topic_filter else None,
+        "provider": provider,
+        "gemini_api_key": gemini_api_key,
+    }
+    if provider == "Ollama":
+        qa_kwargs["ollama_model"] = ollama_model
+    files = [(file.getvalue(), file.name) for file in uploaded_files]
+    st.session_state.quiz_job = jobs.submit(
+        st.session_state.session_id,
+        ("ingest", partial(_ingest_step, files, st.session_state.session_id)),
+        ("generate", partial(_generate_step, qa_kwargs)),
+        label="quiz",
+    ).id
+
+quiz_job = jobs.get(st.session_state.get("quiz_job"))
+if quiz_job is not None and not quiz_job.finished:
+    _job_status(quiz_job, "cancel_quiz")
+    if quiz_job.progress:
+        st.markdown("\n".join(f"{i}. {q['question']}" for i, q in enumerate(list(quiz_job.progress), 1)))
+
+quiz_job = _finished_job("quiz_job")
+if quiz_job is not None:
+    if quiz_job.status == jobs.DONE:
+        st.session_state.qa_pairs = quiz_job.result
         st.success("Quiz ready! Scroll down to begin ⬇️")
+    elif quiz_job.status == jobs.FAILED:
+        st.error(f"Quiz creation failed: {quiz_job.error}")
+    else:
+        st.info("Quiz creation cancelled.")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 4. QUIZ UI
@@ -114,38 +197,38 @@ if "qa_pairs" in st.session_state:
         answers.append(ans)
 
     # ────────── Grade Button ──────────
-    if st.button("Submit answers & grade me"):
-        graded = []
-        with st.spinner("Grading …"):
-            for qa, student in zip(st.session_state.qa_pairs, answers):
-                if not student.strip():
-                    graded.append(
-                        {**qa, "student": student, "score": 0.0, "feedback": "No answer submitted."}
-                    )
-                else:
-                    grade_kwargs = {
-                        "reference": qa["answer"],
-                        "student": student,
-                        "question": qa["question"],
-                        "provider": provider,
-                        "gemini_api_key": gemini_api_key
-                    }
-                    if provider == "Ollama":
-                        grade_kwargs["ollama_model"] = ollama_model
-                        
-                    res = grade(**grade_kwargs)
-                    graded.append({**qa, "student": student, **res})
-
-        # Persist and store
-        init_db()
-        store_results(graded)
-
-        st.session_state.graded = graded
-        st.success("Results ready!")
+    if "grade_job" not in st.session_state and st.button("Submit answers & grade me"):
+        grade_kwargs = {"provider": provider, "gemini_api_key": gemini_api_key, "use_cache": use_llm_cache}
+        if provider == "Ollama":
+            grade_kwargs["ollama_model"] = grade_model
+        st.session_state.grade_job = jobs.submit(
+            st.session_state.session_id,
+            ("grade", partial(_grade_step, list(st.session_state.qa_pairs), answers, grade_kwargs,
+                              st.session_state.session_id, provider)),
+            label="grade",
+        ).id
+
+    grade_job = jobs.get(st.session_state.get("grade_job"))
+    if grade_job is not None and not grade_job.finished:
+        _job_status(grade_job, "cancel_grade")
+
+    grade_job = _finished_job("grade_job")
+    if grade_job is not None:
+        if grade_job.status == jobs.DONE:
+            graded = st.session_state.graded = grade_job.result
+            st.session_state.pop("graded_pdf", None)
+            saved = sum(g.get("graded_by") == "embedding" for g in graded)
+            st.success(f"Results ready! ({saved} answer(s) graded locally, saving {saved} LLM call(s))"
+                       if saved else "Results ready!")
+        elif grade_job.status == jobs.FAILED:
+            st.error(f"Grading failed: {grade_job.error}")
+        else:
+            st.info("Grading cancelled.")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 5. RESULTS & FEEDBACK
 # ──────────────────────────────────────────────────────────────────────────────
+pdf_pending = False
 if "graded" in st.session_state:
     graded = st.session_state.graded
     scores = [g["score"] for g in graded]
@@ -176,70 +259,102 @@ if "graded" in st.session_state:
         st.write("Great job – no weak topics detected!")
 
     # ────────── Export as PDF ──────────
-    def generate_pdf(results):
-        """
-        Robust PDF generator that never crashes, even with long or odd text.
-        """
-        from fpdf import FPDF
-
-        def latin1(text, maxlen=300):
-            """Return a latin‑1–safe, clipped string."""
-            if text is None:
-                return "N/A"
-            s = str(text).replace("\n", " ").replace("\r", " ").strip()
-            # Break long unspaced words every 50 chars
-            s = " ".join([s[i:i + 50] for i in range(0, len(s), 50)])
-            if len(s) > maxlen:
-                s = s[:maxlen] + "..."
-            # Replace characters outside Latin‑1 range
-            return s.encode("latin1", "replace").decode("latin1")
-
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, latin1("Exam Quiz Summary"), ln=True, align="C")
-        pdf.ln(5)
-        pdf.set_font("Arial", size=12)
-
-        full_width = pdf.w - pdf.l_margin - pdf.r_margin  # safe width for all cells
-
-        for idx, g in enumerate(results, 1):
-            pdf.multi_cell(full_width, 8, latin1(f"Q{idx}: {g.get('question')}"))
-            # Use cell (single‑line) for score to avoid wrapping issues
-            pdf.cell(full_width, 8, latin1(f"Your Score: {g.get('score', 0):.0%}"), ln=True)
-            pdf.multi_cell(full_width, 8, latin1(f"Your Answer: {g.get('student')}"))
-            pdf.multi_cell(full_width, 8, latin1(f"Correct Answer: {g.get('answer')}"))
-            pdf.multi_cell(full_width, 8, latin1(f"Feedback: {g.get('feedback')}"))
-            pdf.ln(4)
-
-        return bytes(pdf.output(dest="S"))  
-
-    pdf_bytes = generate_pdf(graded)
-    st.download_button(
-        "📄 Download Quiz Summary as PDF",
-        data=pdf_bytes,
-        file_name="quiz_results.pdf",
-        mime="application/pdf",
-    )
+    # Rendered once per result set in a background worker (started at grading).
+    # The page never waits for it: the job poll below reruns until it is done,
+    # and the future is kept so a failed render is reported, not retried each poll
+    pdf = st.session_state.get("graded_pdf")
+    if pdf is None:
+        pdf = st.session_state.graded_pdf = report.submit_quiz_pdf(graded)
+    if not pdf.done():
+        pdf_pending = True
+        st.caption("Preparing the PDF summary…")
+    elif pdf.exception() is not None:
+        st.caption(f"Could not create the PDF summary: {pdf.exception()}")
+    else:
+        st.download_button(
+            "📄 Download Quiz Summary as PDF",
+            data=pdf.result(),
+            file_name="quiz_results.pdf",
+            mime="application/pdf",
+        )
 
     # ────────── Analytics ──────────
     if st.button("📊 Show Performance Analytics"):
-        conn = sqlite3.connect("quiz_results.db")
-        df = pd.read_sql_query("SELECT * FROM results", conn)
-        conn.close()
+        st.session_state.show_analytics = True
+
+    if st.session_state.get("show_analytics"):
+        first_day, last_day = analytics.date_bounds()
+        if first_day is None:
+            st.info("No results stored yet.")
+        else:
+            picked = st.date_input(
+                "Date range", value=(first_day, last_day), min_value=first_day, max_value=last_day
+            )
+            start, end = (picked if isinstance(picked, (tuple, list)) and len(picked) == 2
+                          else (first_day, last_day))
+
+            st.write("### Performance Over Time")
+            daily = pd.DataFrame(analytics.daily_average(start, end), columns=["date", "score", "answers"])
+            st.line_chart(daily.set_index("date")["score"])
+
+            st.write("### Average Score by Question")
+            q_avg = pd.DataFrame(analytics.question_average(start, end), columns=["question", "score", "answers"])
+            st.bar_chart(q_avg.set_index("question")["score"])
+
+            st.write("### Average Score by Topic")
+            t_avg = pd.DataFrame(analytics.topic_average(start, end), columns=["topic", "score", "answers"])
+            st.bar_chart(t_avg.set_index("topic")["score"])
+
+            st.write("### Recent Sessions")
+            sessions = pd.DataFrame(analytics.session_summary(),
+                                    columns=["session", "score", "answers", "first", "last"])
+            for col in ("first", "last"):
+                sessions[col] = pd.to_datetime(sessions[col], unit="s", utc=True)
+            sessions["this session"] = sessions["session"] == st.session_state.session_id
+            st.dataframe(sessions, hide_index=True)
+
+            st.write("### Export Results")
+            formats = ["csv", "parquet"] if report.parquet_available() else ["csv"]
+            fmt = st.radio("Format", formats, horizontal=True)
+            if st.button("⬇️ Prepare export"):
+                report.discard_export(st.session_state.get("export"))
+                st.session_state.export = report.submit_export(fmt, since=start, until=end)
+            export = st.session_state.get("export")
+            if export is not None:
+                if not export.done():
+                    st.caption("Exporting in the background…")
+                    st.button("🔄 Check again", key="export_refresh")
+                elif export.exception() is not None:
+                    st.error(f"Export failed: {export.exception()}")
+                elif not export.result().exists():
+                    st.caption("This export has expired; prepare it again.")
+                else:
+                    path = export.result()
+                    with open(path, "rb") as fh:
+                        st.download_button(
+                            f"Download {path.suffix[1:].upper()}",
+                            data=fh,
+                            file_name=f"quiz_results_{start}_{end}{path.suffix}",
+                        )
 
-        st.write("### Performance Over Time")
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df["date"] = df["timestamp"].dt.date
-        daily_avg = df.groupby("date")["score"].mean()
-        st.line_chart(daily_avg)
+# ──────────────────────────────────────────────────────────────────────────────
+# 6. REQUEST TRACE (per-stage timings of the last quiz creation / grading)
+# ──────────────────────────────────────────────────────────────────────────────
+if show_trace and st.session_state.get("last_trace"):
+    with st.sidebar.expander("⏱ Last request trace", expanded=True):
+        trace_df = pd.DataFrame(st.session_state.last_trace)
+        st.dataframe(
+            trace_df.groupby("name")["value"].agg(["count", "sum", "max"]).sort_values("sum", ascending=False)
+        )
+        st.dataframe(trace_df.drop(columns=["at"]))
 
-        st.write("### Average Score by Question")
-        q_avg = df.groupby("question")["score"].mean().sort_values()
-        st.bar_chart(q_avg)
+# ──────────────────────────────────────────────────────────────────────────────
+# 7. JOB POLLING (rerun while a quiz or grading job or the PDF summary is in flight)
+# ──────────────────────────────────────────────────────────────────────────────
+if "quiz_job" in st.session_state or "grade_job" in st.session_state or pdf_pending:
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
 
 # ──────────────────────────────────────────────────────────────────────────────
-# 6. END OF FILE
+# 8. END OF FILE
 # ──────────────────────────────────────────────────────────────────────────────
@@ -1,32 +1,143 @@
-from typing import Optional, List
-from pathlib import Path
-from .db import vectordb
-from typing import List
-import chromadb
-import os
-from sentence_transformers import SentenceTransformer
-
-EMB_MODEL_NAME = "all-MiniLM-L6-v2"
-CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", ".chromadb")
-_client = chromadb.PersistentClient(path=CHROMA_DIR)
-_collection = _client.get_or_create_collection("pdf_chunks")
-_embedder = SentenceTransformer(EMB_MODEL_NAME)
-
-def add_chunks(chunks: List[str], doc_id: str):
-    vectordb.add(
-        documents=chunks,
-        ids=[f"{doc_id}-{i}" for i in range(len(chunks))],
-        metadatas=[{"doc_id": doc_id}] * len(chunks)
-    )
-
-def similarity_search(query: str, k: int = 5, doc_id: Optional[str] = None) -> List[str]:
+import os, time
+from typing import Dict, Optional, List, Sequence
+from .db import get_vectordb
+from .embedding_cache import embed_texts
+from . import ingest_cache, metrics, registry
+
+# Documents with at least this many pages get their own collection (0 = never),
+# so their queries skip the shared index and deleting them drops whole files.
+PARTITION_MIN_PAGES = int(os.getenv("VECTOR_PARTITION_MIN_PAGES", "0"))
+
+def partition_name(doc_id: str) -> str:
+    return f"{registry.COLLECTION_NAME}_{doc_id[:16]}"
+
+def _collection(name: Optional[str] = None):
+    return registry.collection(name) if name else get_vectordb()
+
+def add_chunks(chunks: List[str], doc_id: str, start: int = 0, collection: Optional[str] = None):
+    """
+    Store `chunks` for `doc_id`; `start` is the index of the first chunk so
+    a document can be written in several batches. Embeddings come from the
+    persistent chunk cache so repeated passages are only encoded once.
+    `collection` names a per-document partition instead of the shared one.
+    """
+    embeddings = embed_texts(chunks)
+    now = time.time()
+    with metrics.span("vector.upsert", chunks=len(chunks)):
+        _collection(collection).upsert(
+            documents=chunks,
+            embeddings=embeddings,
+            ids=[f"{doc_id}-{i}" for i in range(start, start + len(chunks))],
+            metadatas=[{"doc_id": doc_id, "ingested_at": now}] * len(chunks)
+        )
+
+def has_chunks(doc_id: str, n_chunks: int) -> bool:
+    """
+    Cheap check that the first and last chunk of `doc_id` are still stored.
+    """
+    if n_chunks <= 0:
+        return True
+    ids = list(dict.fromkeys([f"{doc_id}-0", f"{doc_id}-{n_chunks - 1}"]))  # one id for a single chunk
+    collection = ingest_cache.document_collections([doc_id]).get(doc_id)
+    found = _collection(collection).get(ids=ids, include=[])
+    return len(set(found["ids"])) == len(set(ids))
+
+def delete_document(doc_id: str, collection: Optional[str] = None,
+                    ingested_before: Optional[float] = None) -> None:
+    """
+    Remove the chunks of `doc_id`, dropping its partition once it is empty.
+    With `ingested_before`, chunks written at or after that time (a
+    concurrent re-ingest of the same content) are kept.
+    """
+    with metrics.span("vector.delete"):
+        coll = _collection(collection)
+        where = None if collection else {"doc_id": doc_id}
+        if ingested_before is None:
+            if collection:
+                registry.drop_collection(collection)
+            else:
+                coll.delete(where=where)
+            return
+        found = coll.get(where=where, include=["metadatas"])
+        stale = [i for i, meta in zip(found["ids"], found["metadatas"])
+                 if (meta or {}).get("ingested_at", 0) < ingested_before]
+        if stale:
+            coll.delete(ids=stale)
+        if collection and coll.count() == 0:
+            registry.drop_collection(collection)
+
+def _where(doc_id: Optional[str], doc_ids: Optional[Sequence[str]]) -> Optional[dict]:
+    keys = list(doc_ids) if doc_ids else ([doc_id] if doc_id else [])
+    if not keys:
+        return None  # Chroma rejects an empty `where` filter
+    if len(keys) == 1:
+        return {"doc_id": keys[0]}
+    return {"doc_id": {"$in": keys}}
+
+def _partitions(doc_ids: Sequence[str]) -> Dict[Optional[str], List[str]]:
+    """Group `doc_ids` by the collection holding them (None = the shared one)."""
+    placed = ingest_cache.document_collections(doc_ids)
+    groups: Dict[Optional[str], List[str]] = {}
+    for key in doc_ids:
+        groups.setdefault(placed.get(key), []).append(key)
+    return groups
+
+def _search(query: str, k: int, doc_ids: Sequence[str], alias_ids: Sequence[str], include: List[str]) -> List[dict]:
+    """Query every collection holding `doc_ids` / `alias_ids` and merge the hits by distance."""
+    requests = []
+    if not doc_ids:
+        requests.append((None, {}))
+    for name, keys in _partitions(doc_ids).items():
+        # a partition holds a single document, so it needs no filter
+        requests.append((name, {"where": _where(None, keys)} if name is None else {}))
+    by_doc: Dict[str, List[str]] = {}
+    for chunk_id in alias_ids:
+        by_doc.setdefault(chunk_id.rsplit("-", 1)[0], []).append(chunk_id)
+    for name, keys in _partitions(list(by_doc)).items():
+        ids = [i for key in keys for i in by_doc[key]]
+        # `ids` is only passed here: Collection.query accepts it from chromadb 1.0.8
+        requests.append((name, {"ids": ids, "n_results": min(k, len(ids))}))
+
+    hits: List[dict] = []
+    with metrics.span("vector.query", k=k, collections=len(requests)):
+        for name, req in requests:
+            kwargs = {"n_results": k, **req}
+            results = _collection(name).query(query_texts=[query], include=include, **kwargs)
+            if not results["documents"]:
+                continue
+            embeddings = results.get("embeddings")
+            embeddings = embeddings[0] if embeddings is not None else [None] * len(results["documents"][0])
+            hits.extend(
+                {"document": doc, "distance": dist, "embedding": emb}
+                for doc, dist, emb in zip(results["documents"][0], results["distances"][0], embeddings)
+            )
+    return sorted(hits, key=lambda h: h["distance"])[:k] if len(requests) > 1 else hits
+
+def similarity_search(
+    query: str,
+    k: int = 5,
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[str]:
     """
     Perform semantic similarity search using ChromaDB.
-    Returns top `k` most relevant document chunks.
-    """
-    results = vectordb.query(
-        query_texts=[query],
-        n_results=k,
-        where={"doc_id": doc_id} if doc_id else {}
-    )
-    return results["documents"][0] if results["documents"] else []
\ No newline at end of file
+    Returns top `k` most relevant document chunks, optionally restricted to
+    one `doc_id` or any of several `doc_ids`.
+    """
+    keys = list(doc_ids) if doc_ids else ([doc_id] if doc_id else [])
+    return [h["document"] for h in _search(query, k, keys, [], ["documents", "distances"])]
+
+def similarity_search_with_embeddings(
+    query: str,
+    k: int = 50,
+    doc_ids: Optional[Sequence[str]] = None,
+    alias_ids: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    Like `similarity_search`, but each hit is a dict with its `document`,
+    query `distance` and stored `embedding` (for diversity-aware selection).
+    `alias_ids` are chunks of other documents that stand in for near-duplicates
+    dropped at ingest; they are searched too and merged by distance.
+    """
+    return _search(query, k, list(doc_ids or []), list(alias_ids or []),
+                   ["documents", "distances", "embeddings"])
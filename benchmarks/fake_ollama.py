@@ -0,0 +1,171 @@
+# benchmarks/fake_ollama.py
+"""
+Local stand-in for the Ollama HTTP API used by the benchmarks.
+
+Serves `/api/generate` (streaming NDJSON or a single JSON reply) and
+`/api/tags` with a configurable time-to-first-token and tokens/sec, so
+generation and grading can be measured without a GPU host. Replies are
+canned: grading prompts get a `Score:` / `Feedback:` answer, everything
+else gets a JSON list with as many questions as the prompt asks for.
+
+    python -m benchmarks.fake_ollama --port 11500 --latency 0.2 --tps 200
+    python -m benchmarks.fake_ollama --replies replies.json
+
+A replies file overrides either part, e.g. to match a real model's output
+length:
+
+    {"grade": "Score: 0.4\\nFeedback: ...",
+     "questions": [{"question": "What limits process {i}?", "answer": "...", "topic": "..."}]}
+
+Question items are used in turn and `{i}` is replaced by a running number,
+so questions stay distinct and are not dropped as duplicates.
+"""
+
+from __future__ import annotations
+import argparse, itertools, json, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+GRADE_REPLY = "Score: 0.7\nFeedback: Mostly correct but missing detail."
+QUESTIONS = [{"question": "What is synthetic concept {i}?",
+              "answer": "A concept defined in the benchmark corpus.",
+              "topic": "Synthetic"}]
+_counter = itertools.count()
+
+
+def canned_reply(prompt: str, grade_reply: str = GRADE_REPLY, questions: List[Dict] = QUESTIONS) -> str:
+    if "Student Answer:" in prompt:
+        return grade_reply
+    match = re.search(r"Generate (\d+)", prompt)
+    n = int(match.group(1)) if match else 5
+    items = []
+    for _ in range(n):
+        i = next(_counter)
+        template = questions[i % len(questions)]
+        items.append({k: v.replace("{i}", str(i)) if isinstance(v, str) else v for k, v in template.items()})
+    return json.dumps(items)
+
+
+def load_replies(path: Path) -> Dict:
+    """`grade_reply` / `questions` keyword arguments from a replies JSON file."""
+    data = json.loads(Path(path).read_text())
+    replies = {}
+    if "grade" in data:
+        replies["grade_reply"] = str(data["grade"])
+    if data.get("questions"):
+        replies["questions"] = list(data["questions"])
+    return replies
+
+
+class FakeOllama:
+    """Fake Ollama server running in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *,
+                 latency: float = 0.05, tokens_per_sec: float = 500.0,
+                 grade_reply: str = GRADE_REPLY, questions: Optional[List[Dict]] = None):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.grade_reply = grade_reply
+        self.questions = questions or QUESTIONS
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # keep benchmark output clean
+                pass
+
+            def _send_json(self, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": "fake:latest"}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests += 1
+                reply = canned_reply(req.get("prompt", ""), fake.grade_reply, fake.questions)
+                # ~4 characters per token, like the real models' tokenisers
+                tokens = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+                start = time.perf_counter()
+                time.sleep(fake.latency)
+                stats = {
+                    "model": req.get("model", "fake"),
+                    "load_duration": 0,
+                    "prompt_eval_count": len(req.get("prompt", "")) // 4,
+                    "eval_count": len(tokens),
+                }
+
+                if req.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for tok in tokens:
+                        time.sleep(1.0 / fake.tokens_per_sec)
+                        self._chunk({"model": stats["model"], "response": tok, "done": False})
+                    elapsed = int((time.perf_counter() - start) * 1e9)
+                    self._chunk({**stats, "response": "", "done": True,
+                                 "total_duration": elapsed, "eval_duration": elapsed})
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    time.sleep(len(tokens) / fake.tokens_per_sec)
+                    elapsed = int((time.perf_counter() - start) * 1e9)
+                    self._send_json({**stats, "response": reply, "done": True,
+                                     "total_duration": elapsed, "eval_duration": elapsed})
+
+            def _chunk(self, payload: dict) -> None:
+                data = (json.dumps(payload) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tps", type=float, default=500.0, help="tokens per second")
+    parser.add_argument("--replies", type=Path, help="JSON file with canned grade/question replies")
+    args = parser.parse_args()
+    replies = load_replies(args.replies) if args.replies else {}
+    server = FakeOllama(args.host, args.port, latency=args.latency, tokens_per_sec=args.tps, **replies).start()
+    print(f"fake Ollama listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,189 @@
+# benchmarks/run.py
+"""
+End-to-end performance benchmarks.
+
+    python -m benchmarks.run --out bench_results.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+
+Everything runs in a throwaway working directory against a local fake
+Ollama server (`benchmarks.fake_ollama`) and synthetic PDFs, so numbers are
+reproducible and need no GPU host. Each stage reports throughput and
+p50/p95 latency; `--compare` exits non-zero when a latency regresses by
+more than `--tolerance` relative to the baseline.
+"""
+
+from __future__ import annotations
+import argparse, json, math, os, statistics, sys, tempfile, time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .fake_ollama import FakeOllama, load_replies
+from .synthetic_pdf import SIZES, make_corpus
+
+QUICK_SIZES = {"small": 10, "medium": 50}
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _measure(fn: Callable[[], int], repeat: int) -> Dict[str, float]:
+    """Run `fn` (returning items processed) `repeat` times and summarise."""
+    latencies, items = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        items += fn() or 0
+        latencies.append(time.perf_counter() - t0)
+    total = sum(latencies)
+    return {
+        "runs": repeat,
+        "p50_s": round(_percentile(latencies, 50), 4),
+        "p95_s": round(_percentile(latencies, 95), 4),
+        "mean_s": round(statistics.fmean(latencies), 4),
+        "items_per_s": round(items / total, 2) if total and items else 0.0,
+    }
+
+
+def run_benchmarks(workdir: Path, sizes: Dict[str, int], repeat: int, server: FakeOllama) -> Dict:
+    # Point every store at the work dir and the fake server *before* importing the app
+    os.chdir(workdir)
+    os.environ.update({
+        "OLLAMA_BASE_URL": server.url,
+        "CHROMA_PERSIST_DIR": str(workdir / "chroma"),
+        "INGEST_MANIFEST_PATH": str(workdir / "manifest.db"),
+        "EMBEDDING_CACHE_DIR": str(workdir / "embedding_cache"),
+        "RESULTS_DB_PATH": str(workdir / "results.db"),
+        "QUESTION_BANK_PATH": str(workdir / "question_bank.db"),
+        "LLM_CACHE_PATH": str(workdir / "llm_cache.db"),
+        "LLM_CACHE_ENABLED": "0",
+        "FAST_GRADE": "0",
+    })
+    from app import registry
+    from app.pdf_loader import load_pdf
+    from app.qa_generator import generate_qa_pairs, ingest_pdf
+    from app.scoring import grade, grade_batch
+    from app.vector_store import add_chunks, similarity_search
+
+    results: Dict[str, Dict] = {}
+    t0 = time.perf_counter()
+    registry.warm_up(background=False)
+    results["warm_up"] = {"runs": 1, "p50_s": round(time.perf_counter() - t0, 4)}
+
+    corpus = make_corpus(workdir / "pdfs", sizes)
+    for name, path in corpus.items():
+        pages = sizes[name]
+        stats = _measure(lambda: len(load_pdf(path)) and pages, repeat)
+        results[f"load_pdf[{name}]"] = {**stats, "unit": "pages"}
+
+    # cold: text never seen before, so every chunk is encoded; warm: the same
+    # chunks again, served from the persistent embedding cache
+    chunks = load_pdf(corpus["small"])
+    counter = iter(range(10 ** 6))
+
+    def _add(run_chunks) -> int:
+        add_chunks(run_chunks, f"bench-{next(counter)}")
+        return len(run_chunks)
+
+    results["add_chunks[cold]"] = {
+        **_measure(lambda: _add([f"{c} (run {next(counter)})" for c in chunks]), repeat),
+        "unit": "chunks",
+    }
+    _add(chunks)
+    results["add_chunks[warm]"] = {**_measure(lambda: _add(chunks), repeat), "unit": "chunks"}
+
+    ingest_pdf(str(corpus[max(sizes, key=sizes.get)]), doc_id="bench-session")
+    queries = ["energy", "market price", "theorem proof", "climate ocean", "empire treaty"]
+    results["similarity_search"] = {
+        **_measure(lambda: len(similarity_search(queries[next(counter) % len(queries)], k=50)),
+                   repeat * 10),
+        "unit": "chunks",
+    }
+
+    results["generate_qa_pairs[n=10]"] = {
+        **_measure(lambda: len(generate_qa_pairs("bench-session", n=10, ollama_model="fake")), repeat),
+        "unit": "questions",
+    }
+
+    qa = {"question": "What drives inflation?", "answer": "Demand outpacing supply."}
+    results["grade"] = {
+        **_measure(lambda: (grade(qa["answer"], "Prices rise with demand.", qa["question"],
+                                  ollama_model="fake"), 1)[1], repeat * 5),
+        "unit": "answers",
+    }
+    submission = [dict(qa, topic="Economics") for _ in range(25)]
+    results["grade_batch[25]"] = {
+        **_measure(lambda: len(grade_batch(submission, ["Prices rise with demand."] * 25,
+                                           ollama_model="fake")), repeat),
+        "unit": "answers",
+    }
+    return results
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a description of every latency that regressed beyond `tolerance`."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        cur = current["results"].get(name)
+        if not cur:
+            continue
+        for key in ("p50_s", "p95_s"):
+            if key in base and key in cur and base[key] > 0 and cur[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]:.4f}s -> {cur[key]:.4f}s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, help="baseline JSON to check for regressions")
+    parser.add_argument("--save-baseline", type=Path, help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="skip the large PDF")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM time to first token (s)")
+    parser.add_argument("--tps", type=float, default=500.0, help="fake LLM tokens per second")
+    parser.add_argument("--replies", type=Path, help="JSON file with the fake LLM's canned replies "
+                                                     "(see benchmarks/fake_ollama.py)")
+    args = parser.parse_args(argv)
+    if args.compare and not args.compare.is_file():
+        parser.error(f"no baseline at {args.compare}; record one on this machine with --save-baseline")
+
+    out = args.out.resolve()
+    baseline_in = args.compare.resolve() if args.compare else None
+    baseline_out = args.save_baseline.resolve() if args.save_baseline else None
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    replies = load_replies(args.replies) if args.replies else {}
+    server = FakeOllama(latency=args.latency, tokens_per_sec=args.tps, **replies).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="exam-qa-bench-") as tmp:
+            results = run_benchmarks(Path(tmp), QUICK_SIZES if args.quick else SIZES, args.repeat, server)
+    finally:
+        server.stop()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": {"repeat": args.repeat, "quick": args.quick,
+                   "llm_latency_s": args.latency, "llm_tokens_per_s": args.tps,
+                   "replies": str(args.replies) if args.replies else None},
+        "results": results,
+    }
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    if baseline_out:
+        baseline_out.write_text(json.dumps(report, indent=2))
+
+    if baseline_in:
+        regressions = compare(report, json.loads(baseline_in.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
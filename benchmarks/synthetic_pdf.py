@@ -0,0 +1,43 @@
+# benchmarks/synthetic_pdf.py
+"""Deterministic synthetic textbook PDFs for the benchmarks."""
+
+from __future__ import annotations
+import random
+from pathlib import Path
+
+from fpdf import FPDF
+
+# name -> pages
+SIZES = {"small": 10, "medium": 100, "large": 400}
+
+_VOCAB = (
+    "cell energy membrane protein enzyme reaction equilibrium force mass velocity "
+    "market demand supply price inflation algorithm graph vector matrix theorem proof "
+    "history empire treaty revolution climate ocean current erosion mineral ecosystem"
+).split()
+
+
+def make_pdf(path: Path, pages: int, *, words_per_page: int = 350, seed: int = 0) -> Path:
+    """Write a PDF of `pages` pages of pseudo-random prose with a repeated header."""
+    rng = random.Random(seed)
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for page in range(pages):
+        pdf.add_page()
+        pdf.set_font("Helvetica", "B", 10)
+        pdf.cell(0, 6, f"Synthetic Textbook - Chapter {page // 20 + 1}", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=10)
+        words = [rng.choice(_VOCAB) for _ in range(words_per_page)]
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        pdf.multi_cell(0, 5, " ".join(sentences))
+    path = Path(path)
+    pdf.output(str(path))
+    return path
+
+
+def make_corpus(directory: Path, sizes=SIZES) -> dict:
+    """Create one PDF per size; returns `{name: path}`."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return {name: make_pdf(directory / f"{name}.pdf", pages, seed=i)
+            for i, (name, pages) in enumerate(sizes.items())}
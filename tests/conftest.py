@@ -0,0 +1,59 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from app import embedding_cache, ingest_cache, registry
+
+DIM = 64
+
+
+class HashingEncoder:
+    """Bag-of-words stand-in for MiniLM: texts sharing words get close vectors."""
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **_):
+        out = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                out[row, zlib.crc32(word.encode()) % DIM] += 1
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """An empty ingest manifest in a temporary directory."""
+    monkeypatch.setattr(ingest_cache, "MANIFEST_PATH", tmp_path / "manifest.db")
+    return tmp_path / "manifest.db"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, manifest):
+    """A fresh Chroma store and embedding cache, encoded by `HashingEncoder`."""
+    from chromadb.api.types import EmbeddingFunction
+
+    encoder = HashingEncoder()
+
+    class Embedder(EmbeddingFunction):
+        def __init__(self):
+            pass
+
+        def __call__(self, input):
+            return list(encoder.encode(list(input)))
+
+        @staticmethod
+        def name():
+            return "hashing-test"
+
+    embedder = Embedder()
+    monkeypatch.setattr(registry, "CHROMA_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(registry, "_instances", {})
+    monkeypatch.setattr(registry, "KNOWN_CHROMA_DIRS", ())
+    monkeypatch.setattr(registry, "sentence_transformer", lambda: encoder)
+    monkeypatch.setattr(registry, "embedding_function", lambda: embedder)
+    monkeypatch.setattr(embedding_cache, "_caches", {
+        registry.EMB_MODEL_NAME: embedding_cache.EmbeddingCache(registry.EMB_MODEL_NAME, tmp_path / "emb"),
+    })
+    return tmp_path
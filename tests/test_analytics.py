@@ -0,0 +1,95 @@
+import functools
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from app import analytics, results_store
+
+RECOMPUTE = {
+    "rollup_daily": "SELECT date(ts, 'unixepoch'), COUNT(*), TOTAL(score) FROM results GROUP BY 1",
+    "rollup_question": "SELECT date(ts, 'unixepoch'), question, COUNT(*), TOTAL(score) FROM results "
+                       "WHERE question IS NOT NULL GROUP BY 1, 2",
+    "rollup_topic": "SELECT date(ts, 'unixepoch'), topic, COUNT(*), TOTAL(score) FROM results "
+                    "WHERE topic IS NOT NULL GROUP BY 1, 2",
+    "rollup_session": "SELECT session_id, COUNT(*), TOTAL(score), MIN(ts), MAX(ts) FROM results "
+                      "WHERE session_id IS NOT NULL GROUP BY 1",
+}
+
+
+def rounded(rows):
+    return sorted(tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in rows)
+
+
+def assert_rollups_match(path):
+    conn = sqlite3.connect(path)
+    try:
+        for table, sql in RECOMPUTE.items():
+            assert rounded(conn.execute(f"SELECT * FROM {table}")) == rounded(conn.execute(sql)), table
+    finally:
+        conn.close()
+
+
+def row(ts, question, score, session_id, topic):
+    stamp = datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+    return (stamp, ts, question, "student", "answer", score, "feedback", session_id, "doc", topic, "Ollama")
+
+
+def graded(i):
+    return [{"question": f"Q{j}", "student": "s", "answer": "a", "score": (i + j) % 3 / 2,
+             "feedback": "f", "topic": ["Cells", None][j % 2]} for j in range(4)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return results_store.ResultsStore(tmp_path / "results.db")
+
+
+def test_incremental_rollups_equal_a_full_recompute(store):
+    threads = [threading.Thread(target=store.store, args=(graded(i),), kwargs={"session_id": f"s{i % 3}"})
+               for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.flush()
+    # earlier days, a day boundary and rows without session, question or score
+    day = 86400 * 19000
+    store._write([row(day - 1, "Q0", 1.0, "s0", "Cells"), row(day, "Q0", 0.5, "s0", "Cells"),
+                  row(day + 5, None, None, None, None), row(day + 6, "Q1", 0.0, "s9", "Atoms")])
+    assert_rollups_match(store.path)
+
+
+def test_session_summary_reads_the_rollup(store, monkeypatch):
+    monkeypatch.setattr(results_store, "connect", functools.partial(results_store.connect, store.path))
+    monkeypatch.setattr(results_store, "_store", store)
+    monkeypatch.setattr(analytics, "_local", threading.local())
+    monkeypatch.setattr(analytics, "_cache", {})
+    store.store(graded(0), session_id="s1")
+    store.store(graded(1), session_id="s2")
+    store.flush()
+    summary = analytics.session_summary()
+    assert [(sid, n) for sid, _, n, _, _ in summary] == [("s2", 4), ("s1", 4)]
+    assert summary[1][1] == pytest.approx(sum(g["score"] for g in graded(0)) / 4)
+
+
+def test_migration_backfills_rollups_from_existing_results(tmp_path):
+    path = tmp_path / "v2.db"
+    conn = sqlite3.connect(path)
+    for script in results_store.MIGRATIONS[:2]:
+        conn.executescript(script)
+    conn.execute("PRAGMA user_version = 2")
+    day = 86400 * 19000
+    conn.executemany(f"INSERT INTO results ({', '.join(results_store.COLUMNS)}) VALUES "
+                     f"({', '.join('?' * len(results_store.COLUMNS))})",
+                     [row(day - 1, "Q0", 1.0, "s0", "Cells"), row(day, "Q0", 0.5, "s0", None),
+                      row(day + 1, "Q1", 0.0, None, "Cells")])
+    conn.commit()
+    assert results_store.migrate(conn) == 3
+    conn.close()
+    assert_rollups_match(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT day, n FROM rollup_daily ORDER BY day").fetchall() == [
+        ("2022-01-07", 1), ("2022-01-08", 2)]
+    conn.close()
@@ -0,0 +1,109 @@
+import random
+
+from app import context_builder, ingest_cache
+from app.dedup import LSH_BANDS, ChunkDeduplicator, band_keys, minhash, similarity
+from app.vector_store import add_chunks
+
+WORDS = [f"w{i}" for i in range(2000)]
+
+
+def passage(seed, n=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def edit(text, n_words, seed=0):
+    """Replace `n_words` words of `text`."""
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), n_words):
+        words[i] = "changed"
+    return " ".join(words)
+
+
+def test_minhash_estimates_jaccard():
+    text = passage(1)
+    assert similarity(minhash(text), minhash(text)) == 1.0
+    assert similarity(minhash(text), minhash(text.upper() + " !")) > 0.9
+    assert similarity(minhash(text), minhash(edit(text, 2))) > 0.85
+    assert similarity(minhash(text), minhash(passage(2))) < 0.1
+
+
+def test_band_keys_collide_only_for_similar_text():
+    text = passage(3)
+    keys = band_keys(minhash(text))
+    assert len(keys) == LSH_BANDS
+    assert set(keys) & set(band_keys(minhash(edit(text, 2))))
+    assert not set(keys) & set(band_keys(minhash(passage(4))))
+
+
+def test_within_document_duplicates_are_dropped(manifest):
+    header = passage(5)
+    chunks = [header, passage(6), edit(header, 1), passage(7), header]
+    dedup = ChunkDeduplicator("doc-a")
+    kept = dedup.filter(chunks[:3], start=0) + dedup.filter(chunks[3:], start=2)
+    assert kept == [chunks[0], chunks[1], chunks[3]]
+    stats = dedup.finish()
+    assert (stats.raw, stats.within_doc, stats.cross_doc) == (5, 2, 0)
+    assert ingest_cache.dedup_stats("doc-a")["kept"] == 3
+
+
+def test_cross_document_duplicates_become_aliases(manifest):
+    shared = [passage(10 + i) for i in range(3)]
+    first = ChunkDeduplicator("doc-a")
+    assert first.filter(shared, start=0) == shared
+    first.finish()
+
+    second = ChunkDeduplicator("doc-b")
+    own = passage(20)
+    assert second.filter([edit(shared[1], 2), own, shared[2]], start=0) == [own]
+    second.finish()
+    assert sorted(ingest_cache.document_aliases(["doc-b"])) == ["doc-a-1", "doc-a-2"]
+
+    # a batch is looked up at once, and a document never matches itself
+    candidates = ingest_cache.lsh_candidates([band_keys(minhash(t)) for t in shared + [own]], "doc-a")
+    assert [[(d, i) for d, i, _ in c] for c in candidates] == [[], [], [], [("doc-b", 0)]]
+
+
+def test_aliased_document_is_not_orphaned(manifest):
+    for key in ("doc-a", "doc-b"):
+        ingest_cache.record(key, key.encode(), chunk_size=300, overlap=50, n_chunks=1)
+    text = passage(30)
+    first = ChunkDeduplicator("doc-a")
+    first.filter([text], start=0)
+    first.finish()
+    second = ChunkDeduplicator("doc-b")
+    second.filter([text], start=0)
+    second.finish()
+
+    assert ingest_cache.orphaned_documents(float("inf")) == ["doc-b"]
+    assert ingest_cache.claim_orphan("doc-a") == (False, None)
+    assert ingest_cache.claim_orphan("doc-b") == (True, None)
+    assert ingest_cache.orphaned_documents(float("inf")) == ["doc-a"]
+
+
+def test_retrieval_follows_aliases(store):
+    shared = "photosynthesis converts light energy into chemical energy in chloroplasts " * 5
+    other = "the treaty ended the war between the two empires after a long siege " * 5
+    add_chunks([shared], "doc-a")
+    first = ChunkDeduplicator("doc-a")
+    first.filter([shared], start=0)
+    first.finish()
+
+    second = ChunkDeduplicator("doc-b")
+    kept = second.filter([shared, other], start=0)
+    add_chunks(kept, "doc-b")
+    second.finish()
+    assert kept == [other]
+
+    hits = context_builder.retrieve("light energy in chloroplasts", k=5, doc_ids=["doc-b"])
+    assert [h.text for h in hits] == [shared, other]
+
+
+def test_cross_document_check_can_be_disabled(manifest):
+    text = passage(40)
+    first = ChunkDeduplicator("doc-a")
+    first.filter([text], start=0)
+    first.finish()
+    second = ChunkDeduplicator("doc-b", cross_document=False)
+    assert second.filter([text], start=0) == [text]
@@ -0,0 +1,54 @@
+import threading
+
+import numpy as np
+
+from app import embedding_cache, registry
+from app.embedding_cache import EmbeddingCache, chunk_key
+
+
+def test_hit_returns_the_stored_vector_without_encoding(store, monkeypatch):
+    texts = ["alpha beta gamma", "delta  epsilon\nzeta"]
+    first = embedding_cache.embed_texts(texts)
+
+    class Refuse:
+        def encode(self, *args, **kwargs):
+            raise AssertionError("cache hit must not be encoded")
+
+    monkeypatch.setattr(registry, "sentence_transformer", lambda: Refuse())
+    assert embedding_cache.embed_texts(texts) == first
+    # whitespace differences share an entry
+    assert embedding_cache.embed_texts(["delta epsilon zeta"]) == first[1:]
+
+
+def test_concurrent_appends_keep_rows_consistent(tmp_path):
+    dim, writers, batches = 8, 4, 25
+    rng = np.random.default_rng(0)
+    vectors = {f"w{w}-{b}": rng.standard_normal((3, dim)).astype(np.float32)
+               for w in range(writers) for b in range(batches)}
+
+    def write(w):
+        cache = EmbeddingCache("model", tmp_path)  # one handle per writer, as in separate processes
+        for b in range(batches):
+            name = f"w{w}-{b}"
+            cache.put_many([f"{name}-{i}" for i in range(3)], vectors[name])
+
+    EmbeddingCache("model", tmp_path).put_many(["seed"], np.zeros((1, dim), dtype=np.float32))
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    reader = EmbeddingCache("model", tmp_path)
+    keys = [f"{name}-{i}" for name in vectors for i in range(3)]
+    found = reader.get_many(keys)
+    assert len(found) == len(keys)
+    for name, block in vectors.items():
+        for i in range(3):
+            np.testing.assert_array_equal(found[f"{name}-{i}"], block[i])
+    assert reader.matrix_path.stat().st_size == (len(keys) + 1) * dim * 4
+
+
+def test_keys_depend_on_the_model():
+    assert chunk_key("same text", "model-a") != chunk_key("same text", "model-b")
+    assert chunk_key("same  text ", "model-a") == chunk_key("same text", "model-a")
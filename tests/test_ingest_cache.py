@@ -0,0 +1,55 @@
+import sqlite3
+
+from app import ingest_cache, qa_generator
+from benchmarks.synthetic_pdf import make_pdf
+
+
+def test_identical_bytes_are_embedded_once(store, monkeypatch):
+    monkeypatch.setattr(qa_generator, "TMP_DIR", store / "tmp")
+    passes = []
+    real_add_chunks = qa_generator.add_chunks
+
+    def add_chunks(chunks, doc_key, **kwargs):
+        passes.append(doc_key)
+        return real_add_chunks(chunks, doc_key, **kwargs)
+
+    monkeypatch.setattr(qa_generator, "add_chunks", add_chunks)
+    data = make_pdf(store / "book.pdf", pages=3, words_per_page=150, seed=1).read_bytes()
+
+    n_first = qa_generator.ingest_pdf_bytes(data, "s1", filename="book.pdf")
+    embedded = len(passes)
+    assert n_first > 0 and embedded > 0
+    n_second = qa_generator.ingest_pdf_bytes(data, "s2", filename="copy.pdf")
+
+    assert n_second == n_first
+    assert len(passes) == embedded  # the hit neither extracted nor embedded anything
+    doc_key = ingest_cache.document_key(data, chunk_size=qa_generator.CHUNK_SIZE,
+                                        overlap=qa_generator.CHUNK_OVERLAP)
+    assert ingest_cache.session_documents("s1") == ingest_cache.session_documents("s2") == [doc_key]
+    assert len(list((store / "tmp").iterdir())) == 1  # only the miss was written to disk
+
+
+def test_schema_is_migrated_once_per_process(manifest, monkeypatch):
+    conn = sqlite3.connect(manifest)
+    conn.execute("CREATE TABLE documents (doc_key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+                 "chunk_size INTEGER NOT NULL, overlap INTEGER NOT NULL, n_chunks INTEGER NOT NULL, "
+                 "filename TEXT, created_at REAL NOT NULL)")
+    conn.execute("CREATE TABLE chunk_aliases (doc_key TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+                 "PRIMARY KEY (doc_key, chunk_id))")
+    conn.execute("INSERT INTO chunk_aliases VALUES ('doc-b', 'doc-a-3')")
+    conn.commit()
+    conn.close()
+
+    runs = []
+    real_migrate = ingest_cache._migrate
+    monkeypatch.setattr(ingest_cache, "_migrate", lambda conn: (runs.append(1), real_migrate(conn)))
+    monkeypatch.setattr(ingest_cache, "_migrated", set())
+    ingest_cache.record("doc-a", b"a", chunk_size=300, overlap=50, n_chunks=4)
+    assert ingest_cache.lookup("doc-a") == 4
+    assert ingest_cache.link_session("s1", "doc-a")
+    assert runs == [1]
+
+    conn = sqlite3.connect(manifest)
+    assert conn.execute("SELECT target_doc FROM chunk_aliases").fetchall() == [("doc-a",)]
+    assert conn.execute("SELECT unlinked_at FROM documents").fetchall() == [(None,)]
+    conn.close()
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from app import context_builder, jobs, qa_generator
+from app.jobs import Cancelled, Job, _StageQueue
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def noop(job, previous):
+    return previous
+
+
+def test_sessions_are_served_round_robin():
+    queue = _StageQueue()
+    queued = [Job(session, [("generate", noop)], label) for session, label in
+              [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1"), ("b", "b2")]]
+    for job in queued:
+        queue.put(job)
+    assert queue.ahead_of(queued[2]) == 5  # a3 goes last
+    assert [queue.get().label for _ in queued] == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+def test_stage_runs_at_most_its_worker_count():
+    release = threading.Event()
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def step(job, _):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+        return job.label
+
+    cap = jobs.STAGE_WORKERS["ingest"]
+    submitted = [jobs.submit(f"cap-{i}", ("ingest", step), label=str(i)) for i in range(cap + 3)]
+    wait_for(lambda: running[0] == cap)
+    time.sleep(0.1)
+    assert peak[0] == cap
+    assert sum(j.status == jobs.QUEUED for j in submitted) == 3
+    release.set()
+    wait_for(lambda: all(j.finished for j in submitted))
+    assert [j.result for j in submitted] == [str(i) for i in range(cap + 3)]
+
+
+def test_steps_chain_across_stages():
+    job = jobs.submit("chain", ("ingest", lambda job, _: 2), ("generate", lambda job, n: n * 3),
+                      ("grade", lambda job, n: n + 1))
+    wait_for(lambda: job.finished)
+    assert (job.status, job.result) == (jobs.DONE, 7)
+    assert jobs.get(job.id) is job
+
+
+def test_cancelling_a_queued_job_never_runs_it():
+    release = threading.Event()
+    blockers = [jobs.submit(f"busy-{i}", ("grade", lambda job, _: release.wait(5)))
+                for i in range(jobs.STAGE_WORKERS["grade"])]
+    ran = []
+    queued = jobs.submit("victim", ("grade", lambda job, _: ran.append(1)))
+    assert queued.status == jobs.QUEUED
+    assert jobs.cancel(queued.id)
+    assert queued.status == jobs.CANCELLED
+    release.set()
+    wait_for(lambda: all(j.finished for j in blockers))
+    assert ran == [] and not jobs.cancel(queued.id)
+
+
+def test_cancelling_a_running_job_stops_it():
+    started = threading.Event()
+
+    def step(job, _):
+        started.set()
+        while not job.cancelled:
+            time.sleep(0.01)
+        raise Cancelled("stopped")
+
+    job = jobs.submit("cancel-running", ("generate", step), ("grade", noop))
+    started.wait(5)
+    jobs.cancel(job.id)
+    wait_for(lambda: job.finished)
+    assert job.status == jobs.CANCELLED and job.error is None
+    assert job.step == 0  # the next step never ran
+
+
+def test_failing_step_marks_the_job_failed():
+    def step(job, _):
+        raise RuntimeError("boom")
+
+    job = jobs.submit("fail", ("generate", step))
+    wait_for(lambda: job.finished)
+    assert (job.status, job.error) == (jobs.FAILED, "boom")
+
+
+def test_generation_stops_while_waiting_for_the_first_question(monkeypatch):
+    stopped = threading.Event()
+
+    def silent_shard(context, n, topic, provider, api_key, model, stop, use_cache=False):
+        stop.wait(5)  # a provider that has not sent a token yet
+        stopped.set()
+        return iter(())
+
+    monkeypatch.setattr(qa_generator, "_iter_shard", silent_shard)
+    monkeypatch.setattr(context_builder, "retrieve",
+                        lambda query, k, doc_ids: [context_builder.Candidate("some text", 1.0, None)])
+    monkeypatch.setattr(qa_generator.ingest_cache, "session_documents", lambda session_id: ["doc-a"])
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    t0 = time.monotonic()
+    with pytest.raises(Cancelled):
+        list(qa_generator.iter_qa_pairs("s1", n=3, cancelled=cancel.is_set))
+    assert time.monotonic() - t0 < 2
+    assert stopped.wait(2)
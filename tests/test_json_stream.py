@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from app.json_stream import JsonObjectStream
+
+ITEMS = [
+    {"question": "What is {x}?", "answer": "A \"brace\" } in a string", "topic": "Sets"},
+    {"question": "Define a list.", "answer": "An ordered [sequence].", "topic": "Python"},
+]
+
+
+def feed_all(text, step=None):
+    parser = JsonObjectStream()
+    step = step or len(text)
+    found = []
+    for i in range(0, len(text), step):
+        found += parser.feed(text[i : i + step])
+    return found, parser
+
+
+@pytest.mark.parametrize("step", [None, 1, 7])
+def test_array_in_fragments(step):
+    found, parser = feed_all(json.dumps(ITEMS), step)
+    assert found == ITEMS
+    assert parser.skipped == 0
+
+
+def test_items_arrive_before_array_closes():
+    text = json.dumps(ITEMS)
+    first_end = text.index("}, {") + 1
+    parser = JsonObjectStream()
+    assert parser.feed(text[:first_end]) == ITEMS[:1]
+    assert parser.feed(text[first_end:]) == ITEMS[1:]
+
+
+def test_truncated_array_is_salvaged():
+    text = json.dumps(ITEMS)
+    found, _ = feed_all(text[: text.rindex('"topic"')])
+    assert found == ITEMS[:1]
+
+
+def test_wrapper_object_yields_items_only():
+    found, _ = feed_all("Sure! Here you go:\n" + json.dumps({"questions": ITEMS}) + "\nGood luck.")
+    assert found == ITEMS
+
+
+def test_nested_object_value_stays_in_its_item():
+    item = {"question": "Q?", "answer": {"text": "A", "refs": [{"page": 2}]}, "topic": "T"}
+    found, _ = feed_all(json.dumps([item, ITEMS[0]]), 3)
+    assert found == [item, ITEMS[0]]
+
+
+def test_bare_object_without_list():
+    item = {"question": "Q?", "answer": {"text": "A"}}
+    found, _ = feed_all("```json\n" + json.dumps(item) + "\n```")
+    assert found == [item]
+
+
+def test_trailing_comma_is_repaired():
+    found, parser = feed_all('[{"question": "Q?", "answer": "A",}]')
+    assert found == [{"question": "Q?", "answer": "A"}]
+    assert parser.skipped == 0
+
+
+def test_malformed_item_is_skipped():
+    found, parser = feed_all('[{"question": "Q?" "answer": "A"}, ' + json.dumps(ITEMS[1]) + "]")
+    assert found == [ITEMS[1]]
+    assert parser.skipped == 1
+
+
+def test_smart_quotes_are_normalised():
+    found, _ = feed_all("[{“question”: “Q?”, “answer”: “A”}]")
+    assert found == [{"question": "Q?", "answer": "A"}]
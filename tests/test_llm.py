@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from app import llm, registry
+
+
+class FakeModels:
+    def __init__(self, api_key, seen):
+        self.api_key, self.seen = api_key, seen
+
+    def generate_content(self, model, contents, config=None):
+        self.seen.append((self.api_key, contents))
+        return type("Response", (), {"text": f"{self.api_key}:{contents}"})()
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.seen.append((self.api_key, contents, config))
+        yield type("Chunk", (), {"text": self.api_key})()
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    seen = []
+    monkeypatch.setattr(registry, "_instances", {})
+    monkeypatch.setattr(registry, "gemini_client",
+                        lambda api_key: type("Client", (), {"models": FakeModels(api_key, seen)})())
+    return seen
+
+
+def test_concurrent_gemini_calls_keep_their_own_key(gemini):
+    results = {}
+
+    def call(key):
+        for i in range(20):
+            results[(key, i)] = llm.complete("Gemini", f"prompt {i}", api_key=key, use_cache=False)
+
+    threads = [threading.Thread(target=call, args=(key,)) for key in ("key-a", "key-b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(text == f"{key}:prompt {i}" for (key, i), text in results.items())
+    assert len(gemini) == 40
+
+
+def test_gemini_stream_requests_json(gemini):
+    assert "".join(llm.stream("Gemini", "p", api_key="key-a", json_mode=True, use_cache=False)) == "key-a"
+    assert gemini == [("key-a", "p", {"response_mime_type": "application/json"})]
+
+
+def test_gemini_clients_are_per_key(monkeypatch):
+    pytest.importorskip("google.genai")
+    monkeypatch.setattr(registry, "_instances", {})
+    assert registry.gemini_client("key-a") is registry.gemini_client("key-a")
+    assert registry.gemini_client("key-a") is not registry.gemini_client("key-b")
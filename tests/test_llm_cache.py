@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+
+from app import context_builder, llm, llm_cache, qa_generator
+from app.context_builder import Candidate
+from app.llm_cache import cache_key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "llm_cache.db")
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    yield
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Stand-in for the provider: every request is recorded and answered with a fresh quiz."""
+    requests = []
+
+    def raw_stream(provider, prompt, model, api_key, json_mode, options):
+        requests.append((model, prompt, options))
+        yield json.dumps([{"question": f"Question number{len(requests)}?", "answer": "A."}])
+
+    monkeypatch.setattr(llm, "_raw_stream", raw_stream)
+    return requests
+
+
+def test_keys_separate_provider_model_prompt_and_options():
+    base = cache_key("Ollama", "gemma3", "prompt", {"temperature": 0})
+    assert len({
+        base,
+        cache_key("Gemini", "gemma3", "prompt", {"temperature": 0}),
+        cache_key("Ollama", "tinyllama-qa", "prompt", {"temperature": 0}),
+        cache_key("Ollama", "gemma3", "prompt ", {"temperature": 0}),
+        cache_key("Ollama", "gemma3", "prompt", {"temperature": 0.7}),
+        cache_key("Ollama", "gemma3", "prompt", None),
+    }) == 6
+    assert cache_key("Ollama", "gemma3", "prompt", {"a": 1, "b": 2}) == \
+        cache_key("Ollama", "gemma3", "prompt", {"b": 2, "a": 1})
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    key = cache_key("Ollama", "gemma3", "prompt")
+    llm_cache.put(key, "Ollama", "gemma3", "response")
+    assert llm_cache.get(key) == "response"
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL", 0)
+    time.sleep(0.01)
+    assert llm_cache.get(key) is None
+    assert llm_cache.stats()["entries"] == 0
+
+
+def test_streams_are_cached_per_model(cache, sent):
+    first = "".join(llm.stream("Ollama", "grade this", model="gemma3"))
+    assert "".join(llm.stream("Ollama", "grade this", model="gemma3")) == first
+    assert len(sent) == 1
+    "".join(llm.stream("Ollama", "grade this", model="tinyllama-qa"))
+    "".join(llm.stream("Ollama", "grade this", model="gemma3", options={"temperature": 0.5}))
+    assert len(sent) == 3
+
+
+def test_question_generation_bypasses_the_cache_by_default(cache, sent, monkeypatch):
+    monkeypatch.setattr(context_builder, "retrieve",
+                        lambda query, k, doc_ids: [Candidate("Some study text.", 1.0, None)])
+    first = list(qa_generator.iter_qa_pairs("s1", n=1, doc_keys=["doc-a"]))
+    second = list(qa_generator.iter_qa_pairs("s1", n=1, doc_keys=["doc-a"]))
+    assert len(sent) == 2 and first != second
+    assert llm_cache.stats()["entries"] == 0
+
+    cached = list(qa_generator.iter_qa_pairs("s1", n=1, doc_keys=["doc-a"], use_cache=True))
+    assert list(qa_generator.iter_qa_pairs("s1", n=1, doc_keys=["doc-a"], use_cache=True)) == cached
+    assert len(sent) == 3
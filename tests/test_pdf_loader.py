@@ -0,0 +1,44 @@
+import textwrap
+
+import PyPDF2
+import pytest
+
+from app import pdf_loader
+from app.pdf_loader import _clean, iter_chunks
+from benchmarks.synthetic_pdf import make_pdf
+
+
+def reference_chunks(path, chunk_size, overlap):
+    """The original whole-document `load_pdf` algorithm."""
+    reader = PyPDF2.PdfReader(str(path))
+    words = _clean(" ".join(page.extract_text() or "" for page in reader.pages)).split()
+    step = chunk_size - overlap
+    chunks = [" ".join(words[i : i + chunk_size]) for i in range(0, len(words), step)]
+    return [textwrap.shorten(chunk, width=chunk_size * 4) for chunk in chunks if chunk]
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    return make_pdf(tmp_path_factory.mktemp("pdf") / "book.pdf", pages=7, words_per_page=120, seed=3)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("chunk_size, overlap", [(300, 50), (100, 0), (57, 20)])
+def test_chunks_match_the_original_loader(pdf, monkeypatch, workers, chunk_size, overlap):
+    monkeypatch.setattr(pdf_loader, "PAGES_PER_TASK", 2)  # batches end mid-chunk
+    expected = reference_chunks(pdf, chunk_size, overlap)
+    assert len(expected) > 2
+    assert list(iter_chunks(pdf, chunk_size=chunk_size, overlap=overlap, workers=workers)) == expected
+
+
+def test_stopping_early_cancels_pending_pages(pdf, monkeypatch):
+    monkeypatch.setattr(pdf_loader, "PAGES_PER_TASK", 1)
+    chunks = iter_chunks(pdf, chunk_size=50, overlap=0, workers=2)
+    next(chunks)
+    chunks.close()
+    assert list(iter_chunks(pdf, chunk_size=50, overlap=0, workers=2)) == reference_chunks(pdf, 50, 0)
+
+
+def test_overlap_must_be_smaller_than_chunk_size(pdf):
+    with pytest.raises(ValueError):
+        next(iter_chunks(pdf, chunk_size=50, overlap=50))
@@ -0,0 +1,68 @@
+import json
+import re
+import threading
+
+import pytest
+
+from app import context_builder, llm, qa_generator
+from app.context_builder import Candidate
+
+TOPICS = ["cells", "enzymes", "photosynthesis", "respiration", "genetics", "evolution"]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """A fake streaming provider; `calls` records `(prompt, kwargs)` per request."""
+    calls, lock = [], threading.Lock()
+
+    def stream(provider, prompt, **kwargs):
+        with lock:
+            calls.append((prompt, kwargs))
+            call = len(calls)
+        n = int(re.search(r"Generate (\d+)", prompt).group(1))
+        context = prompt.split("Context:\n", 1)[1]
+        items = [{"question": f"Explain item{call}x{i} from {context.split()[0]}?", "answer": "A."}
+                 for i in range(n)]
+        if call <= 3:  # every first-round shard also repeats a question
+            items[0] = {"question": "What is the role of the cell membrane?", "answer": "A."}
+        text = json.dumps(items)
+        for i in range(0, len(text), 17):  # items arrive split across fragments
+            yield text[i : i + 17]
+
+    candidates = [Candidate(f"{topic}{i} " + "filler words here. " * 20, 1.0 - i / 100, None)
+                  for i, topic in enumerate(TOPICS * 4)]
+    monkeypatch.setattr(llm, "stream", stream)
+    monkeypatch.setattr(context_builder, "retrieve", lambda query, k, doc_ids: candidates)
+    monkeypatch.setattr(qa_generator, "QA_SHARD_SIZE", 4)
+    monkeypatch.setattr(qa_generator, "QA_TOPUP_ROUNDS", 2)
+    return calls
+
+
+def test_shards_are_merged_deduplicated_and_topped_up(provider):
+    pairs = list(qa_generator.iter_qa_pairs("s1", n=12, doc_keys=["doc-a"]))
+
+    questions = [p["question"] for p in pairs]
+    assert len(pairs) == 12 and len(set(questions)) == 12
+    assert questions.count("What is the role of the cell membrane?") == 1
+    # three shards of four, then one top-up shard for the two duplicates dropped
+    asked = [int(re.search(r"Generate (\d+)", prompt).group(1)) for prompt, _ in provider]
+    assert sorted(asked[:3]) == [4, 4, 4] and asked[3:] == [2]
+    assert {re.search(r"item(\d+)x", q).group(1) for q in questions if "item" in q} == {"1", "2", "3", "4"}
+    # shards were grounded in different chunks
+    assert len({prompt.split("Context:\n", 1)[1] for prompt, _ in provider[:3]}) == 3
+
+
+def test_near_duplicates_are_dropped():
+    seen = [qa_generator._question_tokens("What is the role of the cell membrane?")]
+    assert qa_generator._is_near_duplicate(
+        qa_generator._question_tokens("what is the ROLE of the cell membrane"), seen)
+    assert not qa_generator._is_near_duplicate(
+        qa_generator._question_tokens("What is the role of mitochondria?"), seen)
+
+
+def test_generation_is_not_cached_by_default(provider):
+    list(qa_generator.iter_qa_pairs("s1", n=8, doc_keys=["doc-a"]))
+    first_run = len(provider)
+    list(qa_generator.iter_qa_pairs("s1", n=8, doc_keys=["doc-a"], use_cache=True))
+    assert {kwargs["use_cache"] for _, kwargs in provider[:first_run]} == {False}
+    assert {kwargs["use_cache"] for _, kwargs in provider[first_run:]} == {True}
@@ -0,0 +1,112 @@
+import sqlite3
+
+import pytest
+
+from app import ingest_cache, question_bank
+
+
+def qa(question):
+    return {"question": question, "answer": "A", "topic": "T"}
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    """An empty question bank for session `s1`, fed by scripted generation rounds."""
+    monkeypatch.setattr(question_bank, "BANK_PATH", tmp_path / "bank.db")
+    monkeypatch.setattr(question_bank, "_conn", None)
+    monkeypatch.setattr(question_bank, "_tokens", {})
+    monkeypatch.setattr(question_bank, "BANK_LOW_WATER", 0)
+    monkeypatch.setattr(ingest_cache, "session_documents", lambda session_id: ["doc-a"])
+    rounds, calls, sources = [], [], []
+
+    def iter_qa_pairs(doc_id, n, topic, provider, gemini_api_key, ollama_model, use_cache=False, doc_keys=None,
+                      cancelled=None):
+        calls.append((n, use_cache))
+        sources.append(doc_keys)
+        yield from (rounds.pop(0) if rounds else [])[:n]
+
+    monkeypatch.setattr(question_bank, "iter_qa_pairs", iter_qa_pairs)
+    yield rounds, calls, sources
+    question_bank._conn.close()
+
+
+def test_shortfall_is_generated_uncached_and_banked(bank):
+    rounds, calls, _ = bank
+    rounds.append([qa("What is osmosis?"), qa("Define entropy in physics.")])
+    quiz = list(question_bank.iter_quiz("s1", n=2, use_cache=True))
+    assert [q["question"] for q in quiz] == ["What is osmosis?", "Define entropy in physics."]
+    assert calls == [(2, False)]
+    assert question_bank.unseen("s1", question_bank.bank_key(["doc-a"], None)) == 0
+
+
+def test_repeats_of_served_questions_are_replaced(bank):
+    rounds, calls, _ = bank
+    rounds.append([qa("What is osmosis?")])
+    list(question_bank.iter_quiz("s1", n=1))
+
+    rounds.append([qa("What is osmosis ?"), qa("Name the parts of a cell.")])
+    rounds.append([qa("Explain how enzymes work.")])
+    quiz = list(question_bank.iter_quiz("s1", n=2))
+    assert [q["question"] for q in quiz] == ["Name the parts of a cell.", "Explain how enzymes work."]
+    assert calls[1:] == [(2, False), (1, False)]
+
+
+def test_match_of_a_refilled_question_marks_it_served(bank, monkeypatch):
+    key = question_bank.bank_key(["doc-a"], None)
+
+    def iter_qa_pairs(*args, **kwargs):
+        question_bank.deposit(key, [qa("What is osmosis?")])  # a background refill lands meanwhile
+        yield qa("What is  osmosis")
+
+    monkeypatch.setattr(question_bank, "iter_qa_pairs", iter_qa_pairs)
+    assert [q["question"] for q in question_bank.iter_quiz("s1", n=1)] == ["What is  osmosis"]
+    assert question_bank.unseen("s1", key) == 0
+    assert question_bank.unseen("s2", key) == 1
+
+
+def test_generation_stops_when_the_provider_runs_dry(bank):
+    _, calls, _ = bank
+    assert list(question_bank.iter_quiz("s1", n=3)) == []
+    assert calls == [(3, False)]
+
+
+def test_refill_draws_from_the_banks_own_documents(bank, monkeypatch):
+    rounds, _, sources = bank
+    monkeypatch.setattr(question_bank, "BANK_LOW_WATER", 5)
+    monkeypatch.setattr(question_bank, "BANK_REFILL_SIZE", 1)
+    refills = []
+    monkeypatch.setattr(question_bank._pool, "submit", refills.append)
+    rounds.append([qa("What is osmosis?")])
+    list(question_bank.iter_quiz("s1", n=1))
+    assert len(refills) == 1
+
+    # the session links a second PDF before the queued refill runs
+    monkeypatch.setattr(ingest_cache, "session_documents", lambda session_id: ["doc-a", "doc-b"])
+    rounds.append([qa("Define diffusion.")])
+    refills[0]()
+    assert sources == [["doc-a"], ["doc-a"]]
+    assert question_bank.unseen("s1", question_bank.bank_key(["doc-a"], None)) == 1
+
+
+def test_banks_from_before_stored_tokens_are_backfilled(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE questions (id INTEGER PRIMARY KEY AUTOINCREMENT, bank_key TEXT NOT NULL,
+            question TEXT NOT NULL, answer TEXT NOT NULL, topic TEXT, qhash TEXT NOT NULL,
+            provider TEXT, model TEXT, created_at REAL NOT NULL, UNIQUE (bank_key, qhash));
+        INSERT INTO questions (bank_key, question, answer, qhash, created_at)
+            VALUES ('k', 'What is osmosis?', 'A', 'h', 0);
+        """
+    )
+    conn.close()
+    monkeypatch.setattr(question_bank, "BANK_PATH", path)
+    monkeypatch.setattr(question_bank, "_conn", None)
+    monkeypatch.setattr(question_bank, "_tokens", {})
+    try:
+        assert question_bank.deposit("k", [qa("What is osmosis ?"), qa("Define entropy.")])[0] is None
+        rows = question_bank._connection().execute("SELECT question, tokens FROM questions ORDER BY id")
+        assert list(rows) == [("What is osmosis?", "is osmosis what"), ("Define entropy.", "define entropy")]
+    finally:
+        question_bank._conn.close()
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from app import registry
+
+
+def make_store(path, *collections):
+    path.mkdir()
+    conn = sqlite3.connect(path / "chroma.sqlite3")
+    conn.execute("CREATE TABLE collections (name TEXT)")
+    conn.executemany("INSERT INTO collections VALUES (?)", [(c,) for c in collections])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """A working directory with the chunks in `chroma_store` and an unused `.chromadb`."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(registry, "_instances", {})
+    make_store(tmp_path / "chroma_store", registry.COLLECTION_NAME)
+    make_store(tmp_path / ".chromadb", "langchain")
+    return tmp_path
+
+
+def test_legacy_setting_keeps_using_the_existing_chunks(stores, monkeypatch, caplog):
+    monkeypatch.setattr(registry, "CHROMA_DIR", ".chromadb")
+    assert registry.store_dir() == "chroma_store"
+    assert "using the store in chroma_store" in caplog.text
+
+
+def test_configured_store_with_chunks_is_used(stores, monkeypatch, caplog):
+    make_store(stores / "custom", registry.COLLECTION_NAME)
+    monkeypatch.setattr(registry, "CHROMA_DIR", "custom")
+    assert registry.store_dir() == "custom"
+    assert not caplog.text
+
+
+def test_custom_empty_store_is_used_with_a_warning(stores, monkeypatch, caplog):
+    monkeypatch.setattr(registry, "CHROMA_DIR", "fresh")
+    assert registry.store_dir() == "fresh"
+    assert "will be re-ingested" in caplog.text
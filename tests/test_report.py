@@ -0,0 +1,52 @@
+import csv
+import time
+
+import pytest
+
+from app import report, results_store
+
+
+@pytest.fixture
+def results(tmp_path, monkeypatch):
+    """A results store in a temporary directory with one graded submission."""
+    store = results_store.ResultsStore(tmp_path / "results.db")
+    monkeypatch.setattr(results_store, "DB_PATH", store.path)
+    monkeypatch.setattr(results_store, "_store", store)
+    monkeypatch.setattr(report, "_export_dir", tmp_path / "exports")
+    (tmp_path / "exports").mkdir()
+    store.store([{"question": "Q?", "student": "S", "answer": "A", "score": 1.0, "feedback": "ok"}],
+                session_id="s1")
+    return store
+
+
+def test_export_runs_on_its_own_pool(results):
+    path = report.submit_export("csv").result(timeout=10)
+    with open(path, newline="", encoding="utf-8") as fh:
+        rows = list(csv.reader(fh))
+    assert rows[0] == list(report.EXPORT_COLUMNS)
+    assert rows[1][rows[0].index("session_id")] == "s1"
+    assert path.parent == report._exports()
+
+
+def test_replaced_export_is_deleted(results):
+    first = report.submit_export("csv")
+    report.discard_export(first)
+    second = report.submit_export("csv").result(timeout=10)
+    assert list(report._exports().iterdir()) == [second]
+
+
+def test_failed_export_leaves_no_file(results, monkeypatch):
+    def fail(out, **filters):
+        out.write_text("partial")
+        raise OSError("disk full")
+
+    monkeypatch.setitem(report.EXPORTERS, "csv", fail)
+    with pytest.raises(OSError):
+        report.submit_export("csv").result(timeout=10)
+    assert list(report._exports().iterdir()) == []
+
+
+def test_old_exports_are_purged(results):
+    path = report.submit_export("csv").result(timeout=10)
+    report._purge_exports(now=time.time() + report.EXPORT_RETENTION + 1)
+    assert not path.exists()
@@ -0,0 +1,74 @@
+import multiprocessing
+import sqlite3
+
+from app import results_store
+from app.database import store_results
+
+
+def columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_unversioned_database_is_migrated_step_by_step(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(results_store.MIGRATIONS[0])  # the table as created before versioning
+    conn.execute("INSERT INTO results (timestamp, question, student, answer, score, feedback) "
+                 "VALUES ('2024-09-01T12:30:00.123456', 'Q?', 's', 'a', 0.5, 'f')")
+    conn.commit()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+
+    assert results_store.migrate(conn) == len(results_store.MIGRATIONS) == 3
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert {"session_id", "doc_id", "topic", "provider", "ts"} <= set(columns(conn, "results"))
+    # the epoch timestamp is backfilled from the text one (UTC, whole seconds)
+    assert conn.execute("SELECT ts FROM results").fetchone()[0] == 1725193800.0
+    assert conn.execute("SELECT day, n, score_sum FROM rollup_daily").fetchall() == [("2024-09-01", 1, 0.5)]
+    # migrating again is a no-op
+    assert results_store.migrate(conn) == 3
+    conn.close()
+
+
+def test_migrations_apply_to_a_new_database(tmp_path):
+    conn = results_store.connect(tmp_path / "new.db")
+    assert results_store.migrate(conn) == 3
+    assert "ts" in columns(conn, "results")
+    conn.close()
+
+
+def _open(path):
+    results_store.migrate(results_store.connect(path))
+
+
+def test_processes_opening_the_store_together_migrate_once(tmp_path):
+    path = tmp_path / "shared.db"
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        pool.map(_open, [path] * 4)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM rollup_meta").fetchone()[0] == 1
+    conn.close()
+
+
+def test_flush_waits_for_queued_submissions(tmp_path, monkeypatch):
+    store = results_store.ResultsStore(tmp_path / "results.db")
+    monkeypatch.setattr(results_store, "_store", store)
+    for i in range(50):
+        store_results([{"question": f"Q{i}", "student": "s", "answer": "a", "score": 1.0, "feedback": "f"}],
+                      session_id="s1")
+    store.flush()
+    conn = sqlite3.connect(store.path)
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT question) FROM results").fetchone() == (50, 50)
+    assert conn.execute("SELECT n FROM rollup_session WHERE session_id = 's1'").fetchone() == (50,)
+    conn.close()
+
+
+def test_a_failed_batch_does_not_block_flush(tmp_path, monkeypatch):
+    store = results_store.ResultsStore(tmp_path / "results.db")
+
+    def fail(rows):
+        raise sqlite3.IntegrityError("boom")
+
+    monkeypatch.setattr(store, "_write", fail)
+    store.store([{"question": "Q", "student": "s", "answer": "a", "score": 1.0, "feedback": "f"}])
+    store.flush()  # returns although the write raised
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from app import registry, scoring
+
+REFERENCE = "Mitochondria produce most of the cell's ATP."
+
+
+class TableEncoder:
+    """Returns preset unit vectors, so each answer gets a chosen similarity to REFERENCE."""
+
+    def __init__(self, similarities):
+        self.similarities = similarities
+        self.calls = 0
+
+    def encode(self, texts, **_):
+        self.calls += 1
+        out = []
+        for text in texts:
+            sim = 1.0 if text == REFERENCE else self.similarities[text]
+            out.append([sim, np.sqrt(max(0.0, 1 - sim * sim))])
+        return np.array(out, dtype=np.float32)
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    def install(similarities):
+        enc = TableEncoder(similarities)
+        monkeypatch.setattr(registry, "sentence_transformer", lambda: enc)
+        return enc
+    return install
+
+
+@pytest.fixture
+def llm_grades(monkeypatch):
+    calls = []
+
+    def grade(reference, student, **kwargs):
+        calls.append(student)
+        return {"score": 0.5, "feedback": "from the LLM"}
+
+    monkeypatch.setattr(scoring, "grade", grade)
+    return calls
+
+
+def test_exact_match_needs_no_encoder(encoder):
+    enc = encoder({})
+    assert scoring.pre_grade([REFERENCE], ["mitochondria PRODUCE most of the cell's ATP"])[0]["score"] == 1.0
+    assert enc.calls == 0
+
+
+def test_close_answer_is_accepted(encoder):
+    answer = "Most of a cell's ATP is made by mitochondria."
+    encoder({answer: 0.95})
+    assert scoring.pre_grade([REFERENCE], [answer])[0]["score"] == 1.0
+
+
+@pytest.mark.parametrize("reference, answer", [
+    ("The treaty was signed in 1648.", "The treaty was signed in 1658."),
+    ("Water boils at 100 degrees.", "Water does not boil at 100 degrees."),
+    ("It isn't soluble in water.", "It is soluble in water."),
+])
+def test_changed_number_or_negation_goes_to_the_llm(encoder, reference, answer):
+    encoder({reference: 1.0, answer: 0.97})
+    assert scoring.pre_grade([reference], [answer]) == [None]
+
+
+def test_unrelated_answer_is_rejected(encoder):
+    answer = "Napoleon lost at Waterloo."
+    encoder({answer: 0.05})
+    assert scoring.pre_grade([REFERENCE], [answer])[0]["score"] == 0.0
+
+
+def test_short_answer_sharing_a_word_is_not_rejected(encoder):
+    encoder({"ATP": 0.1})
+    assert scoring.pre_grade([REFERENCE], ["ATP"]) == [None]
+
+
+def test_ambiguous_band_goes_to_the_llm(encoder):
+    answer = "They make energy for the cell."
+    encoder({answer: 0.6})
+    assert scoring.pre_grade([REFERENCE], [answer]) == [None]
+
+
+def test_grade_batch_combines_local_and_llm_grades(encoder, llm_grades):
+    close, vague, unrelated = "Most of a cell's ATP is made by mitochondria.", "Energy.", "Napoleon lost."
+    encoder({close: 0.95, vague: 0.5, unrelated: 0.05})
+    qa = {"question": "What do mitochondria do?", "answer": REFERENCE}
+    graded = scoring.grade_batch([qa] * 4, [close, vague, unrelated, "  "], fast_path=True)
+    assert [g["graded_by"] for g in graded] == ["embedding", "llm", "embedding", "blank"]
+    assert [g["score"] for g in graded] == [1.0, 0.5, 0.0, 0.0]
+    assert llm_grades == [vague]
+
+
+def test_grade_batch_falls_back_to_the_llm_when_embedding_fails(monkeypatch, llm_grades):
+    def broken():
+        raise RuntimeError("model not available")
+
+    monkeypatch.setattr(registry, "sentence_transformer", broken)
+    qa = {"question": "What do mitochondria do?", "answer": REFERENCE}
+    graded = scoring.grade_batch([qa] * 2, ["ATP", "Energy."], fast_path=True)
+    assert [g["graded_by"] for g in graded] == ["llm", "llm"]
+    assert sorted(llm_grades) == ["ATP", "Energy."]
+
+
+def test_fast_path_is_off_by_default(encoder, llm_grades):
+    encoder({"Most of a cell's ATP is made by mitochondria.": 0.99})
+    qa = {"question": "What do mitochondria do?", "answer": REFERENCE}
+    graded = scoring.grade_batch([qa], ["Most of a cell's ATP is made by mitochondria."])
+    assert graded[0]["graded_by"] == "llm"
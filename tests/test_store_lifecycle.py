@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from app import ingest_cache, registry, store_lifecycle
+from app.vector_store import add_chunks, delete_document, has_chunks
+
+
+def ingest(doc_key, session_id, chunks):
+    add_chunks(chunks, doc_key)
+    ingest_cache.record(doc_key, doc_key.encode(), chunk_size=300, overlap=50, n_chunks=len(chunks))
+    assert ingest_cache.link_session(session_id, doc_key)
+
+
+def test_link_fails_once_the_document_is_claimed(store):
+    ingest("doc-a", "s1", ["alpha beta gamma"])
+    ingest_cache.expire_sessions(time.time() + 1)
+    assert ingest_cache.claim_orphan("doc-a") == (True, None)
+    # a session that saw the chunks just before the claim must re-ingest
+    assert has_chunks("doc-a", 1)
+    assert not ingest_cache.link_session("s2", "doc-a")
+    assert ingest_cache.session_documents("s2") == []
+
+
+def test_grace_period_runs_from_the_last_unlink(store, monkeypatch):
+    ingest("doc-a", "s1", ["alpha beta gamma"])
+    monkeypatch.setattr(store_lifecycle, "SESSION_TTL", 0)
+    monkeypatch.setattr(store_lifecycle, "GC_GRACE", 60)
+    unlinked = time.time() + 3600
+    # ingested an hour before, but only just unlinked
+    report = store_lifecycle.collect_garbage(now=unlinked)
+    assert (report["expired_links"], report["documents"]) == (1, [])
+    assert store_lifecycle.collect_garbage(now=unlinked + 30)["documents"] == []
+    assert store_lifecycle.collect_garbage(now=unlinked + 61)["documents"] == ["doc-a"]
+    assert not has_chunks("doc-a", 1)
+
+
+def test_delete_keeps_chunks_written_after_the_claim(store):
+    add_chunks(["old chunk"], "doc-a")
+    claimed_at = time.time()
+    add_chunks(["new chunk"], "doc-a", start=1)
+    delete_document("doc-a", ingested_before=claimed_at)
+    assert registry.collection().get(where={"doc_id": "doc-a"})["ids"] == ["doc-a-1"]
+
+
+def test_chroma_vacuum_refuses_while_the_store_is_open(store):
+    registry.collection()
+    with pytest.raises(RuntimeError):
+        store_lifecycle.compact(chroma=True)
+    assert set(store_lifecycle.compact()) == {"bytes_before", "bytes_after"}
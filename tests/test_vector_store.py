@@ -0,0 +1,30 @@
+from app import vector_store
+from app.vector_store import add_chunks, has_chunks, similarity_search, similarity_search_with_embeddings
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"documents": [], "distances": []}
+
+
+def test_plain_search_does_not_pass_ids(monkeypatch, manifest):
+    coll = RecordingCollection()
+    monkeypatch.setattr(vector_store, "_collection", lambda name=None: coll)
+    similarity_search("cells", k=3)
+    similarity_search("cells", k=3, doc_ids=["doc-a", "doc-b"])
+    similarity_search_with_embeddings("cells", k=3, doc_ids=["doc-a"], alias_ids=["doc-b-4"])
+    assert ["ids" in call for call in coll.calls] == [False, False, False, True]
+    assert coll.calls[3]["ids"] == ["doc-b-4"] and coll.calls[3]["n_results"] == 1
+
+
+def test_search_and_chunk_check(store):
+    add_chunks(["mitochondria make energy for the cell", "the treaty ended the war"], "doc-a")
+    add_chunks(["a single chunk about volcanoes"], "doc-b")
+    assert has_chunks("doc-a", 2) and has_chunks("doc-b", 1)
+    assert not has_chunks("doc-b", 2)
+    assert similarity_search("treaty war", k=1, doc_id="doc-a") == ["the treaty ended the war"]
+    assert similarity_search("volcanoes", k=5, doc_ids=["doc-b"]) == ["a single chunk about volcanoes"]